@@ -2,14 +2,34 @@
 """
 Performance Benchmark Script cho Translation Services
 Kiểm tra latency, throughput, cache hit rate của các AI services
+
+STT mode (--stt): latency, RTF, per-chunk latency, time-to-first-text và WER theo model/ngôn ngữ
+cho /transcribe, /api/v1/transcribe-stream và /api/v1/transcribe-vi-utterance (Sherpa), kết quả JSON
+để so sánh giữa các lần chạy:
+    python scripts/benchmark_services.py --stt --stt-url http://localhost:8002 \
+        --stt-corpus ./stt-corpus --stt-output stt-whisper.json
+
+Corpus: manifest.jsonl ({"audio": "a.wav", "text": "...", "language": "vi"}) hoặc *.wav kèm
+file .txt cùng tên (ngôn ngữ = tên thư mục cha vi/en, mặc định --stt-language).
+Không có corpus → fixture tone/noise sinh sẵn (chỉ đo latency/RTF, không có WER).
 """
 
+import base64
+import io
+import math
+import os
+import random
+import re
+import struct
+import unicodedata
+import uuid
+import wave
 import requests
 import time
 import statistics
 import json
 import sys
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
 
@@ -224,19 +244,358 @@ class TranslationBenchmark(ServiceBenchmark):
             print(f"  ❌ Poor cache performance")
 
 
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q trong 0-100); None nếu không có dữ liệu"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(math.ceil(q / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def distribution(values: List[float]) -> Optional[Dict[str, float]]:
+    """mean + p50/p90/p95/p99 (làm tròn 4 chữ số)"""
+    if not values:
+        return None
+    stats = {"mean": statistics.mean(values)}
+    for q in (50, 90, 95, 99):
+        stats[f"p{q}"] = percentile(values, q)
+    return {key: round(value, 4) for key, value in stats.items()}
+
+
+def normalize_transcript(text: str) -> List[str]:
+    """Lowercase, bỏ dấu câu (giữ dấu tiếng Việt), tách từ"""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    text = re.sub(r"[^\w\s']", " ", text)
+    return text.split()
+
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """(số lỗi substitution + deletion + insertion, số từ reference) theo Levenshtein trên từ"""
+    ref, hyp = normalize_transcript(reference), normalize_transcript(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,                              # deletion
+                current[j - 1] + 1,                           # insertion
+                previous[j - 1] + (ref_word != hyp_word)      # substitution
+            )
+        previous = current
+    return previous[-1], len(ref)
+
+
+class AudioSample:
+    """Một file audio PCM16 (WAV) + transcript tham chiếu (None với fixture sinh sẵn)"""
+
+    def __init__(self, name: str, wav_bytes: bytes, language: str, reference: Optional[str]):
+        self.name = name
+        self.wav_bytes = wav_bytes
+        self.language = language
+        self.reference = reference
+        with wave.open(io.BytesIO(wav_bytes)) as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{name}: only PCM16 WAV is supported")
+            self.sample_rate = wav.getframerate()
+            self.channels = wav.getnchannels()
+            self.pcm = wav.readframes(wav.getnframes())
+        self.duration = len(self.pcm) / (2 * self.channels * self.sample_rate)
+
+    def chunks(self, chunk_ms: int) -> List[bytes]:
+        """PCM16 interleaved theo chunk chunk_ms"""
+        size = int(self.sample_rate * chunk_ms / 1000) * 2 * self.channels
+        return [self.pcm[i:i + size] for i in range(0, len(self.pcm), size)]
+
+
+def synthesize_fixture(duration: float, sample_rate: int = 16000, seed: int = 0) -> bytes:
+    """WAV PCM16: tone (220Hz + harmonics, điều biên 4Hz như nhịp âm tiết) xen khoảng lặng + noise"""
+    rng = random.Random(seed)
+    frames = bytearray()
+    for n in range(int(duration * sample_rate)):
+        t = n / sample_rate
+        voiced = (t % 2.0) < 1.6  # 1.6s "nói", 0.4s lặng
+        envelope = 0.5 * (1 - math.cos(2 * math.pi * 4 * t)) if voiced else 0.0
+        tone = sum(math.sin(2 * math.pi * 220 * k * t) / k for k in (1, 2, 3))
+        value = 0.25 * envelope * tone + 0.01 * rng.gauss(0, 1)
+        frames += struct.pack("<h", max(-32768, min(32767, int(value * 32767))))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def load_stt_corpus(corpus_dir: Optional[str], default_language: str) -> List[AudioSample]:
+    """Đọc corpus (manifest.jsonl hoặc *.wav + .txt); thiếu corpus → fixture tone/noise 1s, 3s, 10s"""
+    if not corpus_dir or not os.path.isdir(corpus_dir):
+        if corpus_dir:
+            print(f"⚠️  Corpus {corpus_dir} not found, using generated tone/noise fixtures (no WER)")
+        return [
+            AudioSample(f"fixture-{duration}s.wav", synthesize_fixture(duration, seed=i), default_language, None)
+            for i, duration in enumerate((1, 3, 10))
+        ]
+
+    samples = []
+    manifest = os.path.join(corpus_dir, "manifest.jsonl")
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                path = os.path.join(corpus_dir, entry["audio"])
+                with open(path, "rb") as audio:
+                    samples.append(AudioSample(
+                        entry["audio"], audio.read(), entry.get("language", default_language), entry.get("text")
+                    ))
+        return samples
+
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(".wav"):
+                continue
+            path = os.path.join(root, name)
+            transcript_path = os.path.splitext(path)[0] + ".txt"
+            reference = None
+            if os.path.exists(transcript_path):
+                with open(transcript_path, encoding="utf-8") as f:
+                    reference = f.read().strip()
+            parent = os.path.basename(root).lower()
+            language = parent if parent in ("vi", "en") else default_language
+            with open(path, "rb") as audio:
+                samples.append(AudioSample(os.path.relpath(path, corpus_dir), audio.read(), language, reference))
+    return samples
+
+
 class STTBenchmark(ServiceBenchmark):
-    """Benchmark cho STT Service"""
+    """Benchmark cho STT Service (Whisper hoặc Sherpa-ONNX, cùng API)"""
+    
+    ENDPOINTS = ("transcribe", "stream", "utterance")
     
     def __init__(self, base_url: str):
         super().__init__(base_url, "STT")
+        self.engine = "unknown"
+        self.records: List[Dict] = []  # Kết quả từng file × endpoint
     
     def check_health(self) -> bool:
         """Check service health"""
         try:
             response = requests.get(f"{self.base_url}/health", timeout=5)
+            if response.status_code == 200:
+                self.engine = response.json().get("engine", "whisper")
             return response.status_code == 200
         except:
             return False
+    
+    def record(self, endpoint: str, sample: AudioSample, model: str, text: str, **metrics):
+        """Lưu kết quả một lần chạy (kèm số lỗi từ nếu có reference)"""
+        errors, words = word_errors(sample.reference, text) if sample.reference is not None else (None, None)
+        self.records.append({
+            "endpoint": endpoint,
+            "file": sample.name,
+            "language": sample.language,
+            "model": model or "unknown",
+            "audio_seconds": round(sample.duration, 3),
+            "text": text,
+            "word_errors": errors,
+            "reference_words": words,
+            **metrics
+        })
+    
+    def transcribe_file(self, sample: AudioSample):
+        """POST /transcribe (upload cả file): latency + RTF"""
+        start = time.time()
+        try:
+            response = requests.post(
+                f"{self.base_url}/transcribe",
+                files={"audio": (os.path.basename(sample.name), sample.wav_bytes, "audio/wav")},
+                params={"language": sample.language},
+                timeout=max(60, sample.duration * 5)
+            )
+            latency = time.time() - start
+            if response.status_code != 200:
+                print(f"❌ /transcribe {sample.name}: {response.status_code} - {response.text[:100]}")
+                self.record("transcribe", sample, None, "", error=response.status_code)
+                return
+            data = response.json()
+            self.record(
+                "transcribe", sample, data.get("model_used"), data.get("text", ""),
+                latency=latency, rtf=latency / sample.duration
+            )
+            print(f"  /transcribe {sample.name}: {latency:.3f}s | RTF {latency / sample.duration:.3f} | {data.get('text', '')[:60]}")
+        except Exception as e:
+            print(f"❌ /transcribe {sample.name}: {str(e)}")
+            self.record("transcribe", sample, None, "", error=str(e))
+    
+    def transcribe_utterance(self, sample: AudioSample):
+        """POST /api/v1/transcribe-vi-utterance (Sherpa, chỉ tiếng Việt): cả utterance trong một request"""
+        start = time.time()
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/v1/transcribe-vi-utterance",
+                json={
+                    "participant_id": f"bench-{uuid.uuid4().hex[:8]}",
+                    "audio_data": base64.b64encode(sample.pcm).decode("ascii"),
+                    "sample_rate": sample.sample_rate,
+                    "channels": sample.channels,
+                    "format": "pcm16",
+                    "language": "vi"
+                },
+                timeout=max(60, sample.duration * 5)
+            )
+            latency = time.time() - start
+            if response.status_code != 200:
+                print(f"❌ utterance {sample.name}: {response.status_code} - {response.text[:100]}")
+                self.record("utterance", sample, None, "", error=response.status_code)
+                return
+            data = response.json()
+            self.record(
+                "utterance", sample, data.get("model_used"), data.get("text", ""),
+                latency=latency, rtf=latency / sample.duration
+            )
+            print(f"  utterance {sample.name}: {latency:.3f}s | RTF {latency / sample.duration:.3f} | {data.get('text', '')[:60]}")
+        except Exception as e:
+            print(f"❌ utterance {sample.name}: {str(e)}")
+            self.record("utterance", sample, None, "", error=str(e))
+    
+    def transcribe_stream(self, sample: AudioSample, chunk_ms: int = 100, realtime: bool = True):
+        """
+        stream-start → chunk PCM16 qua /api/v1/transcribe-stream → stream-end
+        
+        Đo latency từng chunk (tất cả / chunk có decode), time-to-first-text (từ chunk đầu tiên
+        tới response đầu tiên có text), RTF = tổng thời gian xử lý chunk / độ dài audio.
+        realtime=True: gửi chunk theo nhịp thời gian thật (như gateway).
+        """
+        participant_id = f"bench-{uuid.uuid4().hex[:8]}"
+        session = requests.Session()
+        chunk_latencies, decode_latencies = [], []
+        final_texts = []
+        model = None
+        first_text = None
+        try:
+            session.post(
+                f"{self.base_url}/api/v1/stream-start",
+                json={"participant_id": participant_id, "language": sample.language},
+                timeout=10
+            ).raise_for_status()
+            stream_start = time.time()
+            for i, chunk in enumerate(sample.chunks(chunk_ms)):
+                if realtime:
+                    # Chunk i được "nói" xong tại i+1 chunk_ms tính từ lúc bắt đầu
+                    delay = stream_start + (i + 1) * chunk_ms / 1000 - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                sent = time.time()
+                response = session.post(
+                    f"{self.base_url}/api/v1/transcribe-stream",
+                    json={
+                        "participant_id": participant_id,
+                        "audio_data": base64.b64encode(chunk).decode("ascii"),
+                        "sample_rate": sample.sample_rate,
+                        "channels": sample.channels,
+                        "format": "pcm16",
+                        "language": sample.language
+                    },
+                    timeout=30
+                )
+                latency = time.time() - sent
+                chunk_latencies.append(latency)
+                if response.status_code != 200:
+                    continue  # 503 (quá tải) vẫn tính vào latency chunk
+                data = response.json()
+                if data.get("model_used") not in (None, "pending"):
+                    decode_latencies.append(latency)
+                    model = data["model_used"]
+                if first_text is None and (data.get("text") or data.get("unstable_text")):
+                    first_text = time.time() - stream_start
+                if data.get("is_final") and data.get("text"):
+                    final_texts.append(data["text"])
+            
+            end_sent = time.time()
+            response = session.post(
+                f"{self.base_url}/api/v1/stream-end", json={"participant_id": participant_id}, timeout=60
+            )
+            end_latency = time.time() - end_sent
+            if response.status_code == 200 and response.json().get("final_text"):
+                final_texts.append(response.json()["final_text"])
+            
+            text = " ".join(final_texts)
+            self.record(
+                "stream", sample, model, text,
+                chunk_latencies=[round(x, 4) for x in chunk_latencies],
+                decode_latencies=[round(x, 4) for x in decode_latencies],
+                time_to_first_text=first_text,
+                end_latency=end_latency,
+                rtf=(sum(chunk_latencies) + end_latency) / sample.duration
+            )
+            p95 = percentile(chunk_latencies, 95) or 0.0
+            print(f"  stream {sample.name}: {len(chunk_latencies)} chunks | p95 {p95:.3f}s | "
+                  f"TTFT {first_text if first_text is not None else float('nan'):.3f}s | {text[:60]}")
+        except Exception as e:
+            print(f"❌ stream {sample.name}: {str(e)}")
+            self.record("stream", sample, model, "", error=str(e))
+        finally:
+            session.close()
+    
+    def run(self, samples: List[AudioSample], endpoints: List[str], chunk_ms: int = 100,
+            realtime: bool = True, repeat: int = 1):
+        """Chạy các endpoint đã chọn trên toàn bộ corpus"""
+        for endpoint in endpoints:
+            self.print_header(f"STT {endpoint} ({self.engine}, {len(samples)} files x {repeat})")
+            for _ in range(repeat):
+                for sample in samples:
+                    if endpoint == "transcribe":
+                        self.transcribe_file(sample)
+                    elif endpoint == "stream":
+                        self.transcribe_stream(sample, chunk_ms, realtime)
+                    elif endpoint == "utterance":
+                        if sample.language != "vi":
+                            continue  # Endpoint chỉ nhận tiếng Việt
+                        self.transcribe_utterance(sample)
+    
+    def summarize(self) -> Dict[str, Dict]:
+        """Gom kết quả theo endpoint / model / ngôn ngữ: RTF, latency, chunk latency, TTFT, WER"""
+        groups: Dict[str, List[Dict]] = {}
+        for record in self.records:
+            key = f"{record['endpoint']}/{record['model']}/{record['language']}"
+            groups.setdefault(key, []).append(record)
+        
+        summary = {}
+        for key, records in sorted(groups.items()):
+            ok = [r for r in records if "error" not in r]
+            scored = [r for r in ok if r["word_errors"] is not None]
+            reference_words = sum(r["reference_words"] for r in scored)
+            summary[key] = {
+                "runs": len(records),
+                "errors": len(records) - len(ok),
+                "audio_seconds": round(sum(r["audio_seconds"] for r in ok), 3),
+                "rtf": distribution([r["rtf"] for r in ok]),
+                "latency": distribution([r["latency"] for r in ok if "latency" in r]),
+                "chunk_latency": distribution([x for r in ok for x in r.get("chunk_latencies", [])]),
+                "decode_chunk_latency": distribution([x for r in ok for x in r.get("decode_latencies", [])]),
+                "time_to_first_text": distribution(
+                    [r["time_to_first_text"] for r in ok if r.get("time_to_first_text") is not None]
+                ),
+                "end_latency": distribution([r["end_latency"] for r in ok if "end_latency" in r]),
+                # Corpus-level WER: tổng lỗi / tổng từ reference
+                "wer": round(sum(r["word_errors"] for r in scored) / reference_words, 4) if reference_words else None
+            }
+        return summary
+    
+    def print_summary(self, summary: Dict[str, Dict]):
+        self.print_header("STT Summary")
+        for key, stats in summary.items():
+            print(f"\n📊 {key}  (runs={stats['runs']}, errors={stats['errors']}, audio={stats['audio_seconds']:.1f}s)")
+            for metric in ("rtf", "latency", "chunk_latency", "decode_chunk_latency", "time_to_first_text", "end_latency"):
+                if stats[metric]:
+                    values = stats[metric]
+                    print(f"  {metric:22s} mean {values['mean']:.3f} | p50 {values['p50']:.3f} | "
+                          f"p95 {values['p95']:.3f} | p99 {values['p99']:.3f}")
+            if stats["wer"] is not None:
+                print(f"  {'wer':22s} {stats['wer'] * 100:.2f}%")
 
 
 class TTSBenchmark(ServiceBenchmark):
@@ -299,6 +658,48 @@ class TTSBenchmark(ServiceBenchmark):
         return latencies
 
 
+def run_stt_benchmark(args) -> int:
+    """STT benchmark mode; trả về exit code"""
+    print("\n" + "🎙️ "*40)
+    print("  STT SERVICE BENCHMARK")
+    print("🎙️ "*40)
+    
+    stt_bench = STTBenchmark(args.stt_url)
+    if not stt_bench.check_health():
+        print(f"❌ STT service at {args.stt_url} is not healthy")
+        return 1
+    
+    samples = load_stt_corpus(args.stt_corpus, args.stt_language)
+    print(f"\n🎧 {len(samples)} files, {sum(s.duration for s in samples):.1f}s audio, engine: {stt_bench.engine}")
+    
+    endpoints = [e.strip() for e in args.stt_endpoints.split(",") if e.strip() in STTBenchmark.ENDPOINTS]
+    if "utterance" in endpoints and stt_bench.engine != "sherpa-onnx":
+        print("⚠️  /api/v1/transcribe-vi-utterance chỉ có ở Sherpa service, bỏ qua")
+        endpoints.remove("utterance")
+    
+    stt_bench.run(
+        samples, endpoints, chunk_ms=args.stt_chunk_ms,
+        realtime=not args.stt_no_pacing, repeat=args.stt_repeat
+    )
+    summary = stt_bench.summarize()
+    stt_bench.print_summary(summary)
+    
+    if args.stt_output:
+        with open(args.stt_output, "w", encoding="utf-8") as f:
+            json.dump({
+                "service": args.stt_url,
+                "engine": stt_bench.engine,
+                "corpus": args.stt_corpus or "generated-fixtures",
+                "chunk_ms": args.stt_chunk_ms,
+                "paced": not args.stt_no_pacing,
+                "timestamp": time.time(),
+                "summary": summary,
+                "runs": stt_bench.records
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Results written to {args.stt_output}")
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser(description="Benchmark Translation Services")
     parser.add_argument('--translation-url', default='http://10.148.0.2:8003',
@@ -309,9 +710,28 @@ def main():
                        help='TTS service URL')
     parser.add_argument('--skip-concurrent', action='store_true',
                        help='Skip concurrent load test')
+    parser.add_argument('--stt', action='store_true',
+                       help='Chỉ chạy STT benchmark (RTF, chunk latency, time-to-first-text, WER)')
+    parser.add_argument('--stt-corpus', default=None,
+                       help='Thư mục corpus: manifest.jsonl hoặc *.wav + .txt (mặc định: fixture tone/noise)')
+    parser.add_argument('--stt-language', default='vi',
+                       help='Ngôn ngữ mặc định của file trong corpus')
+    parser.add_argument('--stt-endpoints', default='transcribe,stream,utterance',
+                       help='Endpoint cần đo: transcribe, stream, utterance (utterance chỉ có ở Sherpa)')
+    parser.add_argument('--stt-chunk-ms', type=int, default=100,
+                       help='Độ dài mỗi chunk streaming (ms)')
+    parser.add_argument('--stt-no-pacing', action='store_true',
+                       help='Gửi chunk streaming liên tục thay vì theo nhịp thời gian thật')
+    parser.add_argument('--stt-repeat', type=int, default=1,
+                       help='Số lần lặp corpus')
+    parser.add_argument('--stt-output', default=None,
+                       help='Ghi kết quả STT (summary + từng file) ra JSON')
     
     args = parser.parse_args()
     
+    if args.stt:
+        sys.exit(run_stt_benchmark(args))
+    
     print("\n" + "🚀"*40)
     print("  TRANSLATION SERVICES PERFORMANCE BENCHMARK")
     print("🚀"*40)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark audio preprocessing cho STT streaming path (10 chunk/giây, 100ms mỗi chunk)
+So sánh thời gian + số lần cấp phát mỗi chunk giữa pipeline cũ (astype → mean → resample → normalize)
+và ChunkPreprocessor (scratch buffers per-session, out= / in-place ufuncs)
+
+Usage:
+    python scripts/benchmark_stt_preprocessing.py
+    python scripts/benchmark_stt_preprocessing.py --sample-rate 44100 --channels 2 --chunks 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "stt"))
+
+from utils.audio_processor import AudioProcessor, ChunkPreprocessor, StreamingResampler  # noqa: E402
+
+
+def make_chunks(sample_rate: int, channels: int, count: int, chunk_ms: int = 100):
+    """PCM16 chunks (sine + noise), interleaved nếu channels > 1"""
+    rng = np.random.default_rng(0)
+    n = sample_rate * chunk_ms // 1000
+    t = np.arange(n * count) / sample_rate
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    pcm = (np.repeat(audio[:, None], channels, axis=1) * 32767).astype(np.int16)
+    return [pcm[i * n:(i + 1) * n] if channels > 1 else pcm[i * n:(i + 1) * n, 0] for i in range(count)]
+
+
+def legacy_pipeline(sample_rate: int, normalize: bool):
+    """Pipeline trước ChunkPreprocessor: mỗi bước một mảng mới"""
+    resampler = StreamingResampler(sample_rate, 16000) if sample_rate != 16000 else None
+
+    def run(pcm):
+        audio = pcm.astype(np.float32) / 32768.0
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1).astype(np.float32)
+        if resampler is not None:
+            # upfirdn path (không truyền out=) như trước
+            audio = resampler.process(audio)
+            audio = audio.astype(np.float32)
+        if normalize:
+            peak = np.abs(audio).max()
+            if peak > 0:
+                audio = (audio / peak).astype(np.float32)
+        return audio
+    return run
+
+
+def sherpa_pipeline(sample_rate: int, normalize: bool):
+    """AudioProcessor.process_for_sherpa (đã bỏ astype/abs thừa)"""
+    processor = AudioProcessor()
+    resampler = StreamingResampler(sample_rate, 16000)
+
+    def run(pcm):
+        channels = pcm.shape[1] if pcm.ndim > 1 else 1
+        audio, _ = processor.process_for_sherpa(
+            pcm, sample_rate, channels=channels, overlap_ms=0, normalize=normalize, resampler=resampler
+        )
+        return audio
+    return run
+
+
+def fused_pipeline(sample_rate: int, normalize: bool):
+    """ChunkPreprocessor: scratch buffers per-session"""
+    preprocessor = ChunkPreprocessor(sample_rate, 16000)
+
+    def run(pcm):
+        return preprocessor.process(pcm, normalize=normalize)
+    return run
+
+
+def measure(name: str, run, chunks):
+    # Warm-up: scratch buffers đạt kích thước ổn định
+    for pcm in chunks[:5]:
+        run(pcm)
+
+    start = time.perf_counter()
+    for pcm in chunks:
+        run(pcm)
+    elapsed = time.perf_counter() - start
+
+    # Đếm cấp phát (numpy báo data buffer cho tracemalloc)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for pcm in chunks:
+        run(pcm)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    allocated = sum(max(stat.size_diff, 0) for stat in stats)
+    blocks = sum(max(stat.count_diff, 0) for stat in stats)
+
+    # Tổng bytes đã cấp phát (kể cả đã giải phóng): chạy lại với từng chunk một
+    tracemalloc.start()
+    churn = 0
+    for pcm in chunks[:200]:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        run(pcm)
+        _, chunk_peak = tracemalloc.get_traced_memory()
+        churn += chunk_peak - base
+    tracemalloc.stop()
+
+    n = len(chunks)
+    return {
+        "name": name,
+        "us_per_chunk": elapsed / n * 1e6,
+        "peak_bytes_per_chunk": churn / min(n, 200),
+        "retained_bytes": allocated,
+        "retained_blocks": blocks,
+        "tracemalloc_peak": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STT audio preprocessing allocations")
+    parser.add_argument("--sample-rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--chunks", type=int, default=1000, help="Số chunk 100ms")
+    parser.add_argument("--normalize", action="store_true", help="Normalize từng chunk (Sherpa utterance mode)")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.sample_rate, args.channels, args.chunks)
+    print(f"\n{'=' * 72}")
+    print(f"  Audio preprocessing: {args.sample_rate}Hz x{args.channels} → 16kHz mono, "
+          f"{args.chunks} chunks x 100ms, normalize={args.normalize}")
+    print(f"{'=' * 72}")
+    print(f"{'pipeline':<22}{'µs/chunk':>12}{'alloc B/chunk':>16}{'retained B':>14}")
+
+    for name, factory in (
+        ("legacy", legacy_pipeline),
+        ("process_for_sherpa", sherpa_pipeline),
+        ("ChunkPreprocessor", fused_pipeline),
+    ):
+        result = measure(name, factory(args.sample_rate, args.normalize), chunks)
+        print(f"{result['name']:<22}{result['us_per_chunk']:>12.1f}"
+              f"{result['peak_bytes_per_chunk']:>16.0f}{result['retained_bytes']:>14}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark Vietnamese punctuation restoration cho STT service
+So sánh side-by-side: rule-based nhiều pass (bản cũ), rule-based một pass (utils/punctuation)
+và ONNX model (batched, nếu có --model-dir)
+
+Usage:
+    python scripts/benchmark_stt_punctuation.py
+    python scripts/benchmark_stt_punctuation.py --model-dir /app/models/vi-punctuation --batch-sizes 1,8,16
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "stt"))
+
+from utils.punctuation import OnnxPunctuationBackend, restore_vietnamese_punctuation  # noqa: E402
+
+WORDS = (
+    "tôi hôm nay đi học và gặp bạn nhưng trời mưa nên chúng tôi ở nhà thì rất buồn mà không ai "
+    "biết tại sao như thế nào khi nào ở đâu nếu bởi vì công việc của chúng ta cần phải hoàn thành "
+    "trước cuối tuần gì sao không"
+).split()
+
+
+def legacy_restore(text: str) -> str:
+    """Bản rule-based cũ: 7 re.sub + tối đa 8 re.search + regex viết hoa với lambda"""
+    if not text or len(text.strip()) == 0:
+        return text
+    text = text.strip()
+    for word in ("và", "nhưng", "nên", "thì", "mà", "nếu", "bởi vì"):
+        text = re.sub(r'\b(' + word + r')\b(?!\s*[,.])', r'\1,', text, flags=re.IGNORECASE)
+    question_markers = [
+        r'\b(không)\s*$', r'\b(sao)\b', r'\b(gì)\b', r'\b(như thế nào)\b',
+        r'\b(tại sao)\b', r'\b(khi nào)\b', r'\b(ở đâu)\b', r'\b(ai)\b\s+',
+    ]
+    is_question = any(re.search(pattern, text, re.IGNORECASE) for pattern in question_markers)
+    if not re.search(r'[.!?]$', text):
+        text = text + ('?' if is_question else '.')
+    text = text[0].upper() + text[1:] if len(text) > 0 else text
+    return re.sub(r'([.!?])\s+(\w)', lambda m: m.group(1) + ' ' + m.group(2).upper(), text)
+
+
+def make_corpus(count: int, min_words: int, max_words: int):
+    rng = random.Random(0)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def bench_per_text(name: str, fn, corpus):
+    latencies = []
+    for text in corpus:
+        start = time.perf_counter()
+        fn(text)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return {
+        "name": name,
+        "mean_us": statistics.mean(latencies),
+        "p50_us": latencies[len(latencies) // 2],
+        "p99_us": latencies[int(len(latencies) * 0.99)],
+        "texts_per_s": len(corpus) / (sum(latencies) / 1e6),
+    }
+
+
+def bench_batched(name: str, backend, corpus, batch_size: int):
+    latencies = []
+    for i in range(0, len(corpus), batch_size):
+        batch = corpus[i:i + batch_size]
+        start = time.perf_counter()
+        backend.punctuate_batch(batch)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    total = sum(latencies) / 1e6
+    return {
+        "name": f"{name} (batch={batch_size})",
+        "mean_us": statistics.mean(latencies),
+        "p50_us": latencies[len(latencies) // 2],
+        "p99_us": latencies[int(len(latencies) * 0.99)],
+        "texts_per_s": len(corpus) / total,
+    }
+
+
+def print_row(result):
+    print(f"{result['name']:<32}{result['mean_us']:>12.1f}{result['p50_us']:>12.1f}"
+          f"{result['p99_us']:>12.1f}{result['texts_per_s']:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STT punctuation backends")
+    parser.add_argument("--count", type=int, default=5000, help="Số transcript")
+    parser.add_argument("--min-words", type=int, default=5)
+    parser.add_argument("--max-words", type=int, default=40)
+    parser.add_argument("--model-dir", default=None, help="Thư mục ONNX model (model.onnx, tokenizer.json, labels.json)")
+    parser.add_argument("--threads", type=int, default=1, help="intra-op threads cho ONNX")
+    parser.add_argument("--batch-sizes", default="1,4,16", help="Batch sizes cho ONNX backend")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.count, args.min_words, args.max_words)
+
+    mismatches = sum(legacy_restore(text) != restore_vietnamese_punctuation(text) for text in corpus)
+    print(f"\nRule engines agree on {len(corpus) - mismatches}/{len(corpus)} transcripts")
+
+    print(f"\n{'=' * 82}")
+    print(f"  Punctuation: {len(corpus)} transcripts, {args.min_words}-{args.max_words} words")
+    print(f"{'=' * 82}")
+    print(f"{'backend':<32}{'mean µs':>12}{'p50 µs':>12}{'p99 µs':>12}{'texts/s':>14}")
+    print_row(bench_per_text("rules (multi-pass, legacy)", legacy_restore, corpus))
+    print_row(bench_per_text("rules (single-pass)", restore_vietnamese_punctuation, corpus))
+
+    if args.model_dir:
+        backend = OnnxPunctuationBackend(args.model_dir, num_threads=args.threads)
+        backend.punctuate_batch(corpus[:4])  # warm-up
+        for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+            print_row(bench_batched("onnx", backend, corpus, batch_size))
+        print("\nSample:")
+        for text in corpus[:3]:
+            print(f"  rules: {restore_vietnamese_punctuation(text)}")
+            print(f"  onnx : {backend.punctuate_batch([text])[0]}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
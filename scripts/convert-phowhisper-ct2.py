@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Convert PhoWhisper (HuggingFace Transformers) sang CTranslate2 INT8
+để STT service chạy qua faster-whisper runtime (prefer_model="phowhisper-ct2").
+
+Yêu cầu: pip install ctranslate2 transformers torch
+
+Usage:
+    python scripts/convert-phowhisper-ct2.py --output-dir /app/models/phowhisper-ct2
+    python scripts/convert-phowhisper-ct2.py --model vinai/PhoWhisper-base --quantization int8_float32
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+# Các file faster-whisper cần đọc cạnh model.bin
+COPY_FILES = ["preprocessor_config.json", "generation_config.json"]
+
+
+def convert(model_name: str, output_dir: str, quantization: str, force: bool) -> None:
+    """
+    Convert model + ghi tokenizer.json (fast tokenizer) vào output_dir.
+    """
+    try:
+        import ctranslate2
+        from transformers import AutoTokenizer
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e}. Run: pip install ctranslate2 transformers torch")
+        sys.exit(1)
+
+    if os.path.exists(output_dir) and not force:
+        print(f"❌ {output_dir} already exists (use --force to overwrite)")
+        sys.exit(1)
+
+    print(f"🔄 Converting {model_name} → {output_dir} (quantization={quantization})...")
+    converter = ctranslate2.converters.TransformersConverter(
+        model_name,
+        copy_files=COPY_FILES,
+        load_as_float16=False,
+    )
+    converter.convert(output_dir, quantization=quantization, force=force)
+
+    # PhoWhisper repo không có tokenizer.json → tạo từ fast tokenizer
+    # (nếu thiếu, faster-whisper sẽ fallback sang tokenizer của openai/whisper)
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    tmp_dir = os.path.join(output_dir, "_tokenizer")
+    tokenizer.save_pretrained(tmp_dir)
+    shutil.move(os.path.join(tmp_dir, "tokenizer.json"), os.path.join(output_dir, "tokenizer.json"))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    size_mb = sum(
+        os.path.getsize(os.path.join(output_dir, f)) for f in os.listdir(output_dir)
+    ) / (1024 * 1024)
+    print(f"✅ Done: {output_dir} ({size_mb:.0f} MB)")
+    print(f"   Set PHOWHISPER_CT2_PATH={output_dir} for the STT service")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert PhoWhisper to CTranslate2")
+    parser.add_argument('--model', default='vinai/PhoWhisper-small',
+                        help='HuggingFace model name or local path')
+    parser.add_argument('--output-dir', default='models/phowhisper-ct2',
+                        help='Output directory for the CTranslate2 model')
+    parser.add_argument('--quantization', default='int8',
+                        choices=['int8', 'int8_float32', 'int16', 'float32'],
+                        help='Weight quantization')
+    parser.add_argument('--force', action='store_true',
+                        help='Overwrite output directory')
+    args = parser.parse_args()
+
+    convert(args.model, args.output_dir, args.quantization, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Resource plan: chia CPU cores cho các model cùng chạy trong một process.
+
+Mỗi model được gán một tập core riêng (không chồng lấn) lấy từ `os.sched_getaffinity(0)`
+(đã tính cpuset của container); số intra-op threads của runtime = số core được gán,
+inter-op = 1. Thread load model và thread chạy inference được pin vào tập core đó → thread
+pool của ONNX Runtime / CTranslate2 / OpenMP (tạo lúc load hoặc lần chạy đầu, thừa hưởng
+affinity của thread tạo ra nó) không tranh core và cache với model khác.
+
+Env:
+- STT_RESOURCE_PLAN: "auto" (mặc định) | "off" | gán tay "vi=0-3;en=4-7" (model không được
+  gán tay chia phần core còn lại).
+- STT_RESERVED_CORES: số core đầu tiên chừa lại cho event loop, ffmpeg, VAD, punctuation.
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores() -> Tuple[int, ...]:
+  """Core process được phép chạy (cpuset/taskset); fallback os.cpu_count()."""
+  try:
+    return tuple(sorted(os.sched_getaffinity(0)))
+  except (AttributeError, OSError):
+    return tuple(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(value: str) -> Tuple[int, ...]:
+  """ "0-3,8,10-11" (cú pháp taskset / cpuset) → (0, 1, 2, 3, 8, 10, 11)."""
+  cores = set()
+  for part in value.split(","):
+    part = part.strip()
+    if not part:
+      continue
+    first, _, last = part.partition("-")
+    cores.update(range(int(first), int(last or first) + 1))
+  return tuple(sorted(cores))
+
+
+def format_cpu_list(cores: Sequence[int]) -> str:
+  """(0, 1, 2, 3, 8) → "0-3,8"."""
+  ranges: List[str] = []
+  cores = sorted(cores)
+  i = 0
+  while i < len(cores):
+    j = i
+    while j + 1 < len(cores) and cores[j + 1] == cores[j] + 1:
+      j += 1
+    ranges.append(str(cores[i]) if i == j else f"{cores[i]}-{cores[j]}")
+    i = j + 1
+  return ",".join(ranges) or "-"
+
+
+@dataclass(frozen=True)
+class CoreAllocation:
+  """Tập core của một model; shared=True khi không đủ core để chia riêng."""
+  name: str
+  cores: Tuple[int, ...]
+  shared: bool = False
+
+  @property
+  def intra_op_threads(self) -> int:
+    return max(len(self.cores), 1)
+
+  @property
+  def inter_op_threads(self) -> int:
+    return 1
+
+
+class ResourcePlan:
+  """
+  - `threads(name, default)`: intra-op threads cho runtime của model (plan tắt → default).
+  - `pinned(name)`: context manager pin thread hiện tại vào core của model (load model / inference).
+  - `bind(name, fn)`: fn chạy trong `pinned(name)` (batch fn của MicroBatcher, job của executor).
+  """
+
+  def __init__(
+    self,
+    allocations: Dict[str, CoreAllocation],
+    available: Tuple[int, ...],
+    mode: str = "auto",
+  ):
+    self.allocations = allocations
+    self.available = available
+    self.mode = mode
+
+  @property
+  def enabled(self) -> bool:
+    return bool(self.allocations)
+
+  @property
+  def unassigned(self) -> Tuple[int, ...]:
+    used = {core for allocation in self.allocations.values() for core in allocation.cores}
+    return tuple(core for core in self.available if core not in used)
+
+  def threads(self, name: str, default: int) -> int:
+    allocation = self.allocations.get(name)
+    return allocation.intra_op_threads if allocation is not None else default
+
+  @contextmanager
+  def pinned(self, name: str) -> Iterator[None]:
+    allocation = self.allocations.get(name)
+    if allocation is None:
+      yield
+      return
+    # pid 0 = thread hiện tại (Linux), thread con tạo sau đó thừa hưởng mask này
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, allocation.cores)
+    try:
+      yield
+    finally:
+      os.sched_setaffinity(0, previous)
+
+  def bind(self, name: str, fn: Callable) -> Callable:
+    if name not in self.allocations:
+      return fn
+
+    def run(*args, **kwargs):
+      with self.pinned(name):
+        return fn(*args, **kwargs)
+
+    return run
+
+  def to_dict(self) -> dict:
+    return {
+      "mode": self.mode,
+      "available_cores": format_cpu_list(self.available),
+      "unassigned_cores": format_cpu_list(self.unassigned),
+      "models": {
+        name: {
+          "cores": format_cpu_list(allocation.cores),
+          "intra_op_threads": allocation.intra_op_threads,
+          "inter_op_threads": allocation.inter_op_threads,
+          "shared": allocation.shared,
+        }
+        for name, allocation in self.allocations.items()
+      },
+    }
+
+  def log_report(self):
+    """Startup report: layout core → model."""
+    if not self.enabled:
+      logger.info(
+        "🧮 Resource plan: off (%d cores available: %s), runtimes dùng thread count mặc định",
+        len(self.available), format_cpu_list(self.available),
+      )
+      return
+    logger.info(
+      "🧮 Resource plan (%s): %d cores available: %s",
+      self.mode, len(self.available), format_cpu_list(self.available),
+    )
+    for name, allocation in self.allocations.items():
+      logger.info(
+        "   %-16s cores=%-10s intra_op=%d inter_op=%d%s",
+        name, format_cpu_list(allocation.cores), allocation.intra_op_threads,
+        allocation.inter_op_threads, "  ⚠️ shared (not enough cores)" if allocation.shared else "",
+      )
+    logger.info("   %-16s cores=%s", "unassigned", format_cpu_list(self.unassigned))
+
+
+def _split_cores(
+  requests: Dict[str, int], cores: Tuple[int, ...]
+) -> Dict[str, CoreAllocation]:
+  """
+  Chia hết `cores` thành các tập liền nhau theo tỉ lệ số thread mỗi model yêu cầu (mỗi model
+  ≥ 1 core); ít core hơn số model thì các model dùng chung.
+  """
+  if not requests:
+    return {}
+  if len(cores) < len(requests):
+    return {
+      name: CoreAllocation(name, (cores[i % len(cores)],), shared=True)
+      for i, name in enumerate(requests)
+    }
+
+  weights = {name: max(count, 1) for name, count in requests.items()}
+  total = sum(weights.values())
+  # Largest remainder: tổng đúng bằng số core, mỗi model ≥ 1
+  spare = len(cores) - len(weights)
+  shares = {name: weight * spare / total for name, weight in weights.items()}
+  counts = {name: 1 + int(share) for name, share in shares.items()}
+  leftover = len(cores) - sum(counts.values())
+  for name in sorted(shares, key=lambda n: shares[n] - int(shares[n]), reverse=True)[:leftover]:
+    counts[name] += 1
+
+  allocations = {}
+  offset = 0
+  for name, count in counts.items():
+    allocations[name] = CoreAllocation(name, cores[offset:offset + count])
+    offset += count
+  return allocations
+
+
+def build_resource_plan(
+  requests: Dict[str, int],
+  spec: Optional[str] = None,
+  reserved_cores: int = 0,
+  available: Optional[Tuple[int, ...]] = None,
+) -> ResourcePlan:
+  """
+  requests: {model: trọng số (num_threads cấu hình sẵn)} theo thứ tự load.
+  spec: "auto" | "off" | "vi=0-3;en=4-7".
+  """
+  available = available if available is not None else available_cores()
+  spec = (spec or "auto").strip()
+  if spec.lower() in ("off", "none", "false", "0"):
+    return ResourcePlan({}, available, mode="off")
+
+  allocations: Dict[str, CoreAllocation] = {}
+  mode = "auto"
+  if spec.lower() != "auto":
+    mode = "manual"
+    for item in spec.split(";"):
+      name, _, cpu_list = item.partition("=")
+      name = name.strip()
+      if not name or name not in requests:
+        logger.warning("⚠️ Resource plan: ignoring unknown model %r", name)
+        continue
+      cores = tuple(core for core in parse_cpu_list(cpu_list) if core in available)
+      if cores:
+        allocations[name] = CoreAllocation(name, cores)
+
+  used = {core for allocation in allocations.values() for core in allocation.cores}
+  free = tuple(core for core in available if core not in used)
+  # Core chừa lại chỉ lấy từ phần auto (gán tay thì người cấu hình tự quyết)
+  reserved = min(max(reserved_cores, 0), max(len(free) - 1, 0))
+  remaining = {name: count for name, count in requests.items() if name not in allocations}
+  pool = free[reserved:]
+  if remaining and not pool:
+    # Gán tay đã dùng hết core → model còn lại dùng chung toàn bộ core
+    logger.warning(
+      "⚠️ Resource plan: no cores left for %s, sharing all available cores (%s)",
+      ", ".join(remaining), format_cpu_list(available),
+    )
+    allocations.update({name: CoreAllocation(name, available, shared=True) for name in remaining})
+  else:
+    allocations.update(_split_cores(remaining, pool))
+  # Giữ thứ tự load trong report
+  ordered = {name: allocations[name] for name in requests if name in allocations}
+  return ResourcePlan(ordered, available, mode=mode)
+
+
+def resource_plan_from_env(requests: Dict[str, int]) -> ResourcePlan:
+  return build_resource_plan(
+    requests,
+    spec=os.getenv("STT_RESOURCE_PLAN", "auto"),
+    reserved_cores=int(os.getenv("STT_RESERVED_CORES", "0")),
+  )
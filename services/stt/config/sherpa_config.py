@@ -6,6 +6,7 @@ Vietnamese: Zipformer Transducer (offline)
 English: NeMo Parakeet TDT 0.6B Transducer (offline) - hỗ trợ punctuation & capitalization
 """
 
+import os
 from dataclasses import dataclass
 from typing import Optional
 
@@ -90,6 +91,149 @@ ENGLISH_MODEL = TransducerModelConfig(
 )
 
 
+@dataclass
+class OnlineTransducerModelConfig(TransducerModelConfig):
+  """Configuration cho streaming Zipformer (OnlineRecognizer) + endpoint detection.
+
+  Endpoint rules (giây / frame, theo sherpa-onnx):
+  - rule1: chưa decode được gì và im lặng >= rule1_min_trailing_silence
+  - rule2: đã có text và im lặng >= rule2_min_trailing_silence
+  - rule3: utterance dài >= rule3_min_utterance_length
+  """
+  model_type: str = "online_transducer"
+  rule1_min_trailing_silence: float = 2.4
+  rule2_min_trailing_silence: float = 0.8
+  rule3_min_utterance_length: float = 20.0
+
+
+# Streaming models (optional) - chỉ load khi STT_STREAMING_MODE=online và file tồn tại.
+# Đặt model streaming Zipformer đã export (encoder/decoder/joiner/tokens) vào model_dir.
+VIETNAMESE_STREAMING_MODEL = OnlineTransducerModelConfig(
+  name=os.getenv("STT_STREAMING_VI_NAME", "streaming-zipformer-vi"),
+  language="vi",
+  model_dir=os.getenv("STT_STREAMING_VI_DIR", "/app/models/vi-streaming"),
+  encoder_path="encoder.int8.onnx",
+  decoder_path="decoder.onnx",
+  joiner_path="joiner.int8.onnx",
+  tokens_path="tokens.txt",
+  num_threads=2,
+)
+
+ENGLISH_STREAMING_MODEL = OnlineTransducerModelConfig(
+  name="sherpa-onnx-streaming-zipformer-en-2023-06-26",
+  language="en",
+  model_dir=os.getenv("STT_STREAMING_EN_DIR", "/app/models/en-streaming"),
+  encoder_path="encoder-epoch-99-avg-1-chunk-16-left-128.int8.onnx",
+  decoder_path="decoder-epoch-99-avg-1-chunk-16-left-128.onnx",
+  joiner_path="joiner-epoch-99-avg-1-chunk-16-left-128.int8.onnx",
+  tokens_path="tokens.txt",
+  num_threads=2,
+)
+
+STREAMING_MODELS = {
+  "vi": VIETNAMESE_STREAMING_MODEL,
+  "en": ENGLISH_STREAMING_MODEL,
+}
+
+
+@dataclass
+class StreamingConfig:
+  """mode: "offline" (utterance mode, gateway VAD) hoặc "online" (OnlineRecognizer)."""
+  mode: str = "offline"
+
+
+STREAMING = StreamingConfig(mode=os.getenv("STT_STREAMING_MODE", "offline").lower())
+
+
+@dataclass
+class BatchingConfig:
+  """Micro-batching cho offline decode (gom utterance đồng thời → decode_streams)."""
+  window_ms: float = 10.0
+  max_batch_size: int = 8
+
+
+BATCHING = BatchingConfig(
+  window_ms=float(os.getenv("STT_BATCH_WINDOW_MS", "10")),
+  max_batch_size=int(os.getenv("STT_BATCH_MAX_SIZE", "8")),
+)
+
+
+@dataclass
+class InferenceConfig:
+  """
+  Thread pool cho decode: workers=None → tính từ num_threads của model.
+  scheduler_weights: trọng số priority class của fair scheduler ("off" → FIFO);
+  scheduler_quantum_seconds: quantum deficit round-robin (giây audio) mỗi participant mỗi lượt.
+  """
+  workers: Optional[int] = None
+  max_queue_size: int = 32
+  retry_after_seconds: int = 1
+  scheduler_weights: str = "streaming=8,batch=1"
+  scheduler_quantum_seconds: float = 1.0
+
+
+INFERENCE = InferenceConfig(
+  workers=int(os.environ["STT_INFERENCE_WORKERS"]) if os.getenv("STT_INFERENCE_WORKERS") else None,
+  max_queue_size=int(os.getenv("STT_INFERENCE_MAX_QUEUE", "32")),
+  retry_after_seconds=int(os.getenv("STT_INFERENCE_RETRY_AFTER", "1")),
+  scheduler_weights=os.getenv("STT_SCHEDULER_WEIGHTS", "streaming=8,batch=1"),
+  scheduler_quantum_seconds=float(os.getenv("STT_SCHEDULER_QUANTUM_SECONDS", "1.0")),
+)
+
+
+@dataclass
+class SessionConfig:
+  """Reaper cho streaming sessions: idle timeout + cap tổng audio đang buffer."""
+  idle_timeout_seconds: float = 120.0
+  max_buffered_bytes: int = 256 * 1024 * 1024
+  reap_interval_seconds: float = 10.0
+
+
+SESSIONS = SessionConfig(
+  idle_timeout_seconds=float(os.getenv("STT_SESSION_IDLE_TIMEOUT", "120")),
+  max_buffered_bytes=int(float(os.getenv("STT_SESSION_MAX_BUFFERED_MB", "256")) * 1024 * 1024),
+  reap_interval_seconds=float(os.getenv("STT_SESSION_REAP_INTERVAL", "10")),
+)
+
+
+@dataclass
+class VADConfig:
+  """VAD phía server trước inference: "energy" (energy + ZCR), "silero" (ONNX) hoặc "none" (tắt)."""
+  backend: str = "energy"
+  model_path: str = "/app/models/silero_vad.onnx"
+  threshold: float = 0.5
+  energy_floor_db: float = -45.0
+  hangover_ms: int = 300
+  padding_ms: int = 200
+
+
+VAD = VADConfig(
+  backend=os.getenv("STT_VAD_BACKEND", "energy").lower(),
+  model_path=os.getenv("STT_VAD_MODEL_PATH", "/app/models/silero_vad.onnx"),
+  threshold=float(os.getenv("STT_VAD_THRESHOLD", "0.5")),
+  energy_floor_db=float(os.getenv("STT_VAD_ENERGY_DB", "-45")),
+  hangover_ms=int(os.getenv("STT_VAD_HANGOVER_MS", "300")),
+  padding_ms=int(os.getenv("STT_VAD_PADDING_MS", "200")),
+)
+
+
+@dataclass
+class ModelRegistryConfig:
+  """
+  Offline recognizer (AVAILABLE_MODELS) load khi được dùng lần đầu.
+  memory_budget_mb: tổng RAM cho các model (0 = không giới hạn), vượt → evict model idle ít dùng nhất;
+  preload: ngôn ngữ load sẵn lúc startup ("vi,en", "" = load hết theo nhu cầu).
+  """
+  memory_budget_mb: int = 0
+  preload: str = "vi"
+
+
+MODEL_REGISTRY = ModelRegistryConfig(
+  memory_budget_mb=int(os.getenv("STT_MODEL_MEMORY_BUDGET_MB", "0")),
+  preload=os.getenv("STT_PRELOAD_MODELS", "vi"),
+)
+
+
 AVAILABLE_MODELS = {
   "vi": VIETNAMESE_MODEL,
   "en": ENGLISH_MODEL,
@@ -9,18 +9,20 @@ Model Strategy:
 - faster-whisper small: Fallback cho các ngôn ngữ khác
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Header, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Union, Dict
 import uvicorn
 import time
 import os
 import io
+import json
 import logging
+import asyncio
 from contextlib import asynccontextmanager
-import re
+from functools import partial
 import base64
 
 # Configure logging FIRST (before conditional imports)
@@ -50,81 +52,26 @@ except ImportError:
 
 import soundfile as sf
 import numpy as np
-import subprocess
-import tempfile
-import re
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from starlette.background import BackgroundTask
 from starlette.responses import Response
 
-
-# ==================== PUNCTUATION RESTORATION ====================
-def restore_vietnamese_punctuation(text: str) -> str:
-    """
-    Thêm dấu câu cơ bản cho text tiếng Việt sử dụng rule-based approach.
-    
-    RULES:
-    1. Thêm dấu phẩy (,) sau các từ nối: "và", "nhưng", "nên", "thì", "mà"
-    2. Thêm dấu chấm (.) ở cuối câu
-    3. Viết hoa chữ cái đầu câu
-    4. Thêm dấu hỏi (?) cho câu hỏi: "gì", "sao", "như thế nào", "không"
-    
-    Args:
-        text: Raw transcription text không dấu câu
-        
-    Returns:
-        Text đã có dấu câu
-        
-    Note: Đây là rule-based approach đơn giản. Để chính xác hơn,
-    cần dùng ML model như vinai/VietnamesePunctuation
-    """
-    if not text or len(text.strip()) == 0:
-        return text
-    
-    # Lowercase để dễ xử lý
-    text = text.strip()
-    
-    # Pattern 1: Thêm dấu phẩy sau từ nối (nếu chưa có)
-    conjunctions = [
-        (r'\b(và)\b(?!\s*[,.])', r'\1,'),
-        (r'\b(nhưng)\b(?!\s*[,.])', r'\1,'),
-        (r'\b(nên)\b(?!\s*[,.])', r'\1,'),
-        (r'\b(thì)\b(?!\s*[,.])', r'\1,'),
-        (r'\b(mà)\b(?!\s*[,.])', r'\1,'),
-        (r'\b(nếu)\b(?!\s*[,.])', r'\1,'),
-        (r'\b(bởi vì)\b(?!\s*[,.])', r'\1,'),
-    ]
-    
-    for pattern, replacement in conjunctions:
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-    
-    # Pattern 2: Thêm dấu hỏi cho câu hỏi
-    question_markers = [
-        r'\b(không)\s*$',  # "... không" ở cuối
-        r'\b(sao)\b',
-        r'\b(gì)\b',
-        r'\b(như thế nào)\b',
-        r'\b(tại sao)\b',
-        r'\b(khi nào)\b',
-        r'\b(ở đâu)\b',
-        r'\b(ai)\b\s+',
-    ]
-    
-    is_question = any(re.search(pattern, text, re.IGNORECASE) for pattern in question_markers)
-    
-    # Pattern 3: Thêm dấu chấm/hỏi cuối câu
-    if not re.search(r'[.!?]$', text):
-        text = text + ('?' if is_question else '.')
-    
-    # Pattern 4: Viết hoa chữ cái đầu câu
-    text = text[0].upper() + text[1:] if len(text) > 0 else text
-    
-    # Pattern 5: Viết hoa sau dấu chấm
-    text = re.sub(r'([.!?])\s+(\w)', lambda m: m.group(1) + ' ' + m.group(2).upper(), text)
-    
-    return text
-
-
-# ==================== END PUNCTUATION RESTORATION ====================
+from config.resource_plan import ResourcePlan, available_cores, resource_plan_from_env
+from utils.decoding_policy import DecodingPolicy, DecodingSettings, parse_budget
+from utils.ffmpeg_decoder import AudioDecodeError, FFmpegDecoder
+from utils.audio_processor import ChunkPreprocessor, normalize_peak, peak_abs, pcm16_view, resample_poly_cached
+from utils.fair_scheduler import PRIORITY_BATCH, PRIORITY_STREAMING, parse_class_weights, set_inference_flow
+from utils.inference_executor import AdmittedSlot, InferenceExecutor, InferenceQueueFull, workers_for_threads
+from utils.micro_batcher import MicroBatcher
+from utils.ring_buffer import AudioRingBuffer
+from utils.sentence_segmenter import SentenceSegmenter
+from utils.session_reaper import SessionReaper
+from utils.language_id import LanguageIdentifier, LanguagePin
+from utils.mel_cache import IncrementalLogMel
+from utils.longform import LongFormTranscriber, faster_whisper_segment_to_dict
+from utils.streaming_policy import LocalAgreementPolicy, words_from_segments, words_to_text
+from utils.vad import VAD_AUDIO_SECONDS, VoiceActivityDetector, create_vad_classifier
+from utils.punctuation import create_punctuator
 
 
 # Prometheus metrics
@@ -143,6 +90,11 @@ PROCESSING_TIME_HISTOGRAM = Histogram(
     'Processing time for transcription (including streaming)',
     buckets=[0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
 )
+TIME_TO_FIRST_SEGMENT_HISTOGRAM = Histogram(
+    'stt_time_to_first_segment_seconds',
+    'Time from request start to the first streamed segment (response_format=ndjson/sse)',
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+)
 AUDIO_LENGTH_HISTOGRAM = Histogram(
     'stt_audio_length_seconds',
     'Length of audio files processed',
@@ -152,27 +104,223 @@ AUDIO_LENGTH_HISTOGRAM = Histogram(
 # Global model instances
 phowhisper_model = None
 phowhisper_processor = None
+phowhisper_ct2_model = None  # PhoWhisper đã convert sang CTranslate2 INT8 (chạy qua faster-whisper)
 faster_whisper_model = None
 
+# Core riêng cho mỗi model đã load (tạo trong load_model; trước đó chưa pin gì)
+resource_plan = ResourcePlan({}, available_cores(), mode="off")
+
+# Punctuation cho transcript tiếng Việt: rule-based (mặc định) hoặc ONNX model (batched)
+punctuator = create_punctuator(
+    backend=os.getenv("STT_PUNCTUATION_BACKEND", "rules"),
+    model_dir=os.getenv("STT_PUNCTUATION_MODEL_DIR", "/app/models/vi-punctuation"),
+    num_threads=int(os.getenv("STT_PUNCTUATION_THREADS", "1")),
+    window_ms=float(os.getenv("STT_PUNCTUATION_BATCH_WINDOW_MS", "5")),
+    max_batch_size=int(os.getenv("STT_PUNCTUATION_BATCH_MAX_SIZE", "16"))
+)
+
+# Pin ngôn ngữ của streaming session khi detection đủ tin cậy (bỏ language detection ở các chunk sau)
+language_identifier = LanguageIdentifier(
+    threshold=float(os.getenv("STT_LANGUAGE_PIN_THRESHOLD", "0.8")),
+    recheck_interval=int(os.getenv("STT_LANGUAGE_RECHECK_CHUNKS", "50")),
+    logprob_floor=float(os.getenv("STT_LANGUAGE_LOGPROB_FLOOR", "-1.2"))
+)
+
+# VAD phía server trước inference queue: bỏ cửa sổ silence, cắt silence đầu/cuối (STT_VAD_BACKEND=none để tắt)
+vad_classifier = create_vad_classifier(
+    backend=os.getenv("STT_VAD_BACKEND", "energy").lower(),
+    model_path=os.getenv("STT_VAD_MODEL_PATH", "/app/models/silero_vad.onnx"),
+    threshold=float(os.getenv("STT_VAD_THRESHOLD", "0.5")),
+    energy_floor_db=float(os.getenv("STT_VAD_ENERGY_DB", "-45"))
+)
+VAD_HANGOVER_MS = int(os.getenv("STT_VAD_HANGOVER_MS", "300"))
+VAD_PADDING_MS = int(os.getenv("STT_VAD_PADDING_MS", "200"))
+
+# Streaming Whisper: decode lại cửa sổ tăng dần mỗi khi có thêm STT_STREAM_STEP_MS audio mới (LocalAgreement)
+STREAM_STEP_SAMPLES = int(16000 * float(os.getenv("STT_STREAM_STEP_MS", "500")) / 1000)
+STREAM_MAX_WINDOW_SECONDS = float(os.getenv("STT_STREAM_MAX_WINDOW_SECONDS", "15"))
+STREAM_PREROLL_SAMPLES = int(16000 * 0.2)  # 200ms giữ lại trước speech onset
+# Khoảng lặng giữa hai từ (giây) coi là hết câu (/transcribe và streaming session)
+SENTENCE_PAUSE_SECONDS = float(os.getenv("STT_SENTENCE_PAUSE_SECONDS", "0.5"))
+
+# Latency budget → beam size / temperature fallback / word timestamps / condition_on_previous_text
+# ("interactive" = 300ms, "realtime" = 1000ms, "batch" = không giới hạn, hoặc số ms)
+decoding_policy = DecodingPolicy()
+TRANSCRIBE_LATENCY_BUDGET = os.getenv("STT_TRANSCRIBE_LATENCY_BUDGET", "batch")
+STREAM_LATENCY_BUDGET = os.getenv("STT_STREAM_LATENCY_BUDGET", "interactive")
+STREAM_MAX_BEAM_SIZE = int(os.getenv("STT_STREAM_MAX_BEAM_SIZE", "5"))  # Trần beam size cho streaming
+
+# Decode audio nén (MP3, Opus, ...) bằng pool ffmpeg process warm, stream qua stdin/stdout
+ffmpeg_decoder = FFmpegDecoder(
+    pool_size=int(os.getenv("STT_FFMPEG_POOL_SIZE", "2")),
+    max_concurrency=int(os.getenv("STT_FFMPEG_MAX_CONCURRENCY", "4"))
+)
+
+# Long-form: upload dài cắt tại điểm im lặng thành chunk ≤ 30s, decode song song trên process pool
+# (mỗi worker giữ model riêng, tạo lazily ở request đầu tiên); STT_LONGFORM_WORKERS=0 để tắt
+LONGFORM_THREADS_PER_WORKER = int(os.getenv("STT_LONGFORM_THREADS_PER_WORKER", "2"))
+LONGFORM_WORKERS = int(os.getenv("STT_LONGFORM_WORKERS", str(workers_for_threads(LONGFORM_THREADS_PER_WORKER))))
+LONGFORM_MIN_SECONDS = float(os.getenv("STT_LONGFORM_MIN_SECONDS", "60"))
+longform_transcriber = LongFormTranscriber(
+    max_workers=LONGFORM_WORKERS,
+    threads_per_worker=LONGFORM_THREADS_PER_WORKER,
+    max_chunk_seconds=float(os.getenv("STT_LONGFORM_MAX_CHUNK_SECONDS", "30")),
+    max_pending_chunks=int(os.getenv("STT_LONGFORM_MAX_PENDING_CHUNKS", "64")),
+    retry_after=int(os.getenv("STT_INFERENCE_RETRY_AFTER", "1"))
+) if LONGFORM_WORKERS > 0 else None
+# Model spec cho worker process (điền khi load_model load được model tương ứng)
+longform_model_specs: Dict[str, dict] = {}
+
+# Inference chạy trên thread pool riêng (không chặn event loop), queue có giới hạn → 503 khi quá tải
+# Fair queuing: queue riêng mỗi participant (deficit round-robin theo giây audio),
+# streaming ưu tiên hơn upload theo trọng số; STT_SCHEDULER_WEIGHTS=off → FIFO
+inference_executor = InferenceExecutor(
+    "whisper",
+    max_workers=int(os.getenv("STT_INFERENCE_WORKERS", "0"))
+    or workers_for_threads(int(os.getenv("OMP_NUM_THREADS", "4"))),
+    max_queue_size=int(os.getenv("STT_INFERENCE_MAX_QUEUE", "16")),
+    retry_after=int(os.getenv("STT_INFERENCE_RETRY_AFTER", "1")),
+    class_weights=parse_class_weights(os.getenv("STT_SCHEDULER_WEIGHTS", "streaming=8,batch=1")),
+    quantum=float(os.getenv("STT_SCHEDULER_QUANTUM_SECONDS", "1.0"))
+)
+
+
+async def run_inference(fn, *args, **kwargs):
+    """
+    Chạy model inference trên inference executor
+    
+    Raises:
+        InferenceQueueFull: Queue đã đầy (caller trả 503 + Retry-After)
+    """
+    inference_executor.admit()
+    try:
+        return await inference_executor.run(partial(fn, *args, **kwargs))
+    finally:
+        inference_executor.release()
+
 # ==================== STREAMING SESSION TRACKING ====================
 # Dictionary để track streaming sessions: {participant_id: {buffer, language, chunk_count}}
 streaming_sessions: Dict[str, dict] = {}
 
-def get_or_create_session(participant_id: str, language: Optional[str] = None) -> dict:
+async def run_faster_whisper(
+    audio_data: np.ndarray,
+    language: Optional[str],
+    task: str,
+    beam_size: int,
+    word_timestamps: bool,
+    budget_ms: Optional[float],
+    model_name: str,
+    model=None,
+    initial_prompt: Optional[str] = None,
+    require_word_timestamps: bool = False
+) -> Dict:
+    """
+    transcribe_with_faster_whisper với decoding settings chọn theo latency budget
+    
+    beam_size / word_timestamps là trần chất lượng của request; settings đã chọn trả về ở result['decoding']
+    """
+    audio_seconds = len(audio_data) / 16000
+    settings = decoding_policy.choose(
+        budget_ms, audio_seconds, model=model_name, beam_size=beam_size,
+        word_timestamps=word_timestamps, require_word_timestamps=require_word_timestamps
+    )
+    
+    def decode():
+        # Đo inference trên worker thread → RTF học được không lẫn thời gian chờ queue
+        inference_started = time.perf_counter()
+        result = transcribe_with_faster_whisper(
+            audio_data,
+            language,
+            task,
+            settings.beam_size,
+            settings.word_timestamps,
+            model=model,
+            initial_prompt=initial_prompt,
+            decoding=settings
+        )
+        return result, time.perf_counter() - inference_started
+    
+    started = time.perf_counter()
+    result, inference_seconds = await run_inference(decode)
+    decoding_policy.observe(
+        settings, budget_ms, audio_seconds, time.perf_counter() - started,
+        model=model_name, inference_seconds=inference_seconds
+    )
+    result['decoding'] = settings.to_dict()
+    return result
+
+
+async def punctuate_result(result: Dict) -> Dict:
+    """
+    Thêm dấu câu cho transcript tiếng Việt (result['text_raw'] → result['text'])
+    
+    Model functions trả text thô; punctuation chạy ở đây để ONNX backend gom batch
+    transcript của các request đồng thời.
+    """
+    if result['language'] == "vi":
+        result['text'] = await punctuator.restore(result['text_raw'])
+    return result
+
+
+def create_mel_cache() -> Optional[IncrementalLogMel]:
+    """
+    Log-mel cache cho streaming session (cùng tham số với feature extractor của PhoWhisper)
+    
+    faster-whisper runtime tự tính feature trong transcribe() sau VAD filter của nó → không dùng cache.
+    """
+    if phowhisper_processor is None:
+        return None
+    extractor = phowhisper_processor.feature_extractor
+    return IncrementalLogMel(
+        extractor.mel_filters,
+        n_fft=extractor.n_fft,
+        hop_length=extractor.hop_length,
+        n_samples=extractor.n_samples
+    )
+
+
+def get_or_create_session(
+    participant_id: str,
+    language: Optional[str] = None,
+    latency_budget: Optional[str] = None
+) -> dict:
     """
     Get hoặc create streaming session cho participant
     
     Args:
         participant_id: Unique participant ID
         language: Preferred language (None = auto-detect)
+        latency_budget: Latency budget cho decode (None = giữ budget hiện tại / STT_STREAM_LATENCY_BUDGET)
         
     Returns:
-        Session dict với buffer, language, chunk_count
+        Session dict với buffer, language_id (LanguagePin), chunk_count
     """
+    budget_ms = parse_budget(latency_budget or STREAM_LATENCY_BUDGET)
+    if participant_id in streaming_sessions and latency_budget:
+        streaming_sessions[participant_id]['latency_budget_ms'] = budget_ms
+    
+    if participant_id in streaming_sessions and language:
+        # Client chỉ định ngôn ngữ giữa chừng → pin cố định, bỏ detection
+        pin = streaming_sessions[participant_id]['language_id']
+        if pin.source != "client" or pin.language != language:
+            pin.set_client_language(language)
+    
     if participant_id not in streaming_sessions:
         streaming_sessions[participant_id] = {
-            'buffer': [],  # Buffer để lưu audio chunks
-            'language': language,
+            'buffer': AudioRingBuffer(capacity=16000 * 2),  # Ring buffer audio 16kHz (2s, tự tăng)
+            'preprocessor': None,  # ChunkPreprocessor: scratch buffers + resampler state giữa các chunk
+            'language_id': LanguagePin(language),  # Ngôn ngữ đã pin + confidence (None = chưa xác định)
+            'vad': VoiceActivityDetector(vad_classifier, hangover_ms=VAD_HANGOVER_MS, padding_ms=VAD_PADDING_MS)
+            if vad_classifier is not None else None,
+            'speech_in_window': False,  # Có speech trong audio mới kể từ lần decode trước
+            'policy': LocalAgreementPolicy(max_window_seconds=STREAM_MAX_WINDOW_SECONDS),  # Commit prefix ổn định
+            'sentences': SentenceSegmenter(pause_threshold=SENTENCE_PAUSE_SECONDS),  # Câu từ các từ đã commit
+            'mel_cache': create_mel_cache(),  # Log-mel dùng lại giữa các cửa sổ chồng nhau (PhoWhisper PyTorch)
+            'new_samples': 0,  # Audio mới (16kHz) kể từ lần decode trước
+            'ingest_lock': asyncio.Lock(),  # Preprocess → VAD → buffer theo đúng thứ tự chunk (VAD có thể chạy trên thread)
+            'decode_lock': asyncio.Lock(),  # Một decode mỗi session tại một thời điểm (policy tuần tự)
+            'model_used': "pending",
+            'latency_budget_ms': budget_ms,  # None = không giới hạn (batch)
             'chunk_count': 0,
             'created_at': time.time(),
             'last_activity': time.time()
@@ -183,111 +331,42 @@ def get_or_create_session(participant_id: str, language: Optional[str] = None) -
     
     return streaming_sessions[participant_id]
 
-def cleanup_session(participant_id: str):
+def session_buffered_bytes(session: dict) -> int:
+    """Bytes audio đang giữ trong session (ring buffer + scratch buffers + resampler history)"""
+    total = session['buffer'].nbytes
+    if session['preprocessor'] is not None:
+        total += session['preprocessor'].nbytes
+    return total
+
+
+def cleanup_session(participant_id: str, session: Optional[dict] = None):
     """
-    Cleanup streaming session
+    Cleanup streaming session (stream-end, WebSocket đóng, reaper evict)
     
     Args:
         participant_id: Unique participant ID
+        session: Session đã được gỡ khỏi streaming_sessions (SessionReaper on_evict)
     """
-    if participant_id in streaming_sessions:
-        del streaming_sessions[participant_id]
-        logger.info(f"🧹 Cleaned up streaming session for participant {participant_id}")
-
+    if session is None:
+        session = streaming_sessions.pop(participant_id, None)
+    if session is None:
+        return
+    if session['vad'] is not None:
+        session['vad'].close()
+    session['sentences'].close()
+    logger.info(f"🧹 Cleaned up streaming session for participant {participant_id}")
 
 
-class SentenceSegmenter:
-    """
-    Intelligent sentence segmenter sử dụng word timestamps và punctuation.
-    Xử lý sentence boundaries để tránh translation errors.
-    """
-    
-    def __init__(self, pause_threshold: float = 0.5):
-        """
-        Args:
-            pause_threshold: Threshold (seconds) để detect sentence boundary
-        """
-        self.pause_threshold = pause_threshold
-        self.sentence_end_punctuation = {'.', '!', '?', '。', '！', '？'}
-    
-    def segment_by_timestamps(self, segments: List[dict]) -> List[dict]:
-        """
-        Segment sentences dựa trên timestamps và pauses
-        
-        Args:
-            segments: List of segments with words and timestamps
-            
-        Returns:
-            List of segmented sentences với boundaries rõ ràng
-        """
-        if not segments:
-            return []
-        
-        sentences = []
-        current_sentence = {
-            'text': '',
-            'words': [],
-            'start': None,
-            'end': None
-        }
-        
-        for segment in segments:
-            if 'words' not in segment or not segment['words']:
-                # No word timestamps, use segment as-is
-                if current_sentence['text']:
-                    sentences.append(current_sentence)
-                sentences.append({
-                    'text': segment['text'],
-                    'start': segment['start'],
-                    'end': segment['end'],
-                    'words': []
-                })
-                current_sentence = {'text': '', 'words': [], 'start': None, 'end': None}
-                continue
-            
-            for i, word_info in enumerate(segment['words']):
-                word = word_info['word']
-                word_start = word_info['start']
-                word_end = word_info['end']
-                
-                # Initialize start time
-                if current_sentence['start'] is None:
-                    current_sentence['start'] = word_start
-                
-                # Add word to current sentence
-                current_sentence['text'] += word
-                current_sentence['words'].append(word_info)
-                current_sentence['end'] = word_end
-                
-                # Check for sentence boundary
-                is_sentence_end = False
-                
-                # 1. Punctuation-based boundary
-                if any(p in word for p in self.sentence_end_punctuation):
-                    is_sentence_end = True
-                
-                # 2. Pause-based boundary (if not last word)
-                if i < len(segment['words']) - 1:
-                    next_word_start = segment['words'][i + 1]['start']
-                    pause_duration = next_word_start - word_end
-                    if pause_duration >= self.pause_threshold:
-                        is_sentence_end = True
-                
-                # Create new sentence
-                if is_sentence_end and current_sentence['text'].strip():
-                    sentences.append({
-                        'text': current_sentence['text'].strip(),
-                        'words': current_sentence['words'],
-                        'start': current_sentence['start'],
-                        'end': current_sentence['end']
-                    })
-                    current_sentence = {'text': '', 'words': [], 'start': None, 'end': None}
-        
-        # Add remaining sentence
-        if current_sentence['text'].strip():
-            sentences.append(current_sentence)
-        
-        return sentences
+# Reaper dọn session idle (participant rớt mạng) và giới hạn tổng bộ nhớ buffer
+session_reaper = SessionReaper(
+    streaming_sessions,
+    last_activity=lambda session: session['last_activity'],
+    buffered_bytes=session_buffered_bytes,
+    idle_timeout=float(os.getenv("STT_SESSION_IDLE_TIMEOUT", "120")),
+    max_buffered_bytes=int(float(os.getenv("STT_SESSION_MAX_BUFFERED_MB", "256")) * 1024 * 1024),
+    interval=float(os.getenv("STT_SESSION_REAP_INTERVAL", "10")),
+    on_evict=cleanup_session
+)
 
 
 # Pydantic Models
@@ -307,6 +386,7 @@ class TranscriptionResponse(BaseModel):
     sentences: Optional[List[dict]] = Field(None, description="Intelligently segmented sentences (if word_timestamps=True)")
     processing_time: float = Field(..., description="Time taken to process (seconds)")
     model_used: str = Field(..., description="Model used for transcription (phowhisper or faster-whisper)")
+    decoding: Optional[dict] = Field(None, description="Decoding settings đã chọn theo latency budget (faster-whisper runtime)")
 
 # ==================== STREAMING MODELS ====================
 class StreamingAudioRequest(BaseModel):
@@ -328,11 +408,14 @@ class StreamingTranscriptionResponse(BaseModel):
     timestamp: float = Field(..., description="Timestamp khi xử lý (seconds)")
     chunk_id: int = Field(..., description="ID của audio chunk")
     model_used: str = Field(..., description="Model used (phowhisper/faster-whisper)")
+    unstable_text: Optional[str] = Field(None, description="Tail chưa ổn định (có thể đổi ở response sau)")
+    sentences: Optional[List[dict]] = Field(None, description="Câu vừa đóng (dấu kết câu hoặc khoảng lặng), timestamp tính từ đầu session")
 
 class StreamStartRequest(BaseModel):
     """Request để bắt đầu streaming session"""
     participant_id: str = Field(..., description="Unique ID của participant")
     language: Optional[str] = Field(None, description="Preferred language (None = auto-detect)")
+    latency_budget: Optional[str] = Field(None, description="interactive (300ms), realtime (1000ms), batch hoặc số ms; mặc định STT_STREAM_LATENCY_BUDGET")
     
 class StreamEndRequest(BaseModel):
     """Request để kết thúc streaming session"""
@@ -345,19 +428,79 @@ class HealthResponse(BaseModel):
     model_info: dict
 
 
+def any_model_loaded() -> bool:
+    """True nếu có ít nhất một model sẵn sàng"""
+    return any(m is not None for m in (phowhisper_model, phowhisper_ct2_model, faster_whisper_model))
+
+
 def load_model():
     """Load Whisper models vào memory (PhoWhisper + faster-whisper fallback)"""
-    global phowhisper_model, phowhisper_processor, faster_whisper_model
+    global phowhisper_model, phowhisper_processor, phowhisper_ct2_model, faster_whisper_model, resource_plan
     
     use_phowhisper = os.getenv("USE_PHOWHISPER", "true").lower() == "true"
     use_faster_whisper = os.getenv("USE_FASTER_WHISPER", "true").lower() == "true"
+    phowhisper_ct2_path = os.getenv("PHOWHISPER_CT2_PATH", "/app/models/phowhisper-ct2")
+    # Mặc định: có model CT2 thì không load bản PyTorch float32 (tiết kiệm RAM)
+    use_phowhisper_torch = os.getenv(
+        "USE_PHOWHISPER_TORCH",
+        "false" if os.path.isdir(phowhisper_ct2_path) else "true"
+    ).lower() == "true"
+    load_phowhisper_ct2 = use_phowhisper and FASTER_WHISPER_AVAILABLE and os.path.isdir(phowhisper_ct2_path)
+    load_phowhisper_torch = use_phowhisper and use_phowhisper_torch and TRANSFORMERS_AVAILABLE
+    load_faster_whisper = use_faster_whisper and FASTER_WHISPER_AVAILABLE
+    
+    # Resource plan: mỗi model sẽ load một tập core riêng (chia đều; plan tắt → OMP_NUM_THREADS như cũ)
+    num_threads = int(os.getenv("OMP_NUM_THREADS", "4"))
+    resource_plan = resource_plan_from_env({
+        name: 1
+        for name, enabled in (
+            ("phowhisper-ct2", load_phowhisper_ct2),
+            ("phowhisper", load_phowhisper_torch),
+            ("faster-whisper", load_faster_whisper)
+        )
+        if enabled
+    })
+    resource_plan.log_report()
     
     success = False
     
+    # Try loading PhoWhisper CTranslate2 INT8 (convert bằng scripts/convert-phowhisper-ct2.py)
+    if load_phowhisper_ct2:
+        try:
+            logger.info(f"Loading PhoWhisper CTranslate2 INT8 from {phowhisper_ct2_path}...")
+            # Thread pool của CTranslate2 tạo lúc load → thừa hưởng core đã pin
+            with resource_plan.pinned("phowhisper-ct2"):
+                phowhisper_ct2_model = WhisperModel(
+                    phowhisper_ct2_path,
+                    device=os.getenv("DEVICE", "cpu"),
+                    compute_type=os.getenv("PHOWHISPER_CT2_COMPUTE_TYPE", "int8"),
+                    cpu_threads=resource_plan.threads("phowhisper-ct2", num_threads),
+                    num_workers=1
+                )
+            longform_model_specs["phowhisper-ct2"] = {
+                "name": "phowhisper-ct2",
+                "kind": "ctranslate2",
+                "model": phowhisper_ct2_path,
+                "compute_type": os.getenv("PHOWHISPER_CT2_COMPUTE_TYPE", "int8")
+            }
+            logger.info("✅ PhoWhisper CTranslate2 loaded successfully")
+            success = True
+        except Exception as e:
+            logger.error(f"❌ Failed to load PhoWhisper CTranslate2: {e}")
+    
     # Try loading PhoWhisper (Vietnamese-specialized)
-    if use_phowhisper and TRANSFORMERS_AVAILABLE:
+    if load_phowhisper_torch:
         try:
             logger.info("Loading PhoWhisper-small (Vietnamese-specialized)...")
+            if "phowhisper" in resource_plan.allocations:
+                # OpenMP pool của torch tạo ở lần generate đầu tiên trên thread đã pin (phowhisper_generate_batch)
+                torch.set_num_threads(resource_plan.threads("phowhisper", num_threads))
+                try:
+                    torch.set_num_interop_threads(resource_plan.allocations["phowhisper"].inter_op_threads)
+                except RuntimeError:
+                    pass  # Inter-op pool đã khởi tạo (chỉ set được một lần mỗi process)
+                if os.getenv("OMP_PROC_BIND", "false").lower() not in ("false", ""):
+                    logger.warning("⚠️ OMP_PROC_BIND is set: OpenMP binds threads itself, PhoWhisper pinning may be ignored")
             phowhisper_processor = AutoProcessor.from_pretrained("vinai/PhoWhisper-small")
             phowhisper_model = AutoModelForSpeechSeq2Seq.from_pretrained(
                 "vinai/PhoWhisper-small",
@@ -365,28 +508,39 @@ def load_model():
                 low_cpu_mem_usage=True
             )
             phowhisper_model.eval()  # Set to evaluation mode
+            longform_model_specs["phowhisper"] = {
+                "name": "phowhisper",
+                "kind": "transformers",
+                "model": "vinai/PhoWhisper-small"
+            }
             logger.info("✅ PhoWhisper-small loaded successfully")
             success = True
         except Exception as e:
             logger.error(f"❌ Failed to load PhoWhisper: {e}")
     
     # Try loading faster-whisper (multilingual fallback)
-    if use_faster_whisper and FASTER_WHISPER_AVAILABLE:
+    if load_faster_whisper:
         model_size = os.getenv("MODEL_SIZE", "small")  # Use small for lower resource usage
         compute_type = os.getenv("COMPUTE_TYPE", "int8")
         device = os.getenv("DEVICE", "cpu")
-        num_threads = int(os.getenv("OMP_NUM_THREADS", "4"))
         
         logger.info(f"Loading faster-whisper: {model_size}, compute_type: {compute_type}, device: {device}")
         
         try:
-            faster_whisper_model = WhisperModel(
-                model_size,
-                device=device,
-                compute_type=compute_type,
-                cpu_threads=num_threads,
-                num_workers=1
-            )
+            with resource_plan.pinned("faster-whisper"):
+                faster_whisper_model = WhisperModel(
+                    model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=resource_plan.threads("faster-whisper", num_threads),
+                    num_workers=1
+                )
+            longform_model_specs["faster-whisper"] = {
+                "name": "faster-whisper",
+                "kind": "ctranslate2",
+                "model": model_size,
+                "compute_type": compute_type
+            }
             logger.info("✅ faster-whisper loaded successfully")
             success = True
         except Exception as e:
@@ -406,9 +560,19 @@ async def lifespan(app: FastAPI):
     success = load_model()
     if not success:
         logger.error("Failed to start - model not loaded")
+    session_reaper.start()
+    await ffmpeg_decoder.start()
     yield
     # Shutdown
     logger.info("Shutting down STT Service...")
+    await session_reaper.stop()
+    await ffmpeg_decoder.close()
+    await punctuator.close()
+    for batcher in phowhisper_batchers.values():
+        await batcher.close()
+    if longform_transcriber is not None:
+        longform_transcriber.shutdown()
+    inference_executor.shutdown()
 
 
 # Initialize FastAPI app
@@ -429,6 +593,16 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFull):
+    """Queue inference đầy → 503 kèm Retry-After để client/gateway retry sau"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint - service info và available endpoints"""
@@ -440,6 +614,9 @@ async def root():
             "transcribe": "/transcribe (POST)",
             "models": "/models (GET)",
             "languages": "/languages (GET)",
+            "transcribe_stream": "/api/v1/transcribe-stream (POST, JSON/base64)",
+            "transcribe_stream_binary": "/api/v1/transcribe-stream/binary (POST, application/octet-stream)",
+            "stream_websocket": "/api/v1/ws/stream/{participant_id} (WebSocket)",
             "health": "/health (GET)",
             "metrics": "/metrics (GET)"
         }
@@ -449,17 +626,20 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    model_loaded = (phowhisper_model is not None) or (faster_whisper_model is not None)
+    model_loaded = any_model_loaded()
     
     model_info = {}
     if model_loaded:
         model_info = {
             "phowhisper_available": phowhisper_model is not None,
+            "phowhisper_ct2_available": phowhisper_ct2_model is not None,
             "faster_whisper_available": faster_whisper_model is not None,
             "model_size": os.getenv("MODEL_SIZE", "small"),
             "compute_type": os.getenv("COMPUTE_TYPE", "int8"),
             "device": os.getenv("DEVICE", "cpu"),
-            "num_threads": int(os.getenv("OMP_NUM_THREADS", "4"))
+            "num_threads": int(os.getenv("OMP_NUM_THREADS", "4")),
+            "scheduler": inference_executor.scheduler.snapshot() if inference_executor.scheduler else None,
+            "resource_plan": resource_plan.to_dict()
         }
     
     return HealthResponse(
@@ -477,13 +657,18 @@ async def metrics():
 
 @app.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
+    request: Request,
     audio: UploadFile = File(..., description="Audio file (WAV, MP3, OGG, etc.)"),
     language: Optional[str] = None,
     task: str = "transcribe",
     beam_size: int = 5,
     word_timestamps: bool = True,
     segment_sentences: bool = True,
-    prefer_model: Optional[str] = None  # "phowhisper" hoặc "faster-whisper" để ưu tiên model cụ thể
+    prefer_model: Optional[str] = None,  # "phowhisper", "phowhisper-ct2" hoặc "faster-whisper" để ưu tiên model cụ thể
+    response_format: str = "json",  # "json", "ndjson" hoặc "sse"
+    long_form: Optional[bool] = None,  # None = tự bật khi audio ≥ STT_LONGFORM_MIN_SECONDS
+    latency_budget: Optional[str] = None,  # "interactive", "realtime", "batch" hoặc số ms
+    participant_id: Optional[str] = None  # Flow của fair scheduler (mặc định: địa chỉ client)
 ):
     """
     Transcribe audio file thành text với intelligent sentence segmentation
@@ -495,15 +680,32 @@ async def transcribe_audio(
         beam_size: Beam size cho decoding (5 là default, higher = better quality but slower)
         word_timestamps: Include word-level timestamps (required for sentence segmentation)
         segment_sentences: Enable intelligent sentence segmentation (requires word_timestamps)
-        prefer_model: Model preference - "phowhisper" or "faster-whisper" (optional, auto-select if None)
+        prefer_model: Model preference - "phowhisper", "phowhisper-ct2" or "faster-whisper" (optional, auto-select if None)
+        response_format: "json" (một response), "ndjson" hoặc "sse" (stream từng segment/câu ngay khi decode xong)
+        long_form: Cắt audio tại điểm im lặng thành chunk ≤ 30s, decode song song trên process pool
+            (chỉ với response_format="json"); None = tự bật cho audio dài
+        latency_budget: "interactive" (300ms), "realtime" (1000ms), "batch" (không giới hạn) hoặc số ms;
+            faster-whisper runtime chọn beam size / temperature fallback / word timestamps /
+            condition_on_previous_text vừa budget (beam_size, word_timestamps là trần); None = STT_TRANSCRIBE_LATENCY_BUDGET
+        participant_id: Upload được xếp hàng (priority batch) theo participant / client này,
+            chia đều inference slot với các upload khác
     
     Returns:
         TranscriptionResponse với text, segments, sentences, và metadata
+        (hoặc stream các event info/segment/sentence/done nếu response_format là ndjson/sse)
     """
     # Check if any model is loaded
-    if phowhisper_model is None and faster_whisper_model is None:
+    if not any_model_loaded():
         raise HTTPException(status_code=503, detail="No models loaded")
     
+    if response_format != "json" and response_format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported response_format: {response_format}")
+    
+    try:
+        budget_ms = parse_budget(latency_budget or TRANSCRIBE_LATENCY_BUDGET)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     start_time = time.time()
     model_used = "unknown"
     
@@ -513,94 +715,115 @@ async def transcribe_audio(
         
         # Try to read with soundfile first
         try:
-            audio_data, sample_rate = sf.read(io.BytesIO(audio_bytes))
-            # Ensure float32 (soundfile may return float64 on some systems)
-            audio_data = audio_data.astype(np.float32)
+            # Đọc thẳng Float32 (không decode float64 rồi astype)
+            audio_data, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype='float32')
             
             # Convert stereo to mono if needed
             if len(audio_data.shape) > 1:
-                audio_data = audio_data.mean(axis=1)
+                audio_data = audio_data.mean(axis=1, dtype=np.float32)
             
-            # Normalize audio to [-1, 1] range (critical for Whisper accuracy)
-            audio_max = np.abs(audio_data).max()
-            if audio_max > 0:
-                audio_data = audio_data / audio_max
+            # Normalize audio to [-1, 1] range (critical for Whisper accuracy), in-place
+            audio_data = normalize_peak(audio_data, inplace=True)
                 
         except Exception as sf_error:
-            # If soundfile fails, try using ffmpeg to convert to WAV first
-            logger.warning(f"soundfile failed ({sf_error}), trying ffmpeg conversion...")
-            
-            import subprocess
-            import tempfile
-            
-            # Save audio bytes to temp file
-            with tempfile.NamedTemporaryFile(suffix='.input', delete=False) as input_file:
-                input_file.write(audio_bytes)
-                input_path = input_file.name
+            # soundfile không đọc được (MP3, Opus, M4A, ...) → decode bằng ffmpeg qua pipe
+            # (Float32 16kHz mono từ stdout, không temp file, không chặn event loop)
+            logger.warning(f"soundfile failed ({sf_error}), decoding with ffmpeg...")
+            try:
+                audio_data = await ffmpeg_decoder.decode(audio_bytes)
+            except AudioDecodeError as decode_error:
+                raise HTTPException(status_code=400, detail=f"Unsupported or corrupt audio: {decode_error}")
+            sample_rate = ffmpeg_decoder.sample_rate
             
-            # Output WAV file
-            output_path = input_path.replace('.input', '.wav')
+            # Normalize audio to [-1, 1] range (output ffmpeg là read-only view → một bản copy)
+            audio_data = normalize_peak(audio_data, inplace=True)
             
-            try:
-                # Convert to WAV using ffmpeg
-                subprocess.run([
-                    'ffmpeg', '-i', input_path,
-                    '-ar', '16000',  # Resample to 16kHz
-                    '-ac', '1',      # Convert to mono
-                    '-f', 'wav',
-                    output_path
-                ], check=True, capture_output=True)
-                
-                # Read converted file
-                audio_data, sample_rate = sf.read(output_path)
-                # Ensure float32 after ffmpeg conversion
-                audio_data = audio_data.astype(np.float32)
-                
-                # Convert stereo to mono if needed
-                if len(audio_data.shape) > 1:
-                    audio_data = audio_data.mean(axis=1)
-                
-                # Normalize audio to [-1, 1] range
-                audio_max = np.abs(audio_data).max()
-                if audio_max > 0:
-                    audio_data = audio_data / audio_max
-                    
-                logger.info(f"✅ Successfully converted audio using ffmpeg")
-                
-            finally:
-                # Cleanup temp files
-                import os
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-        
         # Calculate audio duration
         audio_duration = len(audio_data) / sample_rate
         AUDIO_LENGTH_HISTOGRAM.observe(audio_duration)
         
+        # Upload là batch traffic: cost = độ dài audio (NDJSON/SSE decode từng segment ≤ 30s)
+        set_inference_flow(
+            participant_id or (request.client.host if request.client else "upload"),
+            PRIORITY_BATCH,
+            audio_duration if response_format == "json" else min(audio_duration, 30.0)
+        )
+        
         logger.info(f"Processing audio: duration={audio_duration:.2f}s, sample_rate={sample_rate}Hz, language={language}, prefer_model={prefer_model}")
         
         # Choose model based on prefer_model or language
         # Strategy:
         # 1. If prefer_model is specified, use that model (if available)
-        # 2. Otherwise, auto-select: language="vi" → PhoWhisper, else → faster-whisper
+        # 2. Otherwise, auto-select: language="vi" → PhoWhisper (CT2 nếu có), else → faster-whisper
         use_phowhisper = False
+        use_phowhisper_ct2 = False
         
-        if prefer_model == "phowhisper" and phowhisper_model is not None:
+        if prefer_model == "phowhisper-ct2" and phowhisper_ct2_model is not None:
+            # User explicitly requested PhoWhisper qua CTranslate2 runtime
+            use_phowhisper_ct2 = True
+            logger.info("Using PhoWhisper CTranslate2 (user preference)")
+        elif prefer_model == "phowhisper" and phowhisper_model is not None:
             # User explicitly requested PhoWhisper
             use_phowhisper = True
             logger.info("Using PhoWhisper (user preference)")
+        elif prefer_model == "phowhisper" and phowhisper_ct2_model is not None:
+            # Chỉ có bản CT2 được load → phục vụ PhoWhisper qua CT2
+            use_phowhisper_ct2 = True
+            logger.info("Using PhoWhisper CTranslate2 (user preference, PyTorch model not loaded)")
         elif prefer_model == "faster-whisper" and faster_whisper_model is not None:
             # User explicitly requested faster-whisper
             use_phowhisper = False
             logger.info("Using faster-whisper (user preference)")
+        elif phowhisper_ct2_model is not None and language == "vi":
+            # Auto-select PhoWhisper CT2 for Vietnamese (INT8, nhanh và nhẹ hơn PyTorch)
+            use_phowhisper_ct2 = True
+            logger.info("Using PhoWhisper CTranslate2 (auto-detected Vietnamese)")
         elif phowhisper_model is not None and language == "vi":
             # Auto-select PhoWhisper for Vietnamese (no preference specified)
             use_phowhisper = True
             logger.info("Using PhoWhisper (auto-detected Vietnamese)")
         
-        if use_phowhisper:
+        if long_form is None:
+            long_form = audio_duration >= LONGFORM_MIN_SECONDS
+        if long_form and longform_transcriber is not None and response_format == "json":
+            # Mỗi chunk ≤ 30s trên một worker riêng → wall-clock theo số core thay vì độ dài audio
+            if use_phowhisper_ct2:
+                model_used, spec, chunk_language = "phowhisper-small-ct2", longform_model_specs["phowhisper-ct2"], language or "vi"
+            elif use_phowhisper:
+                model_used, spec, chunk_language = "phowhisper-small", longform_model_specs["phowhisper"], language
+            elif faster_whisper_model is not None:
+                model_used, spec, chunk_language = "faster-whisper-small", longform_model_specs["faster-whisper"], language
+            else:
+                raise HTTPException(status_code=503, detail="No suitable model available")
+            model_used += "-longform"
+            # Các chunk chạy song song → budget áp cho từng chunk ≤ max_chunk_seconds
+            decoding = decoding_policy.choose(
+                budget_ms, min(audio_duration, longform_transcriber.max_chunk_seconds),
+                model=model_used, beam_size=beam_size, word_timestamps=word_timestamps
+            )
+            word_timestamps = decoding.word_timestamps
+            result = await longform_transcriber.transcribe(
+                resample_poly_cached(audio_data, sample_rate, 16000),
+                spec, chunk_language, task, word_timestamps,
+                decode_options=faster_whisper_options(beam_size, decoding)
+            )
+            result['decoding'] = decoding.to_dict()
+            logger.info(f"Long-form: {result['chunks']} chunks on {longform_transcriber.max_workers} workers")
+        elif response_format != "json":
+            return await stream_transcription(
+                audio_data, sample_rate, audio_duration, language, task, beam_size,
+                word_timestamps, segment_sentences, response_format,
+                use_phowhisper, use_phowhisper_ct2, start_time, budget_ms
+            )
+        elif use_phowhisper_ct2:
+            # PhoWhisper INT8 qua CTranslate2 (faster-whisper runtime), nhận audio 16kHz
+            model_used = "phowhisper-small-ct2"
+            result = await run_faster_whisper(
+                resample_poly_cached(audio_data, sample_rate, 16000),
+                language or "vi", task, beam_size, word_timestamps,
+                budget_ms, model_used, model=phowhisper_ct2_model
+            )
+        elif use_phowhisper:
             # Use PhoWhisper (Vietnamese-only, high accuracy for pure Vietnamese)
             model_used = "phowhisper-small"
             result = await transcribe_with_phowhisper(
@@ -609,18 +832,26 @@ async def transcribe_audio(
         elif faster_whisper_model is not None:
             # Use faster-whisper (multilingual fallback or default)
             model_used = "faster-whisper-small"
-            result = transcribe_with_faster_whisper(
-                audio_data, language, task, beam_size, word_timestamps
+            # faster-whisper nhận numpy array ở 16kHz
+            result = await run_faster_whisper(
+                resample_poly_cached(audio_data, sample_rate, 16000),
+                language, task, beam_size, word_timestamps,
+                budget_ms, model_used
             )
         else:
             raise HTTPException(status_code=503, detail="No suitable model available")
         
+        result = await punctuate_result(result)
         processing_time = time.time() - start_time
         
+        # Budget chặt có thể đã tắt word timestamps
+        if 'decoding' in result:
+            word_timestamps = result['decoding']['word_timestamps']
+        
         # Intelligent sentence segmentation (if enabled and word timestamps available)
         sentences = None
         if segment_sentences and word_timestamps and result['segments']:
-            segmenter = SentenceSegmenter(pause_threshold=0.5)
+            segmenter = SentenceSegmenter(pause_threshold=SENTENCE_PAUSE_SECONDS)
             sentences = segmenter.segment_by_timestamps(result['segments'])
             logger.info(f"Segmented into {len(sentences)} sentences")
         
@@ -645,10 +876,11 @@ async def transcribe_audio(
             segments=result['segments'],
             sentences=sentences,
             processing_time=processing_time,
-            model_used=model_used
+            model_used=model_used,
+            decoding=result.get('decoding')
         )
         
-    except HTTPException:
+    except (HTTPException, InferenceQueueFull):
         raise
     except Exception as e:
         logger.error(f"❌ Transcription error: {e}", exc_info=True)
@@ -656,67 +888,306 @@ async def transcribe_audio(
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
 
-async def transcribe_with_phowhisper(
+# ==================== SEGMENT STREAMING (NDJSON / SSE) ====================
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+
+def format_stream_event(event: dict, response_format: str) -> str:
+    """NDJSON: một JSON object mỗi dòng. SSE: `event: <type>` + `data: <json>`"""
+    data = json.dumps(event, ensure_ascii=False)
+    if response_format == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def iter_faster_whisper_segments(
+    segments_generator, word_timestamps: bool, plan_name: str, slot: AdmittedSlot
+):
+    """
+    Decode lazy generator của faster-whisper từng segment trên inference executor
+    
+    slot: slot inference đã admit ở endpoint; release khi hết audio hoặc client ngắt kết nối
+    (generator chưa từng được iterate thì background task của response release).
+    plan_name: model trong resource plan (mỗi bước decode chạy trên core của model đó).
+    """
+    step = resource_plan.bind(plan_name, next)
+    try:
+        while True:
+            segment = await inference_executor.run(step, segments_generator, None)
+            if segment is None:
+                return
+            yield faster_whisper_segment_to_dict(segment, word_timestamps)
+    finally:
+        slot.release()
+
+
+async def iter_result_segments(segments: List[dict]):
+    for segment in segments:
+        yield segment
+
+
+async def stream_transcription(
     audio_data: np.ndarray,
     sample_rate: int,
+    audio_duration: float,
     language: Optional[str],
-    word_timestamps: bool
-) -> Dict:
+    task: str,
+    beam_size: int,
+    word_timestamps: bool,
+    segment_sentences: bool,
+    response_format: str,
+    use_phowhisper: bool,
+    use_phowhisper_ct2: bool,
+    start_time: float,
+    budget_ms: Optional[float] = None
+) -> StreamingResponse:
     """
-    Transcribe using PhoWhisper (Vietnamese-specialized)
+    Tạo StreamingResponse cho /transcribe (response_format=ndjson/sse)
     
-    Returns:
-        Dict with text, language, language_probability, segments
+    faster-whisper runtime (faster-whisper, PhoWhisper CT2): mỗi segment được gửi ngay khi
+    generator decode xong → time-to-first-segment không phụ thuộc độ dài file.
+    PhoWhisper PyTorch decode cả file một lần nên các segment được gửi sau khi decode xong.
+    Latency budget áp cho segment đầu tiên (cửa sổ 30s), không phải cả file.
     """
-    logger.info("Using PhoWhisper for transcription")
-    
-    # Resample if needed (PhoWhisper expects 16kHz)
-    if sample_rate != 16000:
-        # Simple resampling (for production, use librosa or torchaudio)
-        from scipy import signal
-        audio_data = signal.resample(
-            audio_data, 
-            int(len(audio_data) * 16000 / sample_rate)
+    decoding = None
+    slot = None
+    if use_phowhisper:
+        model_used = "phowhisper-small"
+        result = await transcribe_with_phowhisper(audio_data, sample_rate, language, word_timestamps)
+        segments = iter_result_segments(result['segments'])
+        detected_language, language_probability = result['language'], result['language_probability']
+    else:
+        if use_phowhisper_ct2:
+            model_used, model, language = "phowhisper-small-ct2", phowhisper_ct2_model, language or "vi"
+        elif faster_whisper_model is not None:
+            model_used, model = "faster-whisper-small", faster_whisper_model
+        else:
+            raise HTTPException(status_code=503, detail="No suitable model available")
+        
+        decoding = decoding_policy.choose(
+            budget_ms, min(audio_duration, 30.0), model=model_used,
+            beam_size=beam_size, word_timestamps=word_timestamps
         )
-        sample_rate = 16000
+        word_timestamps = decoding.word_timestamps
+        
+        # Admit một lần cho cả file; slot được giữ tới khi stream kết thúc
+        slot = inference_executor.slot()
+        try:
+            segments_generator, info = await inference_executor.run(partial(
+                resource_plan.bind(whisper_plan_name(model), start_faster_whisper),
+                resample_poly_cached(audio_data, sample_rate, 16000),
+                language, task, decoding.beam_size, word_timestamps, model,
+                decoding=decoding
+            ))
+        except BaseException:
+            slot.release()
+            raise
+        segments = iter_faster_whisper_segments(
+            segments_generator, word_timestamps, whisper_plan_name(model), slot
+        )
+        detected_language, language_probability = info.language, info.language_probability
     
-    # CRITICAL: Ensure float32 (scipy.resample returns float64, causing ONNX error)
-    audio_data = audio_data.astype(np.float32)
+    events = transcription_events(
+        segments, detected_language, language_probability, audio_duration,
+        model_used, segment_sentences and word_timestamps, start_time, decoding, budget_ms
+    )
+    return StreamingResponse(
+        (format_stream_event(event, response_format) async for event in events),
+        media_type=STREAM_MEDIA_TYPES[response_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Client ngắt trước khi body bắt đầu → generator segment không chạy tới finally
+        background=BackgroundTask(slot.release) if slot is not None else None
+    )
+
+
+async def transcription_events(
+    segments,
+    language: str,
+    language_probability: float,
+    audio_duration: float,
+    model_used: str,
+    segment_sentences: bool,
+    start_time: float,
+    decoding: Optional[DecodingSettings] = None,
+    budget_ms: Optional[float] = None
+):
+    """
+    Event stream: info → segment/sentence (xen kẽ, theo thứ tự decode) → done (hoặc error)
     
-    # Re-normalize after resampling (scipy.resample can change amplitude)
-    audio_max = np.abs(audio_data).max()
-    if audio_max > 0:
-        audio_data = audio_data / audio_max
+    Sentence được emit ngay khi SentenceSegmenter thấy câu kết thúc, không chờ hết file.
+    decoding: settings theo latency budget → time-to-first-segment được so với budget.
+    """
+    yield {
+        "type": "info",
+        "language": language,
+        "language_probability": language_probability,
+        "duration": audio_duration,
+        "model_used": model_used,
+        "decoding": decoding.to_dict() if decoding else None
+    }
     
-    # Process audio
-    inputs = phowhisper_processor(
-        audio_data,
-        sampling_rate=sample_rate,
-        return_tensors="pt"
+    segmenter = SentenceSegmenter(pause_threshold=SENTENCE_PAUSE_SECONDS) if segment_sentences else None
+    texts = []
+    try:
+        async for segment in segments:
+            if not texts:
+                TIME_TO_FIRST_SEGMENT_HISTOGRAM.observe(time.time() - start_time)
+                if decoding is not None:
+                    # Gồm upload + decode audio, không phải RTF inference → chỉ metrics, không học
+                    decoding_policy.record_latency(decoding, budget_ms, time.time() - start_time)
+            texts.append(segment['text'])
+            yield {"type": "segment", **segment}
+            if segmenter is not None:
+                for sentence in segmenter.feed(segment):
+                    yield {"type": "sentence", **sentence}
+        if segmenter is not None:
+            for sentence in segmenter.flush():
+                yield {"type": "sentence", **sentence}
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Header đã gửi → báo lỗi bằng event thay vì HTTP 500
+        logger.error(f"❌ Streaming transcription error: {e}", exc_info=True)
+        TRANSCRIPTION_COUNTER.labels(status='error', language=language).inc()
+        yield {"type": "error", "detail": f"Transcription failed: {str(e)}"}
+        return
+    
+    raw_text = " ".join(texts)
+    processing_time = time.time() - start_time
+    TRANSCRIPTION_DURATION.observe(processing_time)
+    TRANSCRIPTION_COUNTER.labels(status='success', language=language).inc()
+    logger.info(
+        f"✅ Streamed transcription completed: model={model_used}, language={language}, "
+        f"segments={len(texts)}, duration={audio_duration:.2f}s, processing_time={processing_time:.2f}s"
     )
+    yield {
+        "type": "done",
+        "text": await punctuator.restore(raw_text) if language == "vi" else raw_text,
+        "text_raw": raw_text,
+        "processing_time": processing_time
+    }
+
+
+def phowhisper_input_features(batch: List) -> "torch.Tensor":
+    """
+    Log-mel features [batch, n_mels, frames] cho generate
     
-    # Generate with timestamps
-    with torch.no_grad():
-        if word_timestamps:
+    Item là audio → processor pad về 30s và tính log-mel; item là callable (streaming,
+    IncrementalLogMel.features) → chỉ tính frame mới, phần còn lại lấy từ cache của session.
+    """
+    features = [None] * len(batch)
+    audio_indices = [i for i, item in enumerate(batch) if not callable(item)]
+    if audio_indices:
+        extracted = phowhisper_processor(
+            [batch[i] for i in audio_indices],
+            sampling_rate=16000,
+            return_tensors="np"
+        ).input_features
+        for i, item_features in zip(audio_indices, extracted):
+            features[i] = item_features
+    for i, item in enumerate(batch):
+        if callable(item):
+            features[i] = item()
+    return torch.from_numpy(np.stack(features).astype(np.float32, copy=False))
+
+
+def phowhisper_generate_batch(batch: List, return_timestamps: bool) -> List[str]:
+    """
+    Chạy PhoWhisper cho nhiều utterance trong một lần generate
+    
+    Log-mel features của mọi utterance được pad về cùng độ dài (30s)
+    → một tensor [batch, n_mels, frames] → split output theo thứ tự input.
+    
+    Args:
+        batch: List audio Float32 @16kHz (đã normalize) hoặc log-mel đã cache (xem phowhisper_input_features)
+        return_timestamps: Generate timestamp tokens hay không
+        
+    Returns:
+        List text, cùng thứ tự với batch
+    """
+    with resource_plan.pinned("phowhisper"), torch.no_grad():
+        input_features = phowhisper_input_features(batch)
+        if return_timestamps:
             predicted_ids = phowhisper_model.generate(
-                inputs.input_features,
+                input_features,
                 return_timestamps=True,
                 max_length=448
             )
         else:
             predicted_ids = phowhisper_model.generate(
-                inputs.input_features,
+                input_features,
                 max_length=448
             )
     
-    # Decode
-    transcription = phowhisper_processor.batch_decode(
+    return phowhisper_processor.batch_decode(
         predicted_ids,
         skip_special_tokens=True
     )
+
+
+# Cross-request batching cho PhoWhisper: gom utterance đồng thời (nhiều participant nói cùng lúc)
+# thành một lần generate. Tách batcher theo return_timestamps vì generate args khác nhau.
+PHOWHISPER_BATCH_WINDOW_MS = float(os.getenv("STT_BATCH_WINDOW_MS", "20"))
+PHOWHISPER_BATCH_MAX_SIZE = int(os.getenv("STT_BATCH_MAX_SIZE", "4"))
+phowhisper_batchers: Dict[bool, MicroBatcher] = {
+    return_timestamps: MicroBatcher(
+        "phowhisper-ts" if return_timestamps else "phowhisper",
+        partial(phowhisper_generate_batch, return_timestamps=return_timestamps),
+        window_ms=PHOWHISPER_BATCH_WINDOW_MS,
+        max_batch_size=PHOWHISPER_BATCH_MAX_SIZE,
+        executor=inference_executor
+    )
+    for return_timestamps in (False, True)
+}
+
+
+async def transcribe_with_phowhisper(
+    audio_data: np.ndarray,
+    sample_rate: int,
+    language: Optional[str],
+    word_timestamps: bool,
+    mel_cache: Optional[IncrementalLogMel] = None,
+    start_sample: int = 0
+) -> Dict:
+    """
+    Transcribe using PhoWhisper (Vietnamese-specialized)
+    
+    Utterance được đưa vào batcher, generate chung với các request đồng thời khác.
+    
+    Args:
+        mel_cache: Log-mel cache của streaming session (audio 16kHz); None = processor tính lại cả cửa sổ
+        start_sample: Sample tuyệt đối (trong stream của session) của audio_data[0]
+    
+    Returns:
+        Dict with text, language, language_probability, segments
+    """
+    logger.info("Using PhoWhisper for transcription")
+    
+    # Resample if needed (PhoWhisper expects 16kHz) - polyphase với filter taps đã cache
+    resampled = sample_rate != 16000
+    if resampled:
+        audio_data = resample_poly_cached(audio_data, sample_rate, 16000)
+        sample_rate = 16000
+    
+    # CRITICAL: Ensure float32 (float64 gây lỗi ONNX)
+    audio_data = audio_data.astype(np.float32, copy=False)
+    
+    if mel_cache is not None and not resampled:
+        # Streaming: chỉ tính frame log-mel mới (trên inference thread); normalize peak = gain trên power
+        peak = peak_abs(audio_data)
+        item = partial(mel_cache.features, audio_data, start_sample, 1.0 / peak if peak > 0 else 1.0)
+    else:
+        # Re-normalize after resampling (low-pass filter có thể thay đổi amplitude)
+        # in-place trên mảng vừa resample, không sửa audio của caller
+        item = audio_data = normalize_peak(audio_data, inplace=resampled)
+    
+    # Generate (batched với các request đồng thời)
+    full_text = await phowhisper_batchers[bool(word_timestamps)].submit(item)
     
     # Extract segments (PhoWhisper returns timestamps in the text)
-    full_text = transcription[0]
     segments_list = []
     
     if word_timestamps:
@@ -739,11 +1210,9 @@ async def transcribe_with_phowhisper(
     # Detect language (PhoWhisper is primarily Vietnamese but supports others)
     detected_language = language if language else "vi"
     
-    # Apply punctuation restoration for Vietnamese
-    punctuated_text = restore_vietnamese_punctuation(full_text) if detected_language == "vi" else full_text
-    
+    # Punctuation thêm ở punctuate_result (caller)
     return {
-        'text': punctuated_text,  # Text with punctuation
+        'text': full_text,
         'text_raw': full_text,     # Original text without punctuation
         'language': detected_language,
         'language_probability': 0.95 if detected_language == "vi" else 0.85,
@@ -756,7 +1225,10 @@ def transcribe_with_faster_whisper(
     language: Optional[str],
     task: str,
     beam_size: int,
-    word_timestamps: bool
+    word_timestamps: bool,
+    model=None,
+    initial_prompt: Optional[str] = None,
+    decoding: Optional[DecodingSettings] = None
 ) -> Dict:
     """
     Transcribe using faster-whisper (multilingual with auto language detection)
@@ -767,19 +1239,97 @@ def transcribe_with_faster_whisper(
     - VAD filtering for noise removal
     - Word-level timestamps
     
+    Args:
+        model: CTranslate2 WhisperModel khác (vd. PhoWhisper CT2); None = faster_whisper_model
+        initial_prompt: Text đã commit của streaming session (context cho decoder)
+        decoding: Settings chọn theo latency budget (xem run_faster_whisper)
+    
     Returns:
         Dict with text, language, language_probability, segments
     """
-    logger.info("Using faster-whisper for transcription")
+    segments_list = []
+    full_text = []
+    logprobs = []
     
-    # Transcribe với parameters theo Whisper paper & faster-whisper best practices
-    # Reference: https://cdn.openai.com/papers/whisper.pdf (Section 3.8)
-    segments_generator, info = faster_whisper_model.transcribe(
+    with resource_plan.pinned(whisper_plan_name(model)):
+        segments_generator, info = start_faster_whisper(
+            audio_data, language, task, beam_size, word_timestamps, model, initial_prompt, decoding
+        )
+        
+        # Convert generator to list và extract data
+        for segment in segments_generator:
+            segment_dict = faster_whisper_segment_to_dict(segment, word_timestamps)
+            segments_list.append(segment_dict)
+            full_text.append(segment_dict["text"])
+            logprobs.append(segment.avg_logprob)
+    
+    # Join segments into full text
+    raw_text = " ".join(full_text)
+    
+    # Punctuation thêm ở punctuate_result (caller, async + batched)
+    return {
+        'text': raw_text,
+        'text_raw': raw_text,      # Original text without punctuation
+        'language': info.language,
+        'language_probability': info.language_probability,
+        'avg_logprob': sum(logprobs) / len(logprobs) if logprobs else None,  # Dùng cho language re-check
+        'segments': segments_list
+    }
+
+
+def whisper_plan_name(model=None) -> str:
+    """Tên trong resource plan của WhisperModel (CTranslate2 runtime); None = faster_whisper_model"""
+    if model is not None and model is phowhisper_ct2_model:
+        return "phowhisper-ct2"
+    return "faster-whisper"
+
+
+def start_faster_whisper(
+    audio_data: np.ndarray,
+    language: Optional[str],
+    task: str,
+    beam_size: int,
+    word_timestamps: bool,
+    model=None,
+    initial_prompt: Optional[str] = None,
+    decoding: Optional[DecodingSettings] = None
+):
+    """
+    Bắt đầu transcription với faster-whisper runtime
+    
+    Chỉ chạy feature extraction + language detection; segments được decode lazy
+    mỗi lần iterate generator (dùng cho cả response JSON lẫn NDJSON/SSE streaming).
+    
+    Returns:
+        (segments_generator, info)
+    """
+    model = model if model is not None else faster_whisper_model
+    logger.info("Using faster-whisper runtime for transcription")
+    
+    segments_generator, info = model.transcribe(
         audio_data,
         language=language,  # None = auto-detect, "vi" = force Vietnamese
         task=task,          # "transcribe" or "translate"
-        beam_size=beam_size,
         word_timestamps=word_timestamps,
+        initial_prompt=initial_prompt,
+        **faster_whisper_options(beam_size, decoding)
+    )
+    return segments_generator, info
+
+
+def faster_whisper_options(beam_size: int, decoding: Optional[DecodingSettings] = None) -> dict:
+    """
+    Decode options cho faster-whisper runtime (dùng chung cho inference thread và long-form worker)
+    
+    decoding: settings chọn theo latency budget (beam size, temperature fallback,
+    condition_on_previous_text); None = chất lượng tối đa với beam_size của request
+    """
+    if decoding is not None:
+        beam_size = decoding.beam_size
+    # Parameters theo Whisper paper & faster-whisper best practices
+    # Reference: https://cdn.openai.com/papers/whisper.pdf (Section 3.8)
+    return dict(
+        beam_size=beam_size,
         
         # VAD (Voice Activity Detection) - Silero VAD model
         vad_filter=True,
@@ -788,53 +1338,15 @@ def transcribe_with_faster_whisper(
         ),
         
         # Conditioning & Quality Control (Whisper paper recommendations)
-        condition_on_previous_text=True,     # Context từ segment trước → giảm lỗi nhận diện
+        condition_on_previous_text=decoding.condition_on_previous_text if decoding else True,  # Context từ segment trước → giảm lỗi nhận diện
         compression_ratio_threshold=1.35,    # Anti-repetition (paper recommend, giảm từ 2.4)
         log_prob_threshold=-1.0,             # Fallback temperature nếu low confidence
         no_speech_threshold=0.6,             # Skip segment nếu >60% probability of silence
         
         # Temperature fallback cho segments khó (paper section 3.7)
-        temperature=[0.0, 0.2, 0.4, 0.6, 0.8, 1.0]  # Progressive sampling nếu beam search fail
+        # Budget chặt → ít bước fallback hơn (mỗi bước là một lần decode lại)
+        temperature=list(decoding.temperature) if decoding else [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
     )
-    
-    # Convert generator to list và extract data
-    segments_list = []
-    full_text = []
-    
-    for segment in segments_generator:
-        segment_dict = {
-            "start": segment.start,
-            "end": segment.end,
-            "text": segment.text.strip()
-        }
-        
-        if word_timestamps and hasattr(segment, 'words'):
-            segment_dict["words"] = [
-                {
-                    "word": word.word,
-                    "start": word.start,
-                    "end": word.end,
-                    "probability": word.probability
-                }
-                for word in segment.words
-            ]
-        
-        segments_list.append(segment_dict)
-        full_text.append(segment.text.strip())
-    
-    # Join segments into full text
-    raw_text = " ".join(full_text)
-    
-    # Apply punctuation restoration for Vietnamese
-    punctuated_text = restore_vietnamese_punctuation(raw_text) if info.language == "vi" else raw_text
-    
-    return {
-        'text': punctuated_text,  # Text with punctuation
-        'text_raw': raw_text,      # Original text without punctuation
-        'language': info.language,
-        'language_probability': info.language_probability,
-        'segments': segments_list
-    }
 
 
 # ==================== STREAMING ENDPOINTS ====================
@@ -851,14 +1363,21 @@ async def start_streaming_session(request: StreamStartRequest):
         Success message với session info
     """
     try:
-        session = get_or_create_session(request.participant_id, request.language)
+        try:
+            session = get_or_create_session(request.participant_id, request.language, request.latency_budget)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         return {
             "status": "success",
             "message": f"Streaming session started for {request.participant_id}",
             "participant_id": request.participant_id,
-            "language": session['language'] or "auto-detect",
+            "language": session['language_id'].language or "auto-detect",
+            "language_id": session['language_id'].to_dict(),
+            "latency_budget_ms": session['latency_budget_ms'],
             "created_at": session['created_at']
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error starting streaming session: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to start session: {str(e)}")
@@ -886,6 +1405,9 @@ async def end_streaming_session(request: StreamEndRequest):
         session = streaming_sessions[request.participant_id]
         chunk_count = session['chunk_count']
         duration = time.time() - session['created_at']
+        language_id = session['language_id'].to_dict()
+        speech_ratio = session['vad'].speech_ratio if session['vad'] is not None else None
+        final_text, sentences = await finish_stream(session)
         
         cleanup_session(request.participant_id)
         
@@ -894,7 +1416,11 @@ async def end_streaming_session(request: StreamEndRequest):
             "message": f"Streaming session ended for {request.participant_id}",
             "participant_id": request.participant_id,
             "chunks_processed": chunk_count,
-            "duration_seconds": round(duration, 2)
+            "duration_seconds": round(duration, 2),
+            "language_id": language_id,
+            "speech_ratio": round(speech_ratio, 3) if speech_ratio is not None else None,
+            "final_text": final_text,
+            "sentences": sentences
         }
     except Exception as e:
         logger.error(f"❌ Error ending streaming session: {e}")
@@ -916,39 +1442,272 @@ async def transcribe_stream(request: StreamingAudioRequest):
         - Accepts 100ms audio chunks từ Gateway AudioProcessor
         - Returns interim results nhanh (<200ms target)
         - Accumulates buffer để improve accuracy
+        - JSON/base64 compatibility shim; client mới nên dùng /api/v1/transcribe-stream/binary
+    """
+    # Decode base64 audio
+    try:
+        audio_bytes = base64.b64decode(request.audio_data)
+    except Exception as e:
+        logger.error(f"❌ Failed to decode base64 audio: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid base64 audio data: {str(e)}")
+    
+    return await process_stream_chunk(
+        participant_id=request.participant_id,
+        audio_bytes=audio_bytes,
+        sample_rate=request.sample_rate,
+        channels=request.channels,
+        audio_format=request.format,
+        language=request.language
+    )
+
+
+@app.post("/api/v1/transcribe-stream/binary", response_model=StreamingTranscriptionResponse)
+async def transcribe_stream_binary(
+    request: Request,
+    x_participant_id: str = Header(..., description="Unique ID của participant"),
+    x_sample_rate: int = Header(48000, description="Sample rate (Hz)"),
+    x_channels: int = Header(1, description="Number of audio channels"),
+    x_audio_format: str = Header("pcm16", description="Audio format: pcm16, wav"),
+    x_language: Optional[str] = Header(None, description="Language code. None = auto-detect")
+):
+    """
+    Binary ingestion: body là raw audio (application/octet-stream), metadata nằm trong headers.
+    
+    Không có base64/JSON: body được đọc thẳng vào numpy view (np.frombuffer, không copy).
+    """
+    audio_bytes = await request.body()
+    return await process_stream_chunk(
+        participant_id=x_participant_id,
+        audio_bytes=audio_bytes,
+        sample_rate=x_sample_rate,
+        channels=x_channels,
+        audio_format=x_audio_format,
+        language=x_language
+    )
+
+
+@app.websocket("/api/v1/ws/stream/{participant_id}")
+async def stream_websocket(
+    websocket: WebSocket,
+    participant_id: str,
+    language: Optional[str] = None,
+    sample_rate: int = 48000,
+    channels: int = 1,
+    audio_format: str = "pcm16",
+    latency_budget: Optional[str] = None
+):
+    """
+    WebSocket streaming transport: một connection cho mỗi participant
+    
+    Upstream:
+        - Binary frame: một audio chunk (PCM16 little-endian hoặc WAV)
+        - Text frame {"type": "end"}: kết thúc session
+    Downstream (JSON):
+        - {"type": "sentence", "participant_id", "text", "start", "end", "words"}: câu vừa đóng,
+          gửi ngay (trước transcript của cùng chunk) để translation bắt đầu dịch
+        - {"type": "transcript", ...StreamingTranscriptionResponse}
+        - {"type": "backpressure", "retry_after", "queue_depth"}: inference queue đầy, chunk bị bỏ
+        - {"type": "error", "detail"}
+    """
+    await websocket.accept()
+    try:
+        get_or_create_session(participant_id, language, latency_budget)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    logger.info(f"🔌 WebSocket stream opened for {participant_id}")
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes") is not None:
+                if inference_executor.saturated:
+                    await send_backpressure(websocket)
+                    continue
+                try:
+                    response = await process_stream_chunk(
+                        participant_id=participant_id,
+                        audio_bytes=message["bytes"],
+                        sample_rate=sample_rate,
+                        channels=channels,
+                        audio_format=audio_format,
+                        language=language
+                    )
+                except InferenceQueueFull:
+                    await send_backpressure(websocket)
+                    continue
+                except HTTPException as e:
+                    await websocket.send_json({"type": "error", "detail": e.detail})
+                    continue
+                
+                for sentence in response.sentences or []:
+                    await websocket.send_json({"type": "sentence", "participant_id": participant_id, **sentence})
+                # Bỏ qua kết quả rỗng (chưa đủ buffer) để giảm traffic downstream
+                if response.text:
+                    await websocket.send_json({"type": "transcript", **response.model_dump(exclude={"sentences"})})
+            
+            elif message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    await websocket.send_json({"type": "error", "detail": "Invalid control message"})
+                    continue
+                if control.get("type") == "end":
+                    session = streaming_sessions.get(participant_id)
+                    if session is not None:
+                        _, sentences = await finish_stream(session)
+                        for sentence in sentences:
+                            await websocket.send_json({"type": "sentence", "participant_id": participant_id, **sentence})
+                    await websocket.close()
+                    break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        cleanup_session(participant_id)
+        logger.info(f"🔌 WebSocket stream closed for {participant_id}")
+
+
+async def send_backpressure(websocket: WebSocket):
+    """Báo client giảm tốc: inference queue đã đầy, chunk hiện tại bị bỏ"""
+    await websocket.send_json({
+        "type": "backpressure",
+        "retry_after": inference_executor.retry_after,
+        "queue_depth": inference_executor.pending
+    })
+
+
+async def stream_sentences(
+    session: dict,
+    words: list,
+    language: Optional[str],
+    until: Optional[float] = None,
+    flush: bool = False
+) -> List[dict]:
+    """
+    Đưa từ mới commit (thời gian toàn cục của session) vào sentence segmenter của session
+    
+    Args:
+        until: Audio đã decode tới đây mà chưa có từ mới → đóng câu nếu lặng đủ lâu
+        flush: Hết utterance / hết stream → đóng luôn câu còn dở
+        
+    Returns:
+        Các câu vừa đóng (dấu câu cho tiếng Việt)
+    """
+    # Feed đồng bộ trước await đầu tiên → thứ tự từ giữa các chunk đồng thời được giữ nguyên
+    segmenter = session['sentences']
+    sentences = []
+    for start, end, word in words:
+        sentences += segmenter.feed_word(" " + word, start, end)
+    if until is not None:
+        sentences += segmenter.advance(until)
+    if flush:
+        sentences += segmenter.flush()
+    if sentences and language in (None, "vi"):
+        texts = await asyncio.gather(*(punctuator.restore(sentence['text']) for sentence in sentences))
+        for sentence, text in zip(sentences, texts):
+            sentence['text'] = text
+    return sentences
+
+
+async def finish_stream(session: dict):
+    """Tail chưa commit + câu còn dở của session thành final. Returns (final_text, sentences)"""
+    # Chờ decode đang chạy commit xong (policy.update) trước khi finalize / flush segmenter
+    async with session['decode_lock']:
+        language = session['language_id'].language
+        words = session['policy'].finalize()
+        sentences = await stream_sentences(session, words, language, flush=True)
+        final_text = words_to_text(words)
+        if final_text and language in (None, "vi"):
+            final_text = await punctuator.restore(final_text)
+        return final_text, sentences
+
+
+def silent_stream_response(participant_id: str, session: dict, chunk_id: int) -> StreamingTranscriptionResponse:
+    """Kết quả rỗng cho cửa sổ bị VAD bỏ qua (không có speech)"""
+    return StreamingTranscriptionResponse(
+        participant_id=participant_id,
+        text="",
+        language=session['language_id'].language or "vi",
+        confidence=0.0,
+        is_final=False,
+        timestamp=time.time(),
+        chunk_id=chunk_id,
+        model_used="vad-silence"
+    )
+
+
+async def stream_final_response(
+    participant_id: str, session: dict, chunk_id: int, words: list
+) -> StreamingTranscriptionResponse:
+    """Final cho tail còn lại + câu còn dở khi utterance kết thúc (VAD silence)"""
+    language = session['language_id'].language or "vi"
+    sentences = await stream_sentences(session, words, language, flush=True)
+    text = words_to_text(words)
+    if text and language == "vi":
+        text = await punctuator.restore(text)
+    return StreamingTranscriptionResponse(
+        participant_id=participant_id,
+        text=text,
+        language=language,
+        confidence=session['language_id'].confidence,
+        is_final=True,
+        timestamp=time.time(),
+        chunk_id=chunk_id,
+        model_used=session['model_used'],
+        sentences=sentences or None
+    )
+
+
+async def process_stream_chunk(
+    participant_id: str,
+    audio_bytes: bytes,
+    sample_rate: int,
+    channels: int,
+    audio_format: str,
+    language: Optional[str]
+) -> StreamingTranscriptionResponse:
+    """
+    Xử lý một audio chunk của streaming session (dùng chung cho JSON và binary endpoints).
+    
+    Args:
+        participant_id: Unique participant ID
+        audio_bytes: Raw audio bytes (PCM16 little-endian hoặc WAV)
+        sample_rate: Sample rate của chunk (Hz)
+        channels: Số channels (interleaved nếu PCM16)
+        audio_format: "pcm16" hoặc "wav"
+        language: Language code (None = auto-detect)
     """
     start_time = time.time()
     
     # Check if any model is loaded
-    if phowhisper_model is None and faster_whisper_model is None:
+    if not any_model_loaded():
         raise HTTPException(status_code=503, detail="No models loaded")
     
     try:
         # Get or create session
-        session = get_or_create_session(request.participant_id, request.language)
+        session = get_or_create_session(participant_id, language)
         session['chunk_count'] += 1
         chunk_id = session['chunk_count']
         
-        # Decode base64 audio
-        try:
-            audio_bytes = base64.b64decode(request.audio_data)
-        except Exception as e:
-            logger.error(f"❌ Failed to decode base64 audio: {e}")
-            raise HTTPException(status_code=400, detail=f"Invalid base64 audio data: {str(e)}")
-        
         # Convert bytes to numpy array (assume PCM16 little-endian)
-        if request.format == "pcm16":
-            # PCM16: 2 bytes per sample, little-endian signed integer
-            audio_data = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32)
-            # Normalize to [-1, 1]
-            audio_data = audio_data / 32768.0
-        elif request.format == "wav":
+        if audio_format == "pcm16":
+            # PCM16: 2 bytes per sample, little-endian signed integer (view, không copy)
+            try:
+                pcm = pcm16_view(audio_bytes)
+                if channels > 1:
+                    pcm = pcm.reshape(-1, channels)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            audio_data = pcm
+        elif audio_format == "wav":
             # Parse WAV file
-            audio_data, sample_rate_wav = sf.read(io.BytesIO(audio_bytes))
-            audio_data = audio_data.astype(np.float32)
+            audio_data, sample_rate_wav = sf.read(io.BytesIO(audio_bytes), dtype='float32')
             # Override sample rate from WAV header
-            request.sample_rate = sample_rate_wav
-        elif request.format == "opus":
+            sample_rate = sample_rate_wav
+        elif audio_format == "opus":
             # TODO: Decode Opus to PCM (requires opuslib or ffmpeg)
             # For now, return error
             raise HTTPException(
@@ -956,95 +1715,188 @@ async def transcribe_stream(request: StreamingAudioRequest):
                 detail="Opus format not yet supported. Use pcm16 or wav format. Gateway should include Opus decoder."
             )
         else:
-            raise HTTPException(status_code=400, detail=f"Unsupported audio format: {request.format}")
-        
-        # Handle stereo to mono conversion
-        if request.channels == 2 and len(audio_data.shape) > 1:
-            audio_data = audio_data.mean(axis=1)
-        
-        # Add to session buffer (accumulate cho better accuracy)
-        session['buffer'].append(audio_data)
+            raise HTTPException(status_code=400, detail=f"Unsupported audio format: {audio_format}")
         
-        # Strategy: Process khi buffer đủ lớn (500ms - 1s) hoặc chunk thứ 5
-        # Balance giữa latency và accuracy
-        MIN_BUFFER_SIZE = int(request.sample_rate * 0.5)  # 500ms
-        should_process = (
-            len(np.concatenate(session['buffer'])) >= MIN_BUFFER_SIZE or
-            chunk_id % 5 == 0  # Process mỗi 5 chunks (500ms nếu chunk 100ms)
-        )
+        vad = session['vad']
+        buffer = session['buffer']
+        async with session['ingest_lock']:
+            # Int16 → Float32 [-1, 1], mono, resample 16kHz (polyphase, giữ state giữa các chunk)
+            # trong scratch buffers của session → gần như không cấp phát mỗi chunk
+            preprocessor = session['preprocessor']
+            if preprocessor is None or preprocessor.original_sample_rate != sample_rate:
+                preprocessor = ChunkPreprocessor(sample_rate, 16000)
+                session['preprocessor'] = preprocessor
+            audio_data = preprocessor.process(audio_data)
+            
+            # VAD trên chunk 16kHz (state + hangover liên tục giữa các chunk)
+            if vad is None or await vad.accept_async(audio_data) > 0:
+                session['speech_in_window'] = True
+            
+            # Add to session buffer (cửa sổ tăng dần, cắt đầu khi prefix đã commit); copy ra khỏi scratch buffer
+            buffer.append(audio_data)
+            session['new_samples'] += len(audio_data)
         
-        if not should_process:
-            # Return empty interim result (chờ accumulate thêm)
+        # Decode lại cửa sổ khi có thêm ≥ 500ms audio mới; đang decode thì chunk này chờ lần sau
+        if session['new_samples'] < STREAM_STEP_SAMPLES or session['decode_lock'].locked():
             return StreamingTranscriptionResponse(
-                participant_id=request.participant_id,
+                participant_id=participant_id,
                 text="",
-                language=session['language'] or "vi",
+                language=session['language_id'].language or "vi",
                 confidence=0.0,
                 is_final=False,
                 timestamp=time.time(),
                 chunk_id=chunk_id,
                 model_used="pending"
             )
+        session['new_samples'] = 0
+        policy = session['policy']
         
-        # Concatenate buffer
-        full_audio = np.concatenate(session['buffer'])
-        
-        # Clear buffer sau khi process (hoặc giữ lại 200ms overlap để tránh cut words)
-        overlap_samples = int(request.sample_rate * 0.2)  # 200ms overlap
-        if len(full_audio) > overlap_samples:
-            session['buffer'] = [full_audio[-overlap_samples:]]
-        else:
-            session['buffer'] = []
-        
-        # Detect language if not specified
-        language = session['language'] or request.language or "vi"
-        
-        # Select model
-        model_used = "unknown"
-        result_text = ""
-        detected_language = language
-        confidence = 0.0
+        # Audio mới toàn silence → hết utterance: tail thành final, bỏ audio cũ (giữ pre-roll cho speech onset).
+        # Giữ decode_lock tới khi final xong (punctuation await) → chunk sau không chen policy.update vào giữa
+        if not session['speech_in_window']:
+            async with session['decode_lock']:
+                dropped = len(buffer) - STREAM_PREROLL_SAMPLES
+                if dropped > 0:
+                    VAD_AUDIO_SECONDS.labels(decision="skipped").inc(dropped / 16000)
+                    buffer.keep_last(STREAM_PREROLL_SAMPLES)
+                    policy.advance(dropped / 16000)
+                final_words = policy.finalize()
+                if not final_words and not session['sentences'].pending:
+                    return silent_stream_response(participant_id, session, chunk_id)
+                return await stream_final_response(participant_id, session, chunk_id, final_words)
+        session['speech_in_window'] = False
         
-        # Use PhoWhisper for Vietnamese, faster-whisper for others
-        if language == "vi" and phowhisper_model is not None:
-            model_used = "phowhisper"
-            result = await transcribe_with_phowhisper(
-                full_audio,
-                request.sample_rate,
-                language,
-                word_timestamps=False  # Skip timestamps cho streaming (faster)
+        async with session['decode_lock']:
+            # Snapshot cửa sổ (copy độc lập vì inference chạy trên thread khác trong lúc chunk mới vẫn đến)
+            window = buffer.snapshot()
+            window_offset = buffer.offset  # Sample tuyệt đối của window[0]
+            window_seconds = len(window) / 16000
+            
+            # Cắt silence đầu/cuối cửa sổ (chừa padding) → model decode ít audio hơn;
+            # dùng lại flag VAD của các chunk đã accept (cùng mốc sample tuyệt đối với buffer)
+            window_start = 0
+            if vad is not None:
+                window_start, window_end = await vad.trim_bounds_async(window, start=window_offset)
+                if window_end == 0:
+                    return silent_stream_response(participant_id, session, chunk_id)
+                mel_cache = session['mel_cache']
+                if mel_cache is not None:
+                    # Lùi đầu cửa sổ (< 10ms, vẫn trong padding) về cùng pha hop với frame log-mel đã cache
+                    window_start = max(mel_cache.align(window_offset + window_start) - window_offset, 0)
+                window = window[window_start:window_end]
+            VAD_AUDIO_SECONDS.labels(decision="inference").inc(len(window) / 16000)
+            set_inference_flow(participant_id, PRIORITY_STREAMING, len(window) / 16000)
+            
+            # Ngôn ngữ đã pin → decode thẳng; chưa pin / đến lúc re-check → faster-whisper tự detect
+            language_pin = session['language_id']
+            language = language_identifier.language_for_chunk(language_pin)
+            if language is None and faster_whisper_model is None:
+                # Không có model multilingual để detect
+                language = language_pin.language or "vi"
+            
+            # Select model
+            model_used = "unknown"
+            detected_language = language
+            confidence = 0.0
+            prompt = policy.prompt()
+            
+            # Use PhoWhisper for Vietnamese (CT2 nếu có), faster-whisper for others
+            # Word timestamps cần cho LocalAgreement (so khớp + cắt buffer theo thời gian);
+            # beam size / fallback chọn theo latency budget của session và độ dài cửa sổ
+            if language == "vi" and phowhisper_ct2_model is not None:
+                model_used = "phowhisper-ct2"
+                result = await run_faster_whisper(
+                    window,
+                    language,
+                    "transcribe",
+                    STREAM_MAX_BEAM_SIZE,
+                    True,
+                    session['latency_budget_ms'],
+                    model_used,
+                    model=phowhisper_ct2_model,
+                    initial_prompt=prompt,
+                    require_word_timestamps=True
+                )
+                detected_language = result['language']
+                confidence = result['language_probability']
+                
+            elif language == "vi" and phowhisper_model is not None:
+                # Không có word timestamps → policy chia đều thời gian theo từ
+                model_used = "phowhisper"
+                result = await transcribe_with_phowhisper(
+                    window,
+                    16000,
+                    language,
+                    word_timestamps=False,
+                    mel_cache=session['mel_cache'],
+                    start_sample=window_offset + window_start
+                )
+                detected_language = result['language']
+                confidence = result['language_probability']
+                
+            elif faster_whisper_model is not None:
+                model_used = "faster-whisper"
+                result = await run_faster_whisper(
+                    window,
+                    language,
+                    "transcribe",
+                    STREAM_MAX_BEAM_SIZE,
+                    True,
+                    session['latency_budget_ms'],
+                    model_used,
+                    initial_prompt=prompt,
+                    require_word_timestamps=True
+                )
+                detected_language = result['language']
+                confidence = result['language_probability']
+            else:
+                raise HTTPException(status_code=503, detail="No suitable model available")
+            session['model_used'] = model_used
+            
+            # LocalAgreement: commit prefix hai hypothesis liên tiếp đồng ý, cắt buffer ở segment đã commit
+            words, segment_ends = words_from_segments(result['segments'])
+            window_end_seconds = policy.buffer_offset + window_seconds
+            committed, tail, trim_seconds = policy.update(
+                words, segment_ends, window_start / 16000, window_seconds
             )
-            result_text = result['text']
-            detected_language = result['language']
-            confidence = result['language_probability']
+            trim_samples = int(trim_seconds * 16000)
+            if trim_samples > 0:
+                buffer.keep_last(len(buffer) - trim_samples)
             
-        elif faster_whisper_model is not None:
-            model_used = "faster-whisper"
-            result = await transcribe_with_faster_whisper(
-                full_audio,
-                request.sample_rate,
-                language,
-                word_timestamps=False,
-                beam_size=1  # Beam=1 cho streaming (fastest)
+            # Câu đóng ngay khi gặp dấu kết câu / khoảng lặng sau từ commit cuối (tail chưa có từ mới)
+            sentences = await stream_sentences(
+                session, committed, detected_language,
+                until=min(tail[0][0], window_end_seconds) if tail else window_end_seconds
             )
-            result_text = result['text']
-            detected_language = result['language']
-            confidence = result['language_probability']
+        
+        # Cập nhật language pin: kết quả detection, hoặc log-prob của chunk decode với ngôn ngữ đã pin
+        if language is None:
+            language_identifier.observe_detection(language_pin, detected_language, confidence)
         else:
-            raise HTTPException(status_code=503, detail="No suitable model available")
+            language_identifier.observe_logprob(language_pin, result.get('avg_logprob'))
+        if language_pin.pinned:
+            confidence = language_pin.confidence
         
-        # Update session language if detected
-        if session['language'] is None:
-            session['language'] = detected_language
+        # Final = phần mới commit (ổn định), partial = tail chưa ổn định
+        tail_text = words_to_text(tail)
+        if committed:
+            result_text = words_to_text(committed)
+            # Dấu câu cho tiếng Việt (rule-based hoặc ONNX model, batched với request khác)
+            if detected_language == "vi":
+                result_text = await punctuator.restore(result_text)
+        else:
+            result_text = tail_text
         
         processing_time = time.time() - start_time
         
         # Log performance
         logger.info(
             f"✅ Streaming transcription [{model_used}] - "
-            f"Participant: {request.participant_id}, "
+            f"Participant: {participant_id}, "
             f"Chunk: {chunk_id}, "
-            f"Text: '{result_text[:50]}...', "
+            f"Window: {window_seconds:.1f}s, "
+            f"Committed: '{result_text[:50] if committed else ''}', "
+            f"Tail: '{tail_text[:50]}', "
             f"Time: {processing_time*1000:.0f}ms"
         )
         
@@ -1052,24 +1904,20 @@ async def transcribe_stream(request: StreamingAudioRequest):
         TRANSCRIPTION_COUNTER.labels(status='success', language=detected_language).inc()
         PROCESSING_TIME_HISTOGRAM.observe(processing_time)
         
-        # Return interim result (is_final=True mỗi 10 chunks hoặc khi có punctuation)
-        is_final_result = (
-            chunk_id % 10 == 0 or
-            any(p in result_text for p in ['.', '!', '?', '。', '！', '？'])
-        )
-        
         return StreamingTranscriptionResponse(
-            participant_id=request.participant_id,
+            participant_id=participant_id,
             text=result_text,
             language=detected_language,
             confidence=confidence,
-            is_final=is_final_result,
+            is_final=bool(committed),
             timestamp=time.time(),
             chunk_id=chunk_id,
-            model_used=model_used
+            model_used=model_used,
+            unstable_text=tail_text if committed else None,
+            sentences=sentences or None
         )
         
-    except HTTPException:
+    except (HTTPException, InferenceQueueFull):
         raise
     except Exception as e:
         logger.error(f"❌ Streaming transcription error: {e}", exc_info=True)
@@ -1083,8 +1931,16 @@ async def list_models():
     return {
         "loaded_models": {
             "phowhisper": phowhisper_model is not None,
+            "phowhisper_ct2": phowhisper_ct2_model is not None,
             "faster_whisper": faster_whisper_model is not None
         },
+        "phowhisper_ct2_info": {
+            "path": os.getenv("PHOWHISPER_CT2_PATH", "/app/models/phowhisper-ct2"),
+            "runtime": "CTranslate2 (faster-whisper)",
+            "compute_type": os.getenv("PHOWHISPER_CT2_COMPUTE_TYPE", "int8"),
+            "prefer_model": "phowhisper-ct2",
+            "note": "Convert bằng scripts/convert-phowhisper-ct2.py"
+        },
         "phowhisper_info": {
             "name": "vinai/PhoWhisper-small",
             "specialized_for": "Vietnamese",
@@ -1098,6 +1954,13 @@ async def list_models():
             "compute_types": ["int8", "float16", "float32"],
             "note": "Larger models require more RAM and CPU. For CPU inference, int8 is recommended."
         },
+        "decoding_policy": {
+            "profiles": [step.profile for step in decoding_policy.ladder],
+            "transcribe_latency_budget": TRANSCRIBE_LATENCY_BUDGET,
+            "stream_latency_budget": STREAM_LATENCY_BUDGET,
+            "learned_rtf": decoding_policy.snapshot(),
+            "queue_wait_ms": decoding_policy.queue_wait_snapshot()
+        },
         "recommendation": "Use language='vi' to explicitly use PhoWhisper for Vietnamese audio. Auto-detection will prefer PhoWhisper for better accuracy."
     }
 
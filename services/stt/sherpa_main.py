@@ -1,19 +1,54 @@
+import asyncio
 import base64
 import io
+import json
 import logging
+import os
 import time
-from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import soundfile as sf
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import (
+  FastAPI,
+  File,
+  Header,
+  HTTPException,
+  Request,
+  UploadFile,
+  WebSocket,
+  WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import JSONResponse, Response
 
-from config.sherpa_config import ENGLISH_MODEL, VIETNAMESE_MODEL, get_model_config
-from utils.audio_processor import AudioProcessor
+from config.sherpa_config import (
+  AVAILABLE_MODELS,
+  BATCHING,
+  ENGLISH_MODEL,
+  INFERENCE,
+  MODEL_REGISTRY,
+  SESSIONS,
+  STREAMING,
+  STREAMING_MODELS,
+  VAD,
+  VIETNAMESE_MODEL,
+  OnlineTransducerModelConfig,
+  TransducerModelConfig,
+  get_model_config,
+)
+from config.resource_plan import resource_plan_from_env
+from utils.audio_processor import AudioProcessor, ChunkPreprocessor, normalize_peak, pcm16_view
+from utils.fair_scheduler import PRIORITY_BATCH, PRIORITY_STREAMING, parse_class_weights, set_inference_flow
+from utils.inference_executor import InferenceExecutor, InferenceQueueFull, workers_for_threads
+from utils.micro_batcher import MicroBatcher
+from utils.model_registry import ModelRegistry, files_size_bytes
+from utils.session_reaper import SessionReaper
+from utils.vad import VAD_AUDIO_SECONDS, VoiceActivityDetector, create_vad_classifier
 
 import sherpa_onnx
 
@@ -36,41 +71,228 @@ TRANSCRIPTION_DURATION = Histogram(
 
 audio_processor = AudioProcessor(target_sample_rate=16000)
 
+# VAD phía server: chunk/utterance im lặng không vào inference queue
+vad_classifier = create_vad_classifier(
+  backend=VAD.backend,
+  model_path=VAD.model_path,
+  threshold=VAD.threshold,
+  energy_floor_db=VAD.energy_floor_db,
+)
+
+
+def create_vad() -> Optional[VoiceActivityDetector]:
+  if vad_classifier is None:
+    return None
+  return VoiceActivityDetector(vad_classifier, hangover_ms=VAD.hangover_ms, padding_ms=VAD.padding_ms)
+
+
+async def trim_silence(vad: Optional[VoiceActivityDetector], audio: np.ndarray) -> np.ndarray:
+  """Cắt silence đầu/cuối utterance (chưa normalize) rồi normalize peak."""
+  if vad is not None:
+    audio = await vad.trim_async(audio)
+  if len(audio) == 0:
+    return audio
+  VAD_AUDIO_SECONDS.labels(decision="inference").inc(len(audio) / 16000)
+  return normalize_peak(audio)
+
+
+def streaming_model_available(cfg: OnlineTransducerModelConfig) -> bool:
+  return STREAMING.mode == "online" and os.path.exists(f"{cfg.model_dir}/{cfg.encoder_path}")
+
+
+# Resource plan: mỗi recognizer một tập core riêng (num_threads cấu hình = trọng số khi chia core)
+resource_plan = resource_plan_from_env({
+  "vi": VIETNAMESE_MODEL.num_threads,
+  "en": ENGLISH_MODEL.num_threads,
+  **{
+    f"{lang}-online": cfg.num_threads
+    for lang, cfg in STREAMING_MODELS.items()
+    if streaming_model_available(cfg)
+  },
+})
+resource_plan.log_report()
+
 
 # Load Sherpa-ONNX models
-def load_offline_vi():
-  """Load Vietnamese Transducer model (offline)."""
-  cfg = VIETNAMESE_MODEL
-  return sherpa_onnx.OfflineRecognizer.from_transducer(
-    tokens=f"{cfg.model_dir}/{cfg.tokens_path}",
-    encoder=f"{cfg.model_dir}/{cfg.encoder_path}",
-    decoder=f"{cfg.model_dir}/{cfg.decoder_path}",
-    joiner=f"{cfg.model_dir}/{cfg.joiner_path}",
-    num_threads=cfg.num_threads,
-    provider=cfg.provider,
-    decoding_method=cfg.decoding_method,
-    max_active_paths=cfg.max_active_paths,
+# Load trong `resource_plan.pinned(...)`: thread pool của onnxruntime thừa hưởng core của model
+def load_offline(cfg: TransducerModelConfig):
+  """
+  Load offline Transducer recognizer: vi = Zipformer, en = NeMo Parakeet TDT 0.6B
+  (hỗ trợ punctuation & capitalization).
+  """
+  # CRITICAL: Parakeet phải dùng NeMo transducer branch, không phải generic transducer
+  extra = {"model_type": "nemo_transducer"} if cfg.model_type == "nemo_transducer" else {}
+  with resource_plan.pinned(cfg.language):
+    return sherpa_onnx.OfflineRecognizer.from_transducer(
+      tokens=f"{cfg.model_dir}/{cfg.tokens_path}",
+      encoder=f"{cfg.model_dir}/{cfg.encoder_path}",
+      decoder=f"{cfg.model_dir}/{cfg.decoder_path}",
+      joiner=f"{cfg.model_dir}/{cfg.joiner_path}",
+      num_threads=resource_plan.threads(cfg.language, cfg.num_threads),
+      provider=cfg.provider,
+      decoding_method=cfg.decoding_method,
+      max_active_paths=cfg.max_active_paths,
+      **extra,
+    )
+
+
+def load_online(lang: str, cfg: OnlineTransducerModelConfig):
+  """Load streaming Zipformer (OnlineRecognizer) với endpoint detection."""
+  with resource_plan.pinned(f"{lang}-online"):
+    return sherpa_onnx.OnlineRecognizer.from_transducer(
+      tokens=f"{cfg.model_dir}/{cfg.tokens_path}",
+      encoder=f"{cfg.model_dir}/{cfg.encoder_path}",
+      decoder=f"{cfg.model_dir}/{cfg.decoder_path}",
+      joiner=f"{cfg.model_dir}/{cfg.joiner_path}",
+      num_threads=resource_plan.threads(f"{lang}-online", cfg.num_threads),
+      sample_rate=16000,
+      feature_dim=80,
+      provider=cfg.provider,
+      decoding_method=cfg.decoding_method,
+      max_active_paths=cfg.max_active_paths,
+      enable_endpoint_detection=True,
+      rule1_min_trailing_silence=cfg.rule1_min_trailing_silence,
+      rule2_min_trailing_silence=cfg.rule2_min_trailing_silence,
+      rule3_min_utterance_length=cfg.rule3_min_utterance_length,
+    )
+
+
+def load_online_recognizers() -> Dict[str, "sherpa_onnx.OnlineRecognizer"]:
+  """Load các streaming model có sẵn trên disk (chỉ khi STT_STREAMING_MODE=online)."""
+  recognizers = {}
+  if STREAMING.mode != "online":
+    return recognizers
+  for lang, cfg in STREAMING_MODELS.items():
+    if not streaming_model_available(cfg):
+      logger.warning(f"⚠️ Streaming model for '{lang}' not found in {cfg.model_dir}, using offline mode")
+      continue
+    recognizers[lang] = load_online(lang, cfg)
+    logger.info(f"✅ Loaded streaming model for '{lang}': {cfg.name}")
+  return recognizers
+
+
+# Offline recognizer load khi ngôn ngữ được dùng lần đầu (STT_PRELOAD_MODELS load sẵn lúc startup);
+# vượt STT_MODEL_MEMORY_BUDGET_MB → evict model idle ít dùng nhất
+model_registry = ModelRegistry("sherpa", memory_budget_bytes=MODEL_REGISTRY.memory_budget_mb * 1024 * 1024)
+for _lang, _cfg in AVAILABLE_MODELS.items():
+  model_registry.register(
+    _lang,
+    partial(load_offline, _cfg),
+    estimate_bytes=files_size_bytes(
+      f"{_cfg.model_dir}/{path}" for path in (_cfg.encoder_path, _cfg.decoder_path, _cfg.joiner_path)
+    ),
   )
+online_recognizers = load_online_recognizers()
+
+
+def decode_offline_batch(recognizer, batch: List[np.ndarray]) -> List[str]:
+  """Decode nhiều utterance (16kHz float32) cùng lúc bằng decode_streams."""
+  streams = []
+  for samples in batch:
+    stream = recognizer.create_stream()
+    stream.accept_waveform(16000, samples)
+    streams.append(stream)
+  recognizer.decode_streams(streams)
+  return [stream.result.text or "" for stream in streams]
+
+
+def decode_registered_batch(lang: str, batch: List[np.ndarray]) -> List[str]:
+  """decode_offline_batch với recognizer trong registry (caller giữ `model_registry.use(lang)`)."""
+  return decode_offline_batch(model_registry.get_loaded(lang), batch)
+
+
+# decode_streams chạy trên thread pool riêng → /health, /metrics không bị chặn bởi decode
+inference_executor = InferenceExecutor(
+  "sherpa",
+  # Resource plan bật → mỗi model một worker (chạy song song trên core riêng của nó)
+  max_workers=INFERENCE.workers
+  or (len(resource_plan.allocations) if resource_plan.enabled else None)
+  or workers_for_threads(max(VIETNAMESE_MODEL.num_threads, ENGLISH_MODEL.num_threads)),
+  max_queue_size=INFERENCE.max_queue_size,
+  retry_after=INFERENCE.retry_after_seconds,
+  # Fair queuing: queue riêng mỗi participant, streaming ưu tiên hơn upload /transcribe
+  class_weights=parse_class_weights(INFERENCE.scheduler_weights),
+  quantum=INFERENCE.scheduler_quantum_seconds,
+)
+
+# Mỗi ngôn ngữ một batcher: các utterance đến trong cùng window được decode chung;
+# batch chạy trên worker đã pin vào core của model (`resource_plan.bind`)
+offline_batchers: Dict[str, MicroBatcher] = {
+  lang: MicroBatcher(
+    lang,
+    resource_plan.bind(lang, partial(decode_registered_batch, lang)),
+    window_ms=BATCHING.window_ms,
+    max_batch_size=BATCHING.max_batch_size,
+    executor=inference_executor,
+  )
+  for lang in AVAILABLE_MODELS
+}
+
+
+async def decode_offline(lang: str, samples: np.ndarray) -> str:
+  """
+  Gửi utterance vào batcher của ngôn ngữ tương ứng và chờ text.
+  Recognizer được load nếu chưa có và không bị evict tới khi decode xong.
+  """
+  async with model_registry.use(lang):
+    return await offline_batchers[lang].submit(samples)
 
 
-def load_offline_en():
-  """Load English NeMo Parakeet TDT 0.6B Transducer (hỗ trợ punctuation & capitalization)."""
-  cfg = ENGLISH_MODEL
-  return sherpa_onnx.OfflineRecognizer.from_transducer(
-    tokens=f"{cfg.model_dir}/{cfg.tokens_path}",
-    encoder=f"{cfg.model_dir}/{cfg.encoder_path}",
-    decoder=f"{cfg.model_dir}/{cfg.decoder_path}",
-    joiner=f"{cfg.model_dir}/{cfg.joiner_path}",
-    num_threads=cfg.num_threads,
-    provider=cfg.provider,
-    decoding_method=cfg.decoding_method,
-    max_active_paths=cfg.max_active_paths,
-    model_type="nemo_transducer",  # CRITICAL: Use NeMo transducer branch, not generic transducer
+# Đệm im lặng cuối stream để encoder streaming xả hết frame còn lại
+ONLINE_TAIL_PADDING = np.zeros(int(0.66 * 16000), dtype=np.float32)
+
+
+def decode_online_batch(recognizer, batch: List[tuple]) -> List[Tuple[str, bool]]:
+  """
+  Đưa chunk mới vào các online stream rồi decode chung những stream đã đủ frame.
+
+  Item: (stream, samples, finished). finished=True → xả stream (stream-end).
+  Returns (text, is_final) cho từng item; stream được reset khi gặp endpoint.
+  """
+  streams = []
+  for stream, samples, finished in batch:
+    if samples is not None and len(samples) > 0:
+      stream.accept_waveform(16000, samples)
+    if finished:
+      stream.accept_waveform(16000, ONLINE_TAIL_PADDING)
+      stream.input_finished()
+    streams.append(stream)
+
+  ready = [stream for stream in streams if recognizer.is_ready(stream)]
+  while ready:
+    recognizer.decode_streams(ready)
+    ready = [stream for stream in ready if recognizer.is_ready(stream)]
+
+  results = []
+  for (stream, _, finished) in batch:
+    text = recognizer.get_result(stream)
+    is_final = finished or recognizer.is_endpoint(stream)
+    if is_final and not finished:
+      recognizer.reset(stream)
+    results.append((text, is_final))
+  return results
+
+
+online_batchers: Dict[str, MicroBatcher] = {
+  lang: MicroBatcher(
+    f"{lang}-online",
+    resource_plan.bind(f"{lang}-online", partial(decode_online_batch, recognizer)),
+    window_ms=BATCHING.window_ms,
+    max_batch_size=BATCHING.max_batch_size,
+    executor=inference_executor,
   )
+  for lang, recognizer in online_recognizers.items()
+}
 
 
-offline_vi_recognizer = load_offline_vi()
-offline_en_recognizer = load_offline_en()  # Đổi từ online sang offline
+async def decode_online(
+  session: "StreamingSession", samples: Optional[np.ndarray], finished: bool = False
+) -> Tuple[str, bool]:
+  """Feed chunk vào online stream của session, trả về (partial/final text, is_final)."""
+  async with session.lock:
+    if session.online_stream is None:
+      session.online_stream = online_recognizers[session.language].create_stream()
+    return await online_batchers[session.language].submit((session.online_stream, samples, finished))
 
 
 class StreamingAudioRequest(BaseModel):
@@ -129,14 +351,78 @@ class StreamingSession:
     self.participant_id = participant_id
     self.language = language or "vi"
     self.overlap: Optional[np.ndarray] = None
-    self.buffer = []
     self.chunk_count = 0
-    # Không cần stream nữa vì cả 2 model đều dùng offline mode
+    self.last_activity = time.time()
+    # Online mode: một OnlineStream cho mỗi participant, giữ state encoder/decoder giữa các chunk
+    self.online_stream = None
+    self.lock = asyncio.Lock()
+    # Scratch buffers + polyphase resampler giữ filter state giữa các chunk (biên chunk liền mạch)
+    self.preprocessor: Optional[ChunkPreprocessor] = None
+    # VAD per-session; online mode chỉ feed silence cho recognizer khi đang trong utterance
+    self.vad = create_vad()
+    self.in_utterance = False
+    self.preroll: Optional[np.ndarray] = None
+
+  def get_preprocessor(self, sample_rate: int) -> ChunkPreprocessor:
+    if self.preprocessor is None or self.preprocessor.original_sample_rate != sample_rate:
+      self.preprocessor = ChunkPreprocessor(sample_rate, 16000)
+    return self.preprocessor
+
+  @property
+  def is_online(self) -> bool:
+    return self.language in online_recognizers
+
+  @property
+  def buffered_bytes(self) -> int:
+    """Audio đang giữ trong session (overlap + scratch buffers + resampler history)."""
+    total = self.overlap.nbytes if self.overlap is not None else 0
+    if self.preroll is not None:
+      total += self.preroll.nbytes
+    if self.preprocessor is not None:
+      total += self.preprocessor.nbytes
+    return total
 
 
 sessions: Dict[str, StreamingSession] = {}
 
-app = FastAPI(title="STT Service - Sherpa-ONNX", version="2.0.0")
+
+def discard_session(
+  participant_id: str, session: Optional[StreamingSession] = None
+) -> Optional[StreamingSession]:
+  """
+  Gỡ session, không decode phần audio còn lại (WebSocket đóng, reaper evict); ghi VAD metrics.
+  session: đã được gỡ khỏi `sessions` (SessionReaper on_evict).
+  """
+  if session is None:
+    session = sessions.pop(participant_id, None)
+  if session is not None and session.vad is not None:
+    session.vad.close()
+  return session
+
+
+# Dọn session của participant rớt mạng (không gọi stream-end) + giới hạn tổng audio buffer
+session_reaper = SessionReaper(
+  sessions,
+  last_activity=lambda session: session.last_activity,
+  buffered_bytes=lambda session: session.buffered_bytes,
+  idle_timeout=SESSIONS.idle_timeout_seconds,
+  max_buffered_bytes=SESSIONS.max_buffered_bytes,
+  interval=SESSIONS.reap_interval_seconds,
+  on_evict=discard_session,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  await model_registry.preload(lang.strip() for lang in MODEL_REGISTRY.preload.split(",") if lang.strip())
+  session_reaper.start()
+  yield
+  await session_reaper.stop()
+  for batcher in list(offline_batchers.values()) + list(online_batchers.values()):
+    await batcher.close()
+  inference_executor.shutdown()
+
+
+app = FastAPI(title="STT Service - Sherpa-ONNX", version="2.0.0", lifespan=lifespan)
 
 app.add_middleware(
   CORSMiddleware,
@@ -147,25 +433,60 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full_handler(request, exc: InferenceQueueFull):
+  return JSONResponse(
+    status_code=503,
+    content={"detail": str(exc)},
+    headers={"Retry-After": str(exc.retry_after)},
+  )
+
+
 def get_language(lang: Optional[str]) -> str:
   if lang and lang.lower() in ("vi", "en"):
     return lang.lower()
   return "vi"
 
 
+def decode_base64_audio(audio_data: str) -> bytes:
+  try:
+    return base64.b64decode(audio_data)
+  except Exception as exc:  # noqa: BLE001
+    raise HTTPException(status_code=400, detail=f"Invalid base64 audio data: {exc}") from exc
+
+
+def load_pcm16(audio_bytes: bytes, audio_format: str, channels: int) -> np.ndarray:
+  """Zero-copy Int16 view trên request body; interleaved multi-channel → shape (n, channels)."""
+  if audio_format != "pcm16":
+    raise HTTPException(status_code=400, detail="Unsupported audio format")
+  try:
+    audio_np = pcm16_view(audio_bytes)
+    if channels > 1:
+      audio_np = audio_np.reshape(-1, channels)
+  except ValueError as exc:
+    raise HTTPException(status_code=400, detail=str(exc)) from exc
+  return audio_np
+
+
 @app.get("/health")
 async def health():
-  return {"status": "ok", "models": ["vi", "en"], "engine": "sherpa-onnx"}
+  return {
+    "status": "ok",
+    "models": ["vi", "en"],
+    "engine": "sherpa-onnx",
+    "streaming_languages": sorted(online_recognizers),
+    "scheduler": inference_executor.scheduler.snapshot() if inference_executor.scheduler else None,
+    "resource_plan": resource_plan.to_dict(),
+  }
 
 
 @app.get("/models")
 async def models():
   return {
-    "loaded_models": {
-      "vi": True,
-      "en": True,
-    },
+    "loaded_models": {lang: model_registry.is_loaded(lang) for lang in AVAILABLE_MODELS},
     "details": [VIETNAMESE_MODEL.__dict__, ENGLISH_MODEL.__dict__],
+    "registry": model_registry.snapshot(),
+    "streaming": {lang: STREAMING_MODELS[lang].__dict__ for lang in online_recognizers},
   }
 
 
@@ -181,8 +502,10 @@ async def metrics():
 
 @app.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
+  request: Request,
   audio: UploadFile = File(..., description="Audio file (WAV, MP3, etc.)"),
   language: Optional[str] = None,
+  participant_id: Optional[str] = None,
 ):
   lang = get_language(language)
   start = time.time()
@@ -198,21 +521,14 @@ async def transcribe_audio(
       data, sample_rate, channels=channels, previous_overlap=None, overlap_ms=0
     )
 
-    if lang == "vi":
-      stream = offline_vi_recognizer.create_stream()
-      stream.accept_waveform(16000, processed_audio)
-      offline_vi_recognizer.decode_stream(stream)
-      result = stream.result
-      text = result.text
-      model_used = VIETNAMESE_MODEL.name
-    else:
-      stream = online_en_recognizer.create_stream()
-      stream.accept_waveform(16000, processed_audio)
-      stream.input_finished()
-      online_en_recognizer.decode_stream(stream)
-      result = online_en_recognizer.get_result(stream)
-      text = result.text
-      model_used = ENGLISH_MODEL.name
+    # Upload là batch traffic; flow theo participant (hoặc client) để các upload chia đều slot
+    set_inference_flow(
+      participant_id or (request.client.host if request.client else "upload"),
+      PRIORITY_BATCH,
+      len(processed_audio) / 16000.0,
+    )
+    text = await decode_offline(lang, processed_audio)
+    model_used = VIETNAMESE_MODEL.name if lang == "vi" else ENGLISH_MODEL.name
 
     duration = len(processed_audio) / 16000.0
     processing_time = time.time() - start
@@ -229,6 +545,9 @@ async def transcribe_audio(
       processing_time=processing_time,
       model_used=model_used,
     )
+  except InferenceQueueFull:
+    TRANSCRIPTION_COUNTER.labels(status="rejected", language=lang).inc()
+    raise
   except Exception as exc:  # noqa: BLE001
     logger.exception("Transcription failed")
     TRANSCRIPTION_COUNTER.labels(status="error", language=lang).inc()
@@ -238,16 +557,123 @@ async def transcribe_audio(
 @app.post("/api/v1/stream-start")
 async def stream_start(req: StreamSessionRequest):
   lang = get_language(req.language)
+  discard_session(req.participant_id)  # stream-start lặp lại → session cũ bị thay thế
   sessions[req.participant_id] = StreamingSession(req.participant_id, lang)
   logger.info(f"Stream started for {req.participant_id}, language: {lang}")
   return {"status": "started", "participant_id": req.participant_id, "language": lang}
 
 
+async def close_session(participant_id: str) -> str:
+  """Xoá session; online mode thì xả phần audio còn lại thành kết quả cuối."""
+  session = discard_session(participant_id)
+  if session is None or session.online_stream is None:
+    return ""
+  set_inference_flow(participant_id, PRIORITY_STREAMING, 0.66)  # Chỉ còn tail padding
+  final_text, _ = await decode_online(session, None, finished=True)
+  return final_text
+
+
 @app.post("/api/v1/stream-end")
 async def stream_end(req: StreamSessionRequest):
-  sessions.pop(req.participant_id, None)
+  final_text = await close_session(req.participant_id)
   logger.info(f"Stream ended for {req.participant_id}")
-  return {"status": "ended", "participant_id": req.participant_id}
+  return {"status": "ended", "participant_id": req.participant_id, "final_text": final_text}
+
+
+async def send_backpressure(websocket: WebSocket):
+  """Inference queue đầy → báo client giảm tốc; chunk hiện tại bị bỏ."""
+  await websocket.send_json({
+    "type": "backpressure",
+    "retry_after": inference_executor.retry_after,
+    "queue_depth": inference_executor.pending,
+  })
+
+
+@app.websocket("/api/v1/ws/stream/{participant_id}")
+async def stream_websocket(
+  websocket: WebSocket,
+  participant_id: str,
+  language: Optional[str] = None,
+  sample_rate: int = 48000,
+  channels: int = 1,
+  audio_format: str = "pcm16",
+):
+  """
+  WebSocket streaming transport: một connection cho mỗi participant.
+
+  Upstream: binary frame = audio chunk PCM16 LE; text frame {"type": "end"} để kết thúc.
+  Downstream (JSON): {"type": "transcript", ...StreamingTranscriptionResponse},
+  {"type": "backpressure", "retry_after", "queue_depth"}, {"type": "error", "detail"}.
+  """
+  await websocket.accept()
+  lang = get_language(language)
+  discard_session(participant_id)  # Reconnect → session cũ bị thay thế
+  session = StreamingSession(participant_id, lang)
+  sessions[participant_id] = session
+  logger.info(f"🔌 WebSocket stream opened for {participant_id}, language: {lang}")
+  chunk_id = 0
+
+  try:
+    while True:
+      message = await websocket.receive()
+      if message["type"] == "websocket.disconnect":
+        break
+
+      if message.get("bytes") is not None:
+        if inference_executor.saturated:
+          await send_backpressure(websocket)
+          continue
+        try:
+          response = await process_stream_chunk(
+            participant_id=participant_id,
+            audio_bytes=message["bytes"],
+            sample_rate=sample_rate,
+            channels=channels,
+            audio_format=audio_format,
+            language=lang,
+          )
+        except InferenceQueueFull:
+          await send_backpressure(websocket)
+          continue
+        except HTTPException as exc:
+          await websocket.send_json({"type": "error", "detail": exc.detail})
+          continue
+        chunk_id = response.chunk_id
+        # Bỏ qua kết quả rỗng (silence / chưa có hypothesis) để giảm traffic downstream
+        if response.text:
+          await websocket.send_json({"type": "transcript", **response.model_dump()})
+
+      elif message.get("text") is not None:
+        try:
+          control = json.loads(message["text"])
+        except ValueError:
+          await websocket.send_json({"type": "error", "detail": "Invalid control message"})
+          continue
+        if control.get("type") == "end":
+          final_text = await close_session(participant_id)
+          if final_text:
+            await websocket.send_json({
+              "type": "transcript",
+              **StreamingTranscriptionResponse(
+                participant_id=participant_id,
+                text=final_text,
+                language=lang,
+                confidence=1.0,
+                is_final=True,
+                timestamp=time.time(),
+                chunk_id=chunk_id,
+                model_used=STREAMING_MODELS[lang].name,
+              ).model_dump(),
+            })
+          await websocket.close()
+          break
+  except WebSocketDisconnect:
+    pass
+  finally:
+    if sessions.get(participant_id) is session:
+      # Connection cũ đóng sau khi client đã reconnect → không gỡ session của connection mới
+      discard_session(participant_id)
+    logger.info(f"🔌 WebSocket stream closed for {participant_id}")
 
 
 @app.post("/api/v1/transcribe-vi-utterance", response_model=StreamingTranscriptionResponse)
@@ -256,31 +682,70 @@ async def transcribe_vi_utterance(req: UtteranceTranscriptionRequest):
   Transcribe một utterance tiếng Việt (offline model).
   - Expect: PCM16 base64, sample_rate ~16k (resample nếu cần).
   - Không giữ trạng thái streaming; mỗi request là một câu độc lập.
+  - JSON/base64 compatibility shim cho /api/v1/transcribe-vi-utterance/binary.
   """
+  return await process_vi_utterance(
+    participant_id=req.participant_id,
+    audio_bytes=decode_base64_audio(req.audio_data),
+    sample_rate=req.sample_rate,
+    channels=req.channels,
+    audio_format=req.format,
+    language=req.language,
+  )
+
+
+@app.post("/api/v1/transcribe-vi-utterance/binary", response_model=StreamingTranscriptionResponse)
+async def transcribe_vi_utterance_binary(
+  request: Request,
+  x_participant_id: str = Header(..., description="Unique ID của participant"),
+  x_sample_rate: int = Header(16000, description="Sample rate (Hz)"),
+  x_channels: int = Header(1, description="Number of audio channels"),
+  x_audio_format: str = Header("pcm16", description="Audio format"),
+  x_language: Optional[str] = Header("vi", description="Language code, must be 'vi'"),
+):
+  """Binary ingestion: body = raw PCM16 (application/octet-stream), metadata trong headers."""
+  return await process_vi_utterance(
+    participant_id=x_participant_id,
+    audio_bytes=await request.body(),
+    sample_rate=x_sample_rate,
+    channels=x_channels,
+    audio_format=x_audio_format,
+    language=x_language,
+  )
+
+
+async def process_vi_utterance(
+  participant_id: str,
+  audio_bytes: bytes,
+  sample_rate: int,
+  channels: int,
+  audio_format: str,
+  language: Optional[str],
+) -> StreamingTranscriptionResponse:
+  """Decode một utterance tiếng Việt (dùng chung cho JSON và binary endpoints)."""
   start_time = time.time()  # Track processing time for metrics
-  lang = get_language(req.language)
+  lang = get_language(language)
   if lang != "vi":
     raise HTTPException(status_code=400, detail="Only Vietnamese is supported for this endpoint")
 
   try:
-    audio_bytes = base64.b64decode(req.audio_data)
-    if req.format != "pcm16":
-      raise HTTPException(status_code=400, detail="Unsupported audio format")
-
-    audio_np = np.frombuffer(audio_bytes, dtype=np.int16)
+    audio_np = load_pcm16(audio_bytes, audio_format, channels)
     processed_audio, _ = audio_processor.process_for_sherpa(
       audio_np,
-      sample_rate=req.sample_rate,
-      channels=req.channels,
+      sample_rate=sample_rate,
+      channels=channels,
       previous_overlap=None,
       overlap_ms=0,
+      normalize=False,
     )
+    # VAD trên audio chưa normalize (ngưỡng năng lượng tuyệt đối còn ý nghĩa)
+    processed_audio = await trim_silence(create_vad(), processed_audio)
 
     duration_sec = len(processed_audio) / 16000.0
     if duration_sec < 0.35:
-      # Quá ngắn → coi như silence, trả về rỗng
+      # Không có speech / quá ngắn → coi như silence, trả về rỗng
       return StreamingTranscriptionResponse(
-        participant_id=req.participant_id,
+        participant_id=participant_id,
         text="",
         language=lang,
         confidence=0.0,
@@ -290,14 +755,11 @@ async def transcribe_vi_utterance(req: UtteranceTranscriptionRequest):
         model_used=VIETNAMESE_MODEL.name,
       )
 
-    stream = offline_vi_recognizer.create_stream()
-    stream.accept_waveform(16000, processed_audio)
-    offline_vi_recognizer.decode_stream(stream)
-    result = stream.result
-    text = result.text or ""
+    set_inference_flow(participant_id, PRIORITY_STREAMING, duration_sec)
+    text = await decode_offline("vi", processed_audio)
 
     logger.info(
-      f"📝 [VI-OFFLINE] Utterance (participant={req.participant_id}, duration={duration_sec:.2f}s): '{text}'"
+      f"📝 [VI-OFFLINE] Utterance (participant={participant_id}, duration={duration_sec:.2f}s): '{text}'"
     )
 
     processing_time = time.time() - start_time
@@ -305,7 +767,7 @@ async def transcribe_vi_utterance(req: UtteranceTranscriptionRequest):
     TRANSCRIPTION_DURATION.observe(processing_time)
 
     return StreamingTranscriptionResponse(
-      participant_id=req.participant_id,
+      participant_id=participant_id,
       text=text,
       language=lang,
       confidence=1.0 if text else 0.0,
@@ -317,6 +779,9 @@ async def transcribe_vi_utterance(req: UtteranceTranscriptionRequest):
   except HTTPException:
     TRANSCRIPTION_COUNTER.labels(status="error", language="vi").inc()
     raise
+  except InferenceQueueFull:
+    TRANSCRIPTION_COUNTER.labels(status="rejected", language="vi").inc()
+    raise
   except Exception as exc:  # noqa: BLE001
     logger.exception("Utterance transcription failed")
     TRANSCRIPTION_COUNTER.labels(status="error", language="vi").inc()
@@ -325,69 +790,115 @@ async def transcribe_vi_utterance(req: UtteranceTranscriptionRequest):
 
 @app.post("/api/v1/transcribe-stream", response_model=StreamingTranscriptionResponse)
 async def transcribe_stream(req: StreamingAudioRequest):
+  """JSON/base64 compatibility shim cho /api/v1/transcribe-stream/binary."""
+  return await process_stream_chunk(
+    participant_id=req.participant_id,
+    audio_bytes=decode_base64_audio(req.audio_data),
+    sample_rate=req.sample_rate,
+    channels=req.channels,
+    audio_format=req.format,
+    language=req.language,
+  )
+
+
+@app.post("/api/v1/transcribe-stream/binary", response_model=StreamingTranscriptionResponse)
+async def transcribe_stream_binary(
+  request: Request,
+  x_participant_id: str = Header(..., description="Unique ID của participant"),
+  x_sample_rate: int = Header(48000, description="Sample rate (Hz)"),
+  x_channels: int = Header(1, description="Number of audio channels"),
+  x_audio_format: str = Header("pcm16", description="Audio format"),
+  x_language: Optional[str] = Header(None, description="Language code ('vi' or 'en')"),
+):
+  """
+  Binary ingestion: body = raw PCM16 little-endian (application/octet-stream),
+  metadata trong headers. Body được đọc thẳng vào numpy view, không base64/JSON.
+  """
+  return await process_stream_chunk(
+    participant_id=x_participant_id,
+    audio_bytes=await request.body(),
+    sample_rate=x_sample_rate,
+    channels=x_channels,
+    audio_format=x_audio_format,
+    language=x_language,
+  )
+
+
+async def process_stream_chunk(
+  participant_id: str,
+  audio_bytes: bytes,
+  sample_rate: int,
+  channels: int,
+  audio_format: str,
+  language: Optional[str],
+) -> StreamingTranscriptionResponse:
+  """Xử lý một chunk của streaming session (dùng chung cho JSON và binary endpoints)."""
   start_time = time.time()  # Track processing time for metrics
-  lang = get_language(req.language)
-  session = sessions.get(req.participant_id)
+  lang = get_language(language)
+  session = sessions.get(participant_id)
   if session is None:
-    session = StreamingSession(req.participant_id, lang)
-    sessions[req.participant_id] = session
+    session = StreamingSession(participant_id, lang)
+    sessions[participant_id] = session
 
   try:
-    audio_bytes = base64.b64decode(req.audio_data)
-    if req.format != "pcm16":
-      raise HTTPException(status_code=400, detail="Unsupported audio format")
-
-    audio_np = np.frombuffer(audio_bytes, dtype=np.int16)
-    processed_audio, next_overlap = audio_processor.process_for_sherpa(
-      audio_np,
-      sample_rate=req.sample_rate,
-      channels=req.channels,
-      previous_overlap=session.overlap,
-      overlap_ms=100,
-    )
-    session.overlap = next_overlap
+    audio_np = load_pcm16(audio_bytes, audio_format, channels)
     session.chunk_count += 1
+    session.last_activity = time.time()
 
     text = ""
     is_final = False
     model_used = VIETNAMESE_MODEL.name if lang == "vi" else ENGLISH_MODEL.name
 
-    # Vietnamese: use offline recognizer with adaptive buffer strategy
-    if lang == "vi":
-      # Utterance mode: mỗi request được coi như 1 câu độc lập (đã VAD từ client/gateway)
-      duration_sec = len(processed_audio) / 16000.0
-      if duration_sec < 0.35:
-        text = ""
-        is_final = True
+    if session.is_online:
+      # Online mode: state nằm trong OnlineStream → không cần overlap, không normalize từng chunk.
+      # Partial hypothesis trả về ngay, final khi endpoint detection kích hoạt.
+      # Fused preprocess vào scratch buffers; copy một lần vì samples được decode trên thread khác.
+      processed_audio = session.get_preprocessor(sample_rate).process(audio_np).copy()
+      model_used = STREAMING_MODELS[session.language].name
+      is_speech = session.vad is None or await session.vad.accept_async(processed_audio) > 0
+      if not is_speech and not session.in_utterance:
+        # Silence ngoài utterance → không vào queue; giữ chunk cuối làm pre-roll cho speech onset
+        VAD_AUDIO_SECONDS.labels(decision="skipped").inc(len(processed_audio) / 16000)
+        session.preroll = processed_audio
+        model_used = "vad-silence"
       else:
-        stream = offline_vi_recognizer.create_stream()
-        stream.accept_waveform(16000, processed_audio)
-        offline_vi_recognizer.decode_stream(stream)
-        result = stream.result
-        text = result.text
-        is_final = True
-        logger.info(
-          f"📝 [VI-OFFLINE] Streaming endpoint (utterance mode) participant={req.participant_id}, "
-          f"duration={duration_sec:.2f}s: '{text}'"
-        )
+        # Trong utterance vẫn feed silence để endpoint detection của recognizer kích hoạt
+        if session.preroll is not None:
+          processed_audio = np.concatenate((session.preroll, processed_audio))
+          session.preroll = None
+        session.in_utterance = True
+        VAD_AUDIO_SECONDS.labels(decision="inference").inc(len(processed_audio) / 16000)
+        set_inference_flow(participant_id, PRIORITY_STREAMING, len(processed_audio) / 16000)
+        text, is_final = await decode_online(session, processed_audio)
+        if is_final:
+          session.in_utterance = False
+        if is_final and text:
+          logger.info(
+            f"📝 [{session.language.upper()}-ONLINE] Endpoint participant={participant_id}: '{text}'"
+          )
     else:
-      # English: Sử dụng NeMo CTC Parakeet (Offline) - hỗ trợ punctuation & capitalization
-      # Gateway đã làm VAD → mỗi request là 1 utterance hoàn chỉnh
+      processed_audio, session.overlap = audio_processor.process_for_sherpa(
+        audio_np,
+        sample_rate=sample_rate,
+        channels=channels,
+        previous_overlap=session.overlap,
+        overlap_ms=100,
+        normalize=False,
+        resampler=session.get_preprocessor(sample_rate).resampler,
+      )
+      # VAD: cắt silence đầu/cuối, utterance không có speech thì bỏ qua decode
+      processed_audio = await trim_silence(session.vad, processed_audio)
+
+      # Utterance mode: mỗi request được coi như 1 câu độc lập (gateway VAD + VAD phía server ở trên).
+      # Vietnamese dùng Zipformer offline, English dùng NeMo Parakeet (punctuation & capitalization).
       duration_sec = len(processed_audio) / 16000.0
-      if duration_sec < 0.35:
-        text = ""
-        is_final = True
-      else:
-        # Dùng offline NeMo CTC recognizer (giống Vietnamese)
-        stream = offline_en_recognizer.create_stream()
-        stream.accept_waveform(16000, processed_audio)
-        offline_en_recognizer.decode_stream(stream)
-        result = stream.result
-        text = result.text if hasattr(result, "text") else str(result or "")
-        is_final = True
-        
+      is_final = True
+      if duration_sec >= 0.35:
+        set_inference_flow(participant_id, PRIORITY_STREAMING, duration_sec)
+        text = await decode_offline(lang, processed_audio)
+        tag = "VI-OFFLINE" if lang == "vi" else "EN-PARAKEET"
         logger.info(
-          f"📝 [EN-PARAKEET] participant={req.participant_id}, "
+          f"📝 [{tag}] participant={participant_id}, "
           f"duration={duration_sec:.2f}s: '{text}'"
         )
 
@@ -396,7 +907,7 @@ async def transcribe_stream(req: StreamingAudioRequest):
     TRANSCRIPTION_DURATION.observe(processing_time)
 
     return StreamingTranscriptionResponse(
-      participant_id=req.participant_id,
+      participant_id=participant_id,
       text=text or "",
       language=lang,
       confidence=1.0 if text else 0.0,
@@ -408,6 +919,9 @@ async def transcribe_stream(req: StreamingAudioRequest):
   except HTTPException:
     TRANSCRIPTION_COUNTER.labels(status="error", language=lang).inc()
     raise
+  except InferenceQueueFull:
+    TRANSCRIPTION_COUNTER.labels(status="rejected", language=lang).inc()
+    raise
   except Exception as exc:  # noqa: BLE001
     logger.exception("Streaming transcription failed")
     TRANSCRIPTION_COUNTER.labels(status="error", language=lang).inc()
@@ -4,6 +4,8 @@ Handles conversion, resampling, normalization, and overlap buffering.
 """
 
 import logging
+import math
+from functools import lru_cache
 from typing import Optional, Tuple
 
 import numpy as np
@@ -12,6 +14,258 @@ from scipy import signal
 logger = logging.getLogger(__name__)
 
 
+def resample_ratio(original_sample_rate: int, target_sample_rate: int) -> Tuple[int, int]:
+  """Tỉ lệ up/down tối giản, ví dụ 48000 → 16000 = (1, 3)."""
+  g = math.gcd(int(original_sample_rate), int(target_sample_rate))
+  return int(target_sample_rate) // g, int(original_sample_rate) // g
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up: int, down: int) -> np.ndarray:
+  """
+  FIR low-pass taps cho polyphase resampling (Kaiser, giống default của resample_poly).
+  Cache theo (up, down) → mỗi cặp sample rate chỉ thiết kế filter một lần.
+  """
+  max_rate = max(up, down)
+  half_len = 10 * max_rate
+  taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+  taps = taps.astype(np.float32)
+  taps.setflags(write=False)
+  return taps
+
+
+def resample_poly_cached(
+  audio: np.ndarray, original_sample_rate: int, target_sample_rate: int = 16000
+) -> np.ndarray:
+  """Resample cả clip bằng polyphase filter (zero-phase) với taps đã cache."""
+  if original_sample_rate == target_sample_rate:
+    return audio.astype(np.float32, copy=False)
+  up, down = resample_ratio(original_sample_rate, target_sample_rate)
+  resampled = signal.resample_poly(
+    audio.astype(np.float32, copy=False), up, down, window=polyphase_filter(up, down)
+  )
+  return resampled.astype(np.float32, copy=False)
+
+
+def pcm16_view(payload) -> np.ndarray:
+  """
+  Zero-copy view Int16 little-endian trên bytes/bytearray/memoryview của request body.
+  Raise ValueError nếu số byte lẻ.
+  """
+  if len(payload) % 2:
+    raise ValueError(f"PCM16 payload must have an even number of bytes (got {len(payload)})")
+  return np.frombuffer(payload, dtype="<i2")
+
+
+def peak_abs(audio: np.ndarray) -> float:
+  """max(|audio|) không cấp phát mảng tạm như np.abs(audio).max()."""
+  if audio.size == 0:
+    return 0.0
+  return max(float(audio.max()), -float(audio.min()))
+
+
+def normalize_peak(audio: np.ndarray, inplace: bool = False) -> np.ndarray:
+  """
+  Normalize về [-1, 1] theo peak bằng một lần multiply.
+  inplace=True và audio là Float32 ghi được → scale ngay trên audio (không cấp phát).
+  """
+  peak = peak_abs(audio)
+  scale = np.float32(1.0 / peak) if peak > 0 else np.float32(1.0)
+  if inplace and audio.dtype == np.float32 and audio.flags.writeable:
+    if peak > 0:
+      np.multiply(audio, scale, out=audio)
+    return audio
+  return np.multiply(audio, scale, dtype=np.float32)
+
+
+class ScratchBuffer:
+  """
+  Vùng nhớ Float32 tái sử dụng giữa các chunk của một session.
+  `get(n)` trả về view n sample đầu; chỉ cấp phát lại (x2, giữ dữ liệu cũ) khi thiếu.
+  """
+
+  def __init__(self, capacity: int = 0):
+    self._data = np.zeros(max(int(capacity), 0), dtype=np.float32)
+
+  @property
+  def nbytes(self) -> int:
+    return self._data.nbytes
+
+  def get(self, n: int) -> np.ndarray:
+    if n > len(self._data):
+      data = np.zeros(max(n, 2 * len(self._data)), dtype=np.float32)
+      data[:len(self._data)] = self._data
+      self._data = data
+    return self._data[:n]
+
+
+class StreamingResampler:
+  """
+  Polyphase resampler giữ filter state giữa các chunk của một streaming session.
+
+  Output nối liền các chunk giống hệt resample một lần cả stream (không có
+  discontinuity ở biên chunk), đổi lại trễ cố định ~half filter length
+  (10 sample @16kHz cho 48kHz → 16kHz).
+
+  Decimation nguyên (up == 1, vd. 48kHz/32kHz → 16kHz): FIR tính bằng một matmul trên
+  strided view của work buffer tái sử dụng → không cấp phát khi truyền `out`.
+  Tỉ lệ khác (44.1kHz, 8kHz, ...) dùng upfirdn.
+  """
+
+  def __init__(self, original_sample_rate: int, target_sample_rate: int = 16000):
+    self.original_sample_rate = original_sample_rate
+    self.target_sample_rate = target_sample_rate
+    self.up, self.down = resample_ratio(original_sample_rate, target_sample_rate)
+    self._history = np.zeros(0, dtype=np.float32)
+    if self.passthrough:
+      return
+    self._taps = polyphase_filter(self.up, self.down) * self.up
+    # Số input sample cần giữ lại để tính output đầu tiên của chunk kế tiếp
+    self._keep = -(-len(self._taps) // self.up) + 1
+    self._history_start = 0  # index (toàn stream) của history[0], luôn là bội số của down
+    self._samples_in = 0
+    self._samples_out = 0
+    if self.up == 1:
+      # work[0] ứng với sample (toàn stream) self._work_start; L-1 số 0 đầu = zero padding của FIR
+      self._taps_reversed = np.ascontiguousarray(self._taps[::-1])
+      self._work = ScratchBuffer()
+      self._work_len = len(self._taps) - 1
+      self._work_start = -self._work_len
+      self._work.get(self._work_len)
+
+  @property
+  def passthrough(self) -> bool:
+    return self.up == self.down
+
+  @property
+  def nbytes(self) -> int:
+    if self.up == 1 and not self.passthrough:
+      return self._work.nbytes
+    return self._history.nbytes
+
+  def output_length(self, n: int) -> int:
+    """Số output sample tối đa khi đưa thêm n input sample."""
+    return (self._samples_in + n) * self.up // self.down + 1 - self._samples_out
+
+  def process(self, chunk: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Resample chunk tiếp theo của stream.
+    `out`: buffer Float32 đủ `output_length(len(chunk))` sample; kết quả là view đầu của `out`.
+    """
+    chunk = np.asarray(chunk, dtype=np.float32)
+    if self.passthrough or len(chunk) == 0:
+      return chunk
+    if self.up == 1:
+      return self._decimate(chunk, out)
+
+    buffer = np.concatenate([self._history, chunk]) if len(self._history) else chunk
+    offset = self._history_start * self.up // self.down
+    self._samples_in += len(chunk)
+    last_out = (self._samples_in - 1) * self.up // self.down
+
+    filtered = signal.upfirdn(self._taps, buffer, self.up, self.down)
+    resampled = filtered[self._samples_out - offset:last_out - offset + 1]
+    self._samples_out = last_out + 1
+
+    new_start = max(0, (self._samples_in - self._keep) // self.down * self.down)
+    self._history = buffer[new_start - self._history_start:].copy()
+    self._history_start = new_start
+    if out is not None:
+      result = out[:len(resampled)]
+      result[:] = resampled
+      return result
+    return resampled.astype(np.float32, copy=False)
+
+  def _decimate(self, chunk: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    taps_len = len(self._taps_reversed)
+    self._samples_in += len(chunk)
+    count = (self._samples_in - 1) // self.down + 1 - self._samples_out
+
+    total = self._work_len + len(chunk)
+    work = self._work.get(total)
+    work[self._work_len:] = chunk
+
+    result = np.empty(count, dtype=np.float32) if out is None else out[:count]
+    if count > 0:
+      # Hàng m = cửa sổ taps_len input kết thúc tại sample (samples_out + m) * down
+      first = self._samples_out * self.down - (taps_len - 1) - self._work_start
+      itemsize = work.itemsize
+      windows = np.ndarray(
+        (count, taps_len), dtype=np.float32, buffer=work,
+        offset=first * itemsize, strides=(self.down * itemsize, itemsize),
+      )
+      np.matmul(windows, self._taps_reversed, out=result)
+      self._samples_out += count
+
+    # Giữ lại input cần cho output kế tiếp, dời về đầu work buffer
+    keep_from = self._samples_out * self.down - (taps_len - 1) - self._work_start
+    self._work_len = total - keep_from
+    work[:self._work_len] = work[keep_from:total]
+    self._work_start += keep_from
+    return result
+
+
+class ChunkPreprocessor:
+  """
+  Pipeline fused cho streaming chunk của một session: PCM → Float32 mono → resample 16kHz.
+
+  - Int16 → Float32 bằng `np.copyto(scratch, ...)` (cast thẳng vào scratch; ufunc với input
+    Int16 sẽ cấp phát buffer cast tạm).
+  - Mono: peak tính trên Int16 gốc, hệ số 1/32768 (hoặc 1/peak khi normalize) gộp vào
+    một lần scale in-place.
+  - Multi-channel: cộng dồn các channel (Float32 + Float32) vào scratch rồi scale in-place.
+  - Resample ghi vào scratch output của session (StreamingResampler `out=`).
+
+  Kết quả là view trên scratch buffer, bị ghi đè ở lần `process` tiếp theo
+  → caller phải dùng/copy (vd. append vào ring buffer) trước khi xử lý chunk mới.
+  """
+
+  def __init__(self, original_sample_rate: int, target_sample_rate: int = 16000):
+    self.original_sample_rate = original_sample_rate
+    self.target_sample_rate = target_sample_rate
+    self.resampler = StreamingResampler(original_sample_rate, target_sample_rate)
+    self._mono = ScratchBuffer()
+    self._channel = ScratchBuffer()
+    self._resampled = ScratchBuffer()
+    self.peak = 0.0  # peak (Float32 scale) của chunk gần nhất, trước resample
+
+  @property
+  def nbytes(self) -> int:
+    return self.resampler.nbytes + self._mono.nbytes + self._channel.nbytes + self._resampled.nbytes
+
+  def process(self, audio: np.ndarray, normalize: bool = False) -> np.ndarray:
+    """
+    audio: Int16 hoặc Float, shape (n,) hoặc (n, channels) interleaved.
+    normalize=True: scale chunk về peak 1.0 (peak đo trước resample).
+    """
+    full_scale = 32768.0 if audio.dtype == np.int16 else 1.0
+    frames = len(audio)
+    mono = self._mono.get(frames)
+
+    if audio.ndim == 1:
+      peak = peak_abs(audio)
+      self.peak = peak / full_scale
+      scale = 1.0 / peak if normalize and peak > 0 else 1.0 / full_scale
+      np.copyto(mono, audio, casting="unsafe")
+    else:
+      channels = audio.shape[1]
+      np.copyto(mono, audio[:, 0], casting="unsafe")
+      if channels > 1:
+        scratch = self._channel.get(frames)
+        for channel in range(1, channels):
+          np.copyto(scratch, audio[:, channel], casting="unsafe")
+          np.add(mono, scratch, out=mono)
+      peak = peak_abs(mono) / channels
+      self.peak = peak / full_scale
+      scale = 1.0 / (peak * channels) if normalize and peak > 0 else 1.0 / (full_scale * channels)
+    np.multiply(mono, np.float32(scale), out=mono)
+
+    if self.resampler.passthrough:
+      return mono
+    out = self._resampled.get(self.resampler.output_length(frames))
+    return self.resampler.process(mono, out=out)
+
+
 class AudioProcessor:
   """Audio processor cho Sherpa-ONNX (16kHz, mono, Float32)."""
 
@@ -21,19 +275,25 @@ class AudioProcessor:
   def convert_int16_to_float32(self, audio: np.ndarray) -> np.ndarray:
     """Convert Int16 PCM [-32768, 32767] → Float32 [-1.0, 1.0]."""
     if audio.dtype == np.int16:
-      audio = audio.astype(np.float32) / 32768.0
+      # Convert + scale trong một pass (không tạo mảng trung gian)
+      audio = np.multiply(audio, np.float32(1.0 / 32768.0), dtype=np.float32)
     elif audio.dtype == np.float64:
       audio = audio.astype(np.float32)
     return audio
 
-  def resample(self, audio: np.ndarray, original_sample_rate: int) -> np.ndarray:
-    """Resample audio to target sample rate."""
+  def resample(
+    self,
+    audio: np.ndarray,
+    original_sample_rate: int,
+    resampler: Optional[StreamingResampler] = None,
+  ) -> np.ndarray:
+    """Resample audio to target sample rate (polyphase; dùng `resampler` để giữ state giữa chunk)."""
     if original_sample_rate == self.target_sample_rate:
-      return audio.astype(np.float32)
+      return audio.astype(np.float32, copy=False)
 
-    num_samples = int(len(audio) * self.target_sample_rate / original_sample_rate)
-    resampled = signal.resample(audio, num_samples)
-    return resampled.astype(np.float32)
+    if resampler is not None:
+      return resampler.process(audio)
+    return resample_poly_cached(audio, original_sample_rate, self.target_sample_rate)
 
   def stereo_to_mono(self, audio: np.ndarray) -> np.ndarray:
     """Convert stereo to mono bằng cách average 2 channels."""
@@ -41,17 +301,14 @@ class AudioProcessor:
       return audio
     if len(audio.shape) == 2:
       if audio.shape[1] == 2:
-        return audio.mean(axis=1).astype(np.float32)
+        return audio.mean(axis=1, dtype=np.float32)
       if audio.shape[0] == 2:
-        return audio.mean(axis=0).astype(np.float32)
+        return audio.mean(axis=0, dtype=np.float32)
     return audio
 
   def normalize(self, audio: np.ndarray) -> np.ndarray:
     """Normalize audio to [-1.0, 1.0] range."""
-    max_val = np.abs(audio).max()
-    if max_val > 0:
-      return (audio / max_val).astype(np.float32)
-    return audio.astype(np.float32)
+    return normalize_peak(audio)
 
   def add_overlap_buffer(
     self,
@@ -78,20 +335,27 @@ class AudioProcessor:
     channels: int = 1,
     previous_overlap: Optional[np.ndarray] = None,
     overlap_ms: int = 100,
+    normalize: bool = True,
+    resampler: Optional[StreamingResampler] = None,
   ) -> Tuple[np.ndarray, np.ndarray]:
     """
     Complete preprocessing pipeline cho Sherpa-ONNX.
     Returns processed_audio (Float32 @ 16kHz) và next_overlap buffer.
+    normalize=False giữ nguyên gain giữa các chunk (cần cho OnlineRecognizer).
+    resampler: StreamingResampler của session để chunk boundaries liền mạch.
     """
+    original = audio
     audio = self.convert_int16_to_float32(audio)
 
     if channels == 2 or len(audio.shape) > 1:
       audio = self.stereo_to_mono(audio)
 
     if sample_rate != self.target_sample_rate:
-      audio = self.resample(audio, sample_rate)
+      audio = self.resample(audio, sample_rate, resampler=resampler)
 
-    audio = self.normalize(audio)
+    if normalize:
+      # Mảng trung gian do pipeline tạo ra → normalize in-place, không cấp phát thêm
+      audio = normalize_peak(audio, inplace=audio is not original)
 
     processed_audio, next_overlap = self.add_overlap_buffer(
       audio, previous_overlap, overlap_ms
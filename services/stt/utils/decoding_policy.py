@@ -0,0 +1,243 @@
+"""
+Decoding policy theo latency budget cho faster-whisper runtime.
+
+Request/session khai báo budget ("interactive" = 300ms, "batch" = không giới hạn, hoặc số ms);
+policy chọn bước chất lượng cao nhất trên ladder (beam size, số bước temperature fallback,
+word timestamps, condition_on_previous_text) mà latency dự đoán vẫn nằm trong budget.
+Latency dự đoán (worst case) = thời gian chờ queue dự kiến + ước lượng RTF inference (EWMA theo
+model + bước, học từ thời gian inference thật, không gồm queue wait) x độ dài audio x số bước
+temperature (mỗi fallback là một lần decode lại) → budget giới hạn cả tail latency, không chỉ trung bình.
+
+Tải (queue wait) là tín hiệu riêng, học từ mọi lần decode bất kể profile → hết tải thì tự hạ xuống.
+Ước lượng RTF của bước cao hơn lâu không được chọn là ước lượng cũ: định kỳ chọn thử (probe) bước đó
+một lần, số đo của lần probe thay hẳn ước lượng cũ → chất lượng tự phục hồi sau đợt quá tải.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+DECODING_PROFILE_COUNTER = Counter(
+  "stt_decoding_profile_total",
+  "Decodes by latency budget class and chosen decoding profile",
+  ["budget", "profile"],
+)
+DECODING_PROBE_COUNTER = Counter(
+  "stt_decoding_probes_total",
+  "Decodes that re-tried a higher-quality profile whose latency estimate had gone stale",
+  ["profile"],
+)
+DECODING_LATENCY_HISTOGRAM = Histogram(
+  "stt_decoding_seconds",
+  "Decode latency (queue wait + inference) by decoding profile",
+  ["profile"],
+  buckets=[0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+)
+BUDGET_MISS_COUNTER = Counter(
+  "stt_decoding_budget_misses_total",
+  "Decodes that exceeded their latency budget",
+  ["budget", "profile"],
+)
+
+NAMED_BUDGETS_MS = {
+  "interactive": 300.0,
+  "realtime": 1000.0,
+  "batch": None,
+}
+
+
+def parse_budget(value: Union[str, float, int, None]) -> Optional[float]:
+  """"interactive" / "realtime" / "batch" / số ms → budget ms (None = không giới hạn)."""
+  if value is None:
+    return None
+  if isinstance(value, (int, float)):
+    return float(value) if value > 0 else None
+  value = value.strip().lower()
+  if value in NAMED_BUDGETS_MS:
+    return NAMED_BUDGETS_MS[value]
+  try:
+    budget = float(value.removesuffix("ms"))
+  except ValueError:
+    raise ValueError(f"Invalid latency budget: {value!r} (use interactive, realtime, batch or milliseconds)")
+  return budget if budget > 0 else None
+
+
+def budget_label(budget_ms: Optional[float]) -> str:
+  """Label metrics ít cardinality: tên budget chuẩn, còn lại "custom"."""
+  for name, value in NAMED_BUDGETS_MS.items():
+    if value == budget_ms:
+      return name
+  return "custom"
+
+
+@dataclass(frozen=True)
+class DecodingSettings:
+  """Tham số decode đã chọn cho một request."""
+  profile: str
+  beam_size: int
+  temperature: Tuple[float, ...]
+  word_timestamps: bool
+  condition_on_previous_text: bool
+
+  def to_dict(self) -> dict:
+    return {
+      "profile": self.profile,
+      "beam_size": self.beam_size,
+      "temperature_fallbacks": len(self.temperature) - 1,
+      "word_timestamps": self.word_timestamps,
+      "condition_on_previous_text": self.condition_on_previous_text,
+    }
+
+
+@dataclass(frozen=True)
+class DecodingStep:
+  """Một bước trên ladder; beam_size=None → dùng beam_size của request."""
+  profile: str
+  beam_size: Optional[int]
+  temperature: Tuple[float, ...]
+  word_timestamps: bool
+  condition_on_previous_text: bool
+  initial_rtf: float
+
+
+# Chất lượng giảm dần; initial_rtf = ước lượng ban đầu (small INT8, 4 threads) trước khi học được từ thực tế
+DEFAULT_LADDER = (
+  DecodingStep("max-quality", None, (0.0, 0.2, 0.4, 0.6, 0.8, 1.0), True, True, 0.25),
+  DecodingStep("balanced", 3, (0.0, 0.4, 0.8), True, True, 0.15),
+  DecodingStep("fast", 1, (0.0, 0.6), True, False, 0.08),
+  DecodingStep("greedy", 1, (0.0,), False, False, 0.05),
+)
+
+
+class DecodingPolicy:
+  """
+  - `choose(budget_ms, audio_seconds, ...)`: bước đầu tiên trên ladder vừa budget
+    (không bước nào vừa → bước nhanh nhất); bước ngay trên bước đó có ước lượng cũ hơn
+    `stale_after` giây → probe bước đó.
+  - `observe(...)`: cập nhật EWMA RTF (từ `inference_seconds`), EWMA queue wait + metrics.
+  - `record_latency(...)`: chỉ metrics (latency theo profile, budget misses), không học.
+  """
+
+  def __init__(
+    self,
+    ladder=DEFAULT_LADDER,
+    overhead_ms: float = 30.0,
+    smoothing: float = 0.2,
+    stale_after: float = 30.0,
+    clock: Callable[[], float] = time.monotonic,
+  ):
+    self.ladder = ladder
+    self.overhead_ms = overhead_ms
+    self.smoothing = smoothing
+    self.stale_after = stale_after
+    self.clock = clock
+    self._rtf: Dict[Tuple[str, str], float] = {}
+    self._updated: Dict[Tuple[str, str], float] = {}  # Lần cuối RTF được đo
+    self._probes: Dict[Tuple[str, str], float] = {}  # Probe đang chạy (chờ observe)
+    self._queue_wait_ms: Dict[str, float] = {}
+
+  def estimate_ms(self, model: str, step: DecodingStep, audio_seconds: float) -> float:
+    """Latency worst case: mọi temperature fallback đều chạy."""
+    rtf = self._rtf.get((model, step.profile), step.initial_rtf)
+    return self.overhead_ms + rtf * audio_seconds * 1000 * len(step.temperature)
+
+  def queue_wait_ms(self, model: str) -> float:
+    return self._queue_wait_ms.get(model, 0.0)
+
+  def _is_stale(self, key: Tuple[str, str], now: float) -> bool:
+    if key not in self._updated or now - self._updated[key] < self.stale_after:
+      return False  # Chưa đo lần nào → vẫn dùng initial_rtf, không cần probe
+    return now - self._probes.get(key, float("-inf")) >= self.stale_after
+
+  def choose(
+    self,
+    budget_ms: Optional[float],
+    audio_seconds: float,
+    model: str = "default",
+    beam_size: int = 5,
+    word_timestamps: bool = True,
+    require_word_timestamps: bool = False,
+  ) -> DecodingSettings:
+    """
+    beam_size / word_timestamps: giá trị request yêu cầu (trần chất lượng);
+    require_word_timestamps: caller cần word timestamps bất kể budget (streaming LocalAgreement).
+    """
+    chosen = self.ladder[-1]
+    queue_wait_ms = self.queue_wait_ms(model)
+    for step in self.ladder:
+      if budget_ms is None or queue_wait_ms + self.estimate_ms(model, step, audio_seconds) <= budget_ms:
+        chosen = step
+        break
+
+    index = self.ladder.index(chosen)
+    if budget_ms is not None and index > 0 and queue_wait_ms < budget_ms:
+      # Đang quá tải (queue wait đã vượt budget) thì probe cũng không vừa → chờ hết tải
+      higher = self.ladder[index - 1]
+      key = (model, higher.profile)
+      now = self.clock()
+      if self._is_stale(key, now):
+        self._probes[key] = now
+        chosen = higher
+        DECODING_PROBE_COUNTER.labels(profile=higher.profile).inc()
+
+    settings = DecodingSettings(
+      profile=chosen.profile,
+      beam_size=min(chosen.beam_size or beam_size, beam_size),
+      temperature=chosen.temperature,
+      word_timestamps=require_word_timestamps or (word_timestamps and chosen.word_timestamps),
+      condition_on_previous_text=chosen.condition_on_previous_text,
+    )
+    DECODING_PROFILE_COUNTER.labels(budget=budget_label(budget_ms), profile=settings.profile).inc()
+    return settings
+
+  def record_latency(self, settings: DecodingSettings, budget_ms: Optional[float], elapsed_seconds: float):
+    DECODING_LATENCY_HISTOGRAM.labels(profile=settings.profile).observe(elapsed_seconds)
+    if budget_ms is not None and elapsed_seconds * 1000 > budget_ms:
+      BUDGET_MISS_COUNTER.labels(budget=budget_label(budget_ms), profile=settings.profile).inc()
+
+  def observe(
+    self,
+    settings: DecodingSettings,
+    budget_ms: Optional[float],
+    audio_seconds: float,
+    elapsed_seconds: float,
+    model: str = "default",
+    inference_seconds: Optional[float] = None,
+  ):
+    """
+    elapsed_seconds: queue wait + inference (latency caller thấy);
+    inference_seconds: riêng phần inference (None → không có queue wait).
+    """
+    self.record_latency(settings, budget_ms, elapsed_seconds)
+    if inference_seconds is None:
+      inference_seconds = elapsed_seconds
+
+    queue_wait_ms = max(elapsed_seconds - inference_seconds, 0.0) * 1000
+    previous_wait = self._queue_wait_ms.get(model, 0.0)
+    self._queue_wait_ms[model] = previous_wait + self.smoothing * (queue_wait_ms - previous_wait)
+
+    if audio_seconds <= 0:
+      return
+    key = (model, settings.profile)
+    step = next((s for s in self.ladder if s.profile == settings.profile), None)
+    rtf = max(inference_seconds * 1000 - self.overhead_ms, 0.0) / (audio_seconds * 1000)
+    if self._probes.pop(key, None) is not None:
+      self._rtf[key] = rtf  # Probe: số đo mới thay ước lượng cũ
+    else:
+      previous = self._rtf.get(key, step.initial_rtf if step else rtf)
+      self._rtf[key] = previous + self.smoothing * (rtf - previous)
+    self._updated[key] = self.clock()
+
+  def snapshot(self) -> dict:
+    """RTF đã học theo model/profile (cho /models, debug)."""
+    return {f"{model}/{profile}": round(rtf, 4) for (model, profile), rtf in self._rtf.items()}
+
+  def queue_wait_snapshot(self) -> dict:
+    """Queue wait dự kiến (ms) theo model."""
+    return {model: round(wait, 1) for model, wait in self._queue_wait_ms.items()}
@@ -0,0 +1,263 @@
+"""
+Fair-queuing scheduler cho inference slots.
+
+Thay thế FIFO của thread pool: mỗi participant (flow) có queue riêng, dispatch theo
+deficit round-robin (cost = giây audio) → người nói liên tục hay upload dài không chiếm hết
+worker của những người nói ít. Giữa các priority class (streaming / batch) chia slot theo
+trọng số (weighted fair queuing) → streaming được ưu tiên nhưng upload không bị bỏ đói.
+
+Flow của request hiện tại nằm trong contextvar (`set_inference_flow`), endpoint set một lần;
+`InferenceExecutor.run` đọc lại khi xin slot.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+SCHEDULER_WAIT_HISTOGRAM = Histogram(
+  "stt_scheduler_queue_wait_seconds",
+  "Time a decode job waited in the fair scheduler before getting an inference slot",
+  ["executor", "priority"],
+  buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0],
+)
+SCHEDULER_QUEUED_GAUGE = Gauge(
+  "stt_scheduler_queued_jobs",
+  "Decode jobs waiting in the fair scheduler",
+  ["executor", "priority"],
+)
+SCHEDULER_FLOWS_GAUGE = Gauge(
+  "stt_scheduler_active_flows",
+  "Participants (flows) with jobs waiting in the fair scheduler",
+  ["executor", "priority"],
+)
+
+PRIORITY_STREAMING = "streaming"
+PRIORITY_BATCH = "batch"
+PRIORITIES = (PRIORITY_STREAMING, PRIORITY_BATCH)  # Ưu tiên giảm dần
+
+DEFAULT_CLASS_WEIGHTS = {PRIORITY_STREAMING: 8.0, PRIORITY_BATCH: 1.0}
+
+
+@dataclass(frozen=True)
+class InferenceFlow:
+  """Flow (participant/client) + priority class + cost ước lượng của mỗi job (giây audio)."""
+  flow: str = "anonymous"
+  priority: str = PRIORITY_BATCH
+  cost: float = 1.0
+
+
+_current_flow: ContextVar[InferenceFlow] = ContextVar("stt_inference_flow", default=InferenceFlow())
+
+
+def set_inference_flow(flow: str, priority: str = PRIORITY_BATCH, cost: float = 1.0) -> InferenceFlow:
+  """
+  Gắn flow cho các job inference của task hiện tại (mỗi request chạy trong task riêng
+  → không cần reset); gọi lại để đổi cost khi biết độ dài audio.
+  """
+  value = InferenceFlow(flow or "anonymous", priority if priority in PRIORITIES else PRIORITY_BATCH, max(cost, 0.01))
+  _current_flow.set(value)
+  return value
+
+
+def current_inference_flow() -> InferenceFlow:
+  return _current_flow.get()
+
+
+def parse_class_weights(value: Optional[str]) -> Optional[Dict[str, float]]:
+  """
+  "streaming=8,batch=1" → {"streaming": 8.0, "batch": 1.0}; "" / "off" → None (FIFO).
+  Class không khai báo dùng trọng số mặc định.
+  """
+  if value is None or value.strip().lower() in ("", "off", "none", "fifo"):
+    return None
+  weights = dict(DEFAULT_CLASS_WEIGHTS)
+  for item in value.split(","):
+    name, _, weight = item.partition("=")
+    name = name.strip()
+    if name not in PRIORITIES:
+      raise ValueError(f"Unknown priority class: {name!r} (expected one of {', '.join(PRIORITIES)})")
+    weights[name] = max(float(weight), 0.01)
+  return weights
+
+
+class _Job:
+  __slots__ = ("future", "cost", "enqueued", "queued")
+
+  def __init__(self, future: asyncio.Future, cost: float):
+    self.future = future
+    self.cost = cost
+    self.enqueued = time.perf_counter()
+    self.queued = True
+
+
+class _Flow:
+  __slots__ = ("key", "queue", "deficit", "credited")
+
+  def __init__(self, key: str):
+    self.key = key
+    self.queue: Deque[_Job] = deque()
+    self.deficit = 0.0
+    self.credited = False  # Đã nhận quantum ở lượt hiện tại
+
+
+class _PriorityClass:
+  """Deficit round-robin giữa các flow cùng priority."""
+
+  def __init__(self, name: str, weight: float, quantum: float):
+    self.name = name
+    self.weight = weight
+    self.quantum = quantum
+    self.flows: Dict[str, _Flow] = {}
+    self.active: Deque[_Flow] = deque()
+    self.size = 0
+    self.vtime = 0.0  # Virtual time của class (weighted fair queuing giữa các class)
+
+  def push(self, key: str, job: _Job):
+    flow = self.flows.get(key)
+    if flow is None:
+      flow = self.flows[key] = _Flow(key)
+    if not flow.queue:
+      self.active.append(flow)
+    flow.queue.append(job)
+    self.size += 1
+
+  def remove(self, key: str, job: _Job):
+    """Job bị huỷ (client ngắt kết nối) trước khi được dispatch."""
+    flow = self.flows[key]
+    flow.queue.remove(job)
+    job.queued = False
+    self.size -= 1
+    if not flow.queue:
+      self._deactivate(flow)
+
+  def _deactivate(self, flow: _Flow):
+    self.active.remove(flow)
+    del self.flows[flow.key]
+
+  def pop(self) -> _Job:
+    """Job kế tiếp theo DRR: flow đầu vòng nhận quantum, đủ deficit thì phục vụ, không thì nhường lượt."""
+    while True:
+      flow = self.active[0]
+      if not flow.credited:
+        flow.deficit += self.quantum
+        flow.credited = True
+      job = flow.queue[0]
+      if flow.deficit >= job.cost or len(self.active) == 1:
+        flow.queue.popleft()
+        job.queued = False
+        flow.deficit = max(flow.deficit - job.cost, 0.0)
+        self.size -= 1
+        if not flow.queue:
+          # Flow hết job thì bỏ deficit còn dư (DRR chuẩn) → không tích luỹ khi im lặng
+          self._deactivate(flow)
+        return job
+      flow.credited = False
+      self.active.rotate(-1)
+
+
+class FairScheduler:
+  """
+  Giới hạn `slots` job chạy đồng thời (= số worker của executor).
+
+  - `acquire(flow)`: chờ tới lượt; job được chọn theo class (trọng số `class_weights`)
+    rồi theo participant trong class (DRR, quantum = `quantum` giây audio).
+  - `release()`: trả slot khi job chạy xong (kể cả khi caller đã bỏ cuộc).
+  """
+
+  def __init__(
+    self,
+    name: str,
+    slots: int,
+    class_weights: Optional[Dict[str, float]] = None,
+    quantum: float = 1.0,
+  ):
+    self.name = name
+    self.slots = max(slots, 1)
+    weights = class_weights or DEFAULT_CLASS_WEIGHTS
+    self.classes: Dict[str, _PriorityClass] = {
+      priority: _PriorityClass(priority, weights.get(priority, DEFAULT_CLASS_WEIGHTS[priority]), quantum)
+      for priority in PRIORITIES
+    }
+    self._running = 0
+    self._vtime = 0.0
+    for priority in PRIORITIES:
+      SCHEDULER_QUEUED_GAUGE.labels(executor=name, priority=priority).set(0)
+      SCHEDULER_FLOWS_GAUGE.labels(executor=name, priority=priority).set(0)
+    logger.info(
+      "Fair scheduler '%s': slots=%d, weights=%s, quantum=%.2fs",
+      name, self.slots, {p: c.weight for p, c in self.classes.items()}, quantum,
+    )
+
+  @property
+  def queued(self) -> int:
+    return sum(cls.size for cls in self.classes.values())
+
+  def _update_gauges(self, cls: _PriorityClass):
+    SCHEDULER_QUEUED_GAUGE.labels(executor=self.name, priority=cls.name).set(cls.size)
+    SCHEDULER_FLOWS_GAUGE.labels(executor=self.name, priority=cls.name).set(len(cls.active))
+
+  async def acquire(self, flow: InferenceFlow):
+    cls = self.classes[flow.priority]
+    if cls.size == 0:
+      # Class vừa active lại: không được dùng "credit" tích từ lúc nhàn rỗi
+      cls.vtime = max(cls.vtime, self._vtime)
+    job = _Job(asyncio.get_running_loop().create_future(), flow.cost)
+    cls.push(flow.flow, job)
+    self._update_gauges(cls)
+    self._dispatch()
+
+    try:
+      await job.future
+    except asyncio.CancelledError:
+      if not job.future.cancelled():
+        # Slot đã được cấp ngay lúc bị huỷ → trả lại
+        self.release()
+      elif job.queued:
+        cls.remove(flow.flow, job)
+        self._update_gauges(cls)
+      raise
+
+  def release(self):
+    self._running = max(self._running - 1, 0)
+    self._dispatch()
+
+  def _dispatch(self):
+    while self._running < self.slots:
+      candidates: List[_PriorityClass] = [cls for cls in self.classes.values() if cls.size]
+      if not candidates:
+        return
+      # Finish tag nhỏ nhất: job lớn của class trọng số thấp phải chờ class kia dùng đủ phần của nó
+      cls = min(candidates, key=lambda c: (c.vtime + c.active[0].queue[0].cost / c.weight, PRIORITIES.index(c.name)))
+      job = cls.pop()
+      if job.future.done():
+        # Caller đã huỷ (future cancelled) nhưng chưa kịp tự rút khỏi queue
+        self._update_gauges(cls)
+        continue
+      self._vtime = cls.vtime
+      cls.vtime += job.cost / cls.weight
+      self._update_gauges(cls)
+      SCHEDULER_WAIT_HISTOGRAM.labels(executor=self.name, priority=cls.name).observe(
+        time.perf_counter() - job.enqueued
+      )
+      self._running += 1
+      job.future.set_result(None)
+
+  def snapshot(self) -> dict:
+    """Trạng thái queue theo class (cho /health, debug)."""
+    return {
+      "running": self._running,
+      "slots": self.slots,
+      "classes": {
+        name: {"weight": cls.weight, "queued": cls.size, "flows": len(cls.active)}
+        for name, cls in self.classes.items()
+      },
+    }
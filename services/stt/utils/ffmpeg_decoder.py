@@ -0,0 +1,167 @@
+"""
+Async ffmpeg decoder cho audio nén (MP3, Opus, M4A, ...).
+Stream bytes vào ffmpeg qua stdin, đọc PCM Float32 16kHz mono từ stdout thẳng vào numpy
+(không ghi temp file, không chặn event loop).
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import List, Optional
+
+import numpy as np
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+DECODE_HISTOGRAM = Histogram(
+  "stt_ffmpeg_decode_seconds",
+  "Time spent decoding compressed audio with ffmpeg",
+  ["path"],
+  buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0],
+)
+
+
+class AudioDecodeError(Exception):
+  """ffmpeg không decode được audio (format không hỗ trợ, file hỏng, thiếu ffmpeg)."""
+
+
+class FFmpegDecoder:
+  """
+  Pool ffmpeg process "warm" + giới hạn số decode đồng thời.
+
+  Mỗi process ffmpeg chỉ decode được một input, nên pool giữ sẵn `pool_size` process đã
+  spawn và đang chờ stdin; mỗi lần decode lấy một process ra và spawn bù ở background
+  → request không phải chờ fork/exec.
+
+  Format cần seek (vd. M4A có moov atom ở cuối) không decode được từ pipe → fallback
+  ghi một temp file input, output vẫn đọc từ stdout.
+  """
+
+  def __init__(
+    self,
+    pool_size: int = 2,
+    max_concurrency: int = 4,
+    sample_rate: int = 16000,
+    timeout: float = 120.0,
+    ffmpeg_bin: str = "ffmpeg",
+  ):
+    self.pool_size = max(pool_size, 0)
+    self.sample_rate = sample_rate
+    self.timeout = timeout
+    self.ffmpeg_bin = ffmpeg_bin
+    self._semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+    self._warm: List[asyncio.subprocess.Process] = []
+    self._refills: set = set()
+    self._available = True
+
+  def _command(self, input_path: str) -> List[str]:
+    return [
+      self.ffmpeg_bin, "-hide_banner", "-loglevel", "error",
+      "-i", input_path,
+      "-vn", "-ac", "1", "-ar", str(self.sample_rate),
+      "-f", "f32le", "pipe:1",
+    ]
+
+  async def _spawn(self, input_path: str = "pipe:0") -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+      *self._command(input_path),
+      stdin=asyncio.subprocess.PIPE if input_path == "pipe:0" else asyncio.subprocess.DEVNULL,
+      stdout=asyncio.subprocess.PIPE,
+      stderr=asyncio.subprocess.PIPE,
+    )
+
+  async def start(self):
+    """Spawn các process warm (gọi lúc startup)."""
+    try:
+      while len(self._warm) < self.pool_size:
+        self._warm.append(await self._spawn())
+    except FileNotFoundError:
+      self._available = False
+      logger.warning("⚠️ ffmpeg not found, compressed audio decoding disabled")
+      return
+    logger.info("ffmpeg decoder: %d warm processes", len(self._warm))
+
+  def _refill(self):
+    async def refill():
+      try:
+        self._warm.append(await self._spawn())
+      except Exception:  # noqa: BLE001
+        logger.exception("Failed to spawn warm ffmpeg process")
+
+    task = asyncio.get_running_loop().create_task(refill())
+    self._refills.add(task)
+    task.add_done_callback(self._refills.discard)
+
+  async def _acquire(self) -> asyncio.subprocess.Process:
+    while self._warm:
+      process = self._warm.pop()
+      self._refill()
+      if process.returncode is None:
+        return process
+    return await self._spawn()
+
+  async def _run(self, process: asyncio.subprocess.Process, data: Optional[bytes]) -> np.ndarray:
+    try:
+      stdout, stderr = await asyncio.wait_for(process.communicate(data), self.timeout)
+    except BaseException:
+      # Timeout / client ngắt kết nối → không để lại process mồ côi
+      await self._terminate(process)
+      raise
+    if process.returncode != 0 or not stdout:
+      raise AudioDecodeError(stderr.decode(errors="replace").strip() or "ffmpeg produced no audio")
+    # Float32 little-endian từ stdout → numpy không copy
+    return np.frombuffer(stdout, dtype="<f4")
+
+  @staticmethod
+  async def _terminate(process: asyncio.subprocess.Process):
+    if process.returncode is None:
+      try:
+        process.kill()
+      except ProcessLookupError:
+        pass
+      await process.wait()
+
+  async def _decode_via_tempfile(self, data: bytes) -> np.ndarray:
+    fd, input_path = tempfile.mkstemp(suffix=".input")
+    try:
+      with os.fdopen(fd, "wb") as f:
+        await asyncio.to_thread(f.write, data)
+      return await self._run(await self._spawn(input_path), None)
+    finally:
+      os.remove(input_path)
+
+  async def decode(self, data: bytes) -> np.ndarray:
+    """
+    Decode audio nén thành Float32 mono @ `sample_rate`.
+
+    Raises:
+      AudioDecodeError: ffmpeg không decode được (cả qua pipe lẫn temp file)
+    """
+    if not self._available:
+      raise AudioDecodeError("ffmpeg is not installed")
+
+    async with self._semaphore:
+      started = time.perf_counter()
+      try:
+        audio = await self._run(await self._acquire(), data)
+        DECODE_HISTOGRAM.labels(path="pipe").observe(time.perf_counter() - started)
+        return audio
+      except AudioDecodeError as pipe_error:
+        logger.info("ffmpeg pipe decode failed (%s), retrying with seekable temp file", pipe_error)
+
+      started = time.perf_counter()
+      audio = await self._decode_via_tempfile(data)
+      DECODE_HISTOGRAM.labels(path="tempfile").observe(time.perf_counter() - started)
+      return audio
+
+  async def close(self):
+    """Kill các process warm (gọi khi shutdown)."""
+    for task in list(self._refills):
+      task.cancel()
+    for process in self._warm:
+      await self._terminate(process)
+    self._warm.clear()
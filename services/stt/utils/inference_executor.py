@@ -0,0 +1,165 @@
+"""
+Bounded inference executor.
+Chạy decode (blocking, nhả GIL) trên thread pool riêng để không chặn asyncio event loop,
+giới hạn số utterance đang chờ và từ chối nhanh khi quá tải. Thứ tự dispatch: FIFO hoặc
+fair queuing theo participant / priority class (`utils.fair_scheduler`).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from utils.fair_scheduler import FairScheduler, current_inference_flow
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_DEPTH_GAUGE = Gauge(
+  "stt_inference_queue_depth",
+  "Utterances admitted to the inference executor and not yet finished",
+  ["executor"],
+)
+QUEUE_WAIT_HISTOGRAM = Histogram(
+  "stt_inference_queue_wait_seconds",
+  "Time a decode job waited for a free inference worker",
+  ["executor"],
+  buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0],
+)
+REJECTED_COUNTER = Counter(
+  "stt_inference_rejected_total",
+  "Requests rejected because the inference queue was full",
+  ["executor"],
+)
+
+
+class InferenceQueueFull(Exception):
+  """Queue inference đã đầy → caller nên trả 503 kèm Retry-After."""
+
+  def __init__(self, executor: str, retry_after: int):
+    super().__init__(f"Inference queue '{executor}' is full, retry after {retry_after}s")
+    self.executor = executor
+    self.retry_after = retry_after
+
+
+def workers_for_threads(num_threads: int) -> int:
+  """Số worker để tổng số intra-op threads (workers * num_threads) ≈ số CPU."""
+  cpu_count = os.cpu_count() or 1
+  return max(1, cpu_count // max(num_threads, 1))
+
+
+class AdmittedSlot:
+  """
+  Slot đã admit, giữ qua nhiều bước (stream segment của /transcribe); `release()` chỉ có
+  tác dụng lần đầu → gọi được từ mọi đường kết thúc (generator finally, background task của
+  response, GC khi response bị bỏ trước khi body được iterate).
+  """
+
+  def __init__(self, executor: "InferenceExecutor"):
+    executor.admit()
+    self._executor: Optional["InferenceExecutor"] = executor
+
+  def release(self):
+    executor, self._executor = self._executor, None
+    if executor is not None:
+      executor.release()
+
+  def __del__(self):
+    self.release()
+
+
+class InferenceExecutor:
+  """
+  Thread pool cho inference với admission control.
+
+  - `admit()` / `release()`: đếm utterance đang chờ + đang chạy; vượt `max_queue_size`
+    thì raise `InferenceQueueFull`.
+  - `slot()`: admit, trả về `AdmittedSlot` (release một lần, kể cả khi bị bỏ quên).
+  - `run(fn, *args)`: chạy `fn` trên pool, đo thời gian chờ worker.
+
+  `class_weights` (vd. {"streaming": 8, "batch": 1}) → job chờ trong `FairScheduler`
+  (queue riêng mỗi participant, flow lấy từ `set_inference_flow`) thay vì FIFO của pool;
+  None → FIFO.
+  """
+
+  def __init__(
+    self,
+    name: str,
+    max_workers: int,
+    max_queue_size: int,
+    retry_after: int = 1,
+    class_weights: Optional[Dict[str, float]] = None,
+    quantum: float = 1.0,
+  ):
+    self.name = name
+    self.max_workers = max(max_workers, 1)
+    self.max_queue_size = max(max_queue_size, 1)
+    self.retry_after = retry_after
+    self._pending = 0
+    self._pool = ThreadPoolExecutor(
+      max_workers=self.max_workers, thread_name_prefix=f"{name}-inference"
+    )
+    # Scheduler giữ đúng max_workers slot → queue nội bộ của pool không bao giờ xếp hàng
+    self.scheduler = (
+      FairScheduler(name, self.max_workers, class_weights, quantum) if class_weights else None
+    )
+    QUEUE_DEPTH_GAUGE.labels(executor=name).set(0)
+    logger.info(
+      "Inference executor '%s': workers=%d, max_queue=%d", name, self.max_workers, self.max_queue_size
+    )
+
+  @property
+  def pending(self) -> int:
+    return self._pending
+
+  @property
+  def saturated(self) -> bool:
+    return self._pending >= self.max_queue_size
+
+  def admit(self):
+    """Nhận thêm một utterance vào queue hoặc raise `InferenceQueueFull`."""
+    if self.saturated:
+      REJECTED_COUNTER.labels(executor=self.name).inc()
+      raise InferenceQueueFull(self.name, self.retry_after)
+    self._pending += 1
+    QUEUE_DEPTH_GAUGE.labels(executor=self.name).set(self._pending)
+
+  def release(self):
+    self._pending = max(self._pending - 1, 0)
+    QUEUE_DEPTH_GAUGE.labels(executor=self.name).set(self._pending)
+
+  def slot(self) -> AdmittedSlot:
+    return AdmittedSlot(self)
+
+  async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+    """Chạy `fn(*args)` trên thread pool và chờ kết quả mà không chặn event loop."""
+    submitted = time.perf_counter()
+
+    def job():
+      QUEUE_WAIT_HISTOGRAM.labels(executor=self.name).observe(time.perf_counter() - submitted)
+      return fn(*args)
+
+    if self.scheduler is None:
+      return await asyncio.get_running_loop().run_in_executor(self._pool, job)
+
+    await self.scheduler.acquire(current_inference_flow())
+    loop = asyncio.get_running_loop()
+    try:
+      future = self._pool.submit(job)
+    except BaseException:
+      self.scheduler.release()
+      raise
+    def release_slot(_):
+      # Trả slot khi thread thật sự chạy xong (caller bị huỷ vẫn chiếm worker tới lúc đó)
+      if not loop.is_closed():
+        loop.call_soon_threadsafe(self.scheduler.release)
+
+    future.add_done_callback(release_slot)
+    return await asyncio.wrap_future(future)
+
+  def shutdown(self):
+    self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,129 @@
+"""
+Language identification cache cho streaming sessions.
+Pin ngôn ngữ của participant khi detection đủ tin cậy → các chunk sau bỏ qua
+language detection (một encoder pass) và decode thẳng với ngôn ngữ đã pin.
+"""
+
+import logging
+from typing import Optional
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+
+LANGUAGE_ID_COUNTER = Counter(
+  "stt_language_id_total",
+  "Streaming chunks by language-ID decision (detect = model detects language, pinned = skipped)",
+  ["decision"],
+)
+LANGUAGE_PIN_COUNTER = Counter(
+  "stt_language_pins_total",
+  "Language pin changes for streaming sessions",
+  ["event"],
+)
+
+
+class LanguagePin:
+  """Trạng thái ngôn ngữ của một session."""
+
+  def __init__(self, language: Optional[str] = None):
+    self.language: Optional[str] = None
+    self.confidence = 0.0
+    self.source: Optional[str] = None  # "client" | "detected"
+    self.chunks_since_check = 0
+    self.needs_recheck = False
+    self.candidate: Optional[str] = None  # ngôn ngữ detect gần nhất + số lần thắng liên tiếp
+    self.candidate_votes = 0
+    if language:
+      self.set_client_language(language)
+
+  @property
+  def pinned(self) -> bool:
+    return self.language is not None
+
+  def set_client_language(self, language: str):
+    """Client chỉ định ngôn ngữ → pin cố định, không re-check."""
+    self.language = language
+    self.confidence = 1.0
+    self.source = "client"
+    self.needs_recheck = False
+
+  def to_dict(self) -> dict:
+    return {
+      "language": self.language,
+      "confidence": round(self.confidence, 3),
+      "source": self.source,
+      "pinned": self.pinned,
+    }
+
+
+class LanguageIdentifier:
+  """
+  Quyết định chunk nào cần language detection.
+
+  - Chưa pin: detect mỗi chunk; pin khi probability >= `threshold`, hoặc khi cùng một
+    ngôn ngữ thắng `votes_to_pin` lần liên tiếp.
+  - Đã pin (detected): bỏ qua detection; re-check mỗi `recheck_interval` chunk hoặc khi
+    avg log-prob của chunk < `logprob_floor` (thường do participant đổi ngôn ngữ).
+  - Pin từ client: không bao giờ re-check.
+  """
+
+  def __init__(
+    self,
+    threshold: float = 0.8,
+    votes_to_pin: int = 3,
+    recheck_interval: int = 50,
+    logprob_floor: float = -1.2,
+  ):
+    self.threshold = threshold
+    self.votes_to_pin = max(votes_to_pin, 1)
+    self.recheck_interval = max(recheck_interval, 1)
+    self.logprob_floor = logprob_floor
+
+  def language_for_chunk(self, pin: LanguagePin) -> Optional[str]:
+    """Ngôn ngữ đưa vào model; None = model tự detect."""
+    if pin.source == "client":
+      LANGUAGE_ID_COUNTER.labels(decision="pinned").inc()
+      return pin.language
+    if pin.pinned and not pin.needs_recheck and pin.chunks_since_check < self.recheck_interval:
+      pin.chunks_since_check += 1
+      LANGUAGE_ID_COUNTER.labels(decision="pinned").inc()
+      return pin.language
+    LANGUAGE_ID_COUNTER.labels(decision="detect").inc()
+    return None
+
+  def observe_detection(self, pin: LanguagePin, language: str, probability: float):
+    """Kết quả detection của model cho một chunk (chỉ gọi khi `language_for_chunk` trả None)."""
+    pin.chunks_since_check = 0
+    pin.needs_recheck = False
+
+    if language == pin.candidate:
+      pin.candidate_votes += 1
+    else:
+      pin.candidate, pin.candidate_votes = language, 1
+
+    confident = probability >= self.threshold or pin.candidate_votes >= self.votes_to_pin
+    if pin.language == language:
+      pin.confidence = probability
+      return
+    if not confident:
+      return
+
+    event = "switched" if pin.pinned else "pinned"
+    logger.info(
+      "🌐 Language %s: %s → %s (p=%.2f, votes=%d)",
+      event, pin.language, language, probability, pin.candidate_votes,
+    )
+    LANGUAGE_PIN_COUNTER.labels(event=event).inc()
+    pin.language = language
+    pin.confidence = probability
+    pin.source = "detected"
+
+  def observe_logprob(self, pin: LanguagePin, avg_logprob: Optional[float]):
+    """avg log-prob của chunk decode với ngôn ngữ đã pin; sụt mạnh → re-check chunk sau."""
+    if pin.source != "detected" or avg_logprob is None:
+      return
+    if avg_logprob < self.logprob_floor and not pin.needs_recheck:
+      pin.needs_recheck = True
+      LANGUAGE_PIN_COUNTER.labels(event="logprob_recheck").inc()
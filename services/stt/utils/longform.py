@@ -0,0 +1,348 @@
+"""
+Long-form transcription cho upload dài (meeting recordings).
+
+Audio được cắt tại điểm im lặng thành các chunk ≤ 30s (vừa cửa sổ của Whisper, không bị
+truncate max_length=448 token như PhoWhisper decode một lần), decode song song trên process
+pool — mỗi worker giữ model riêng (không tranh GIL / intra-op threads với nhau) — rồi ghép
+segment lại với timestamp toàn cục.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+from utils.inference_executor import InferenceQueueFull
+from utils.vad import EnergyFrameClassifier
+
+logger = logging.getLogger(__name__)
+
+
+LONGFORM_CHUNKS_COUNTER = Counter(
+  "stt_longform_chunks_total",
+  "Long-form chunks by outcome (transcribed = sent to a worker, skipped = no speech)",
+  ["status"],
+)
+LONGFORM_CHUNK_DURATION = Histogram(
+  "stt_longform_chunk_seconds",
+  "Wall-clock time from submit to result for one long-form chunk",
+  buckets=[0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 40.0, 80.0],
+)
+
+
+def faster_whisper_segment_to_dict(segment, word_timestamps: bool) -> dict:
+  """Convert faster-whisper Segment sang dict (format của TranscriptionResponse.segments)."""
+  segment_dict = {
+    "start": segment.start,
+    "end": segment.end,
+    "text": segment.text.strip(),
+  }
+
+  if word_timestamps and hasattr(segment, "words"):
+    segment_dict["words"] = [
+      {
+        "word": word.word,
+        "start": word.start,
+        "end": word.end,
+        "probability": word.probability,
+      }
+      for word in segment.words
+    ]
+
+  return segment_dict
+
+
+# ==================== SPLITTING ====================
+
+def _silence_runs(speech: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """(start, end) frame index của các đoạn liên tiếp không có speech."""
+  padded = np.concatenate(([True], speech, [True])).astype(np.int8)
+  edges = np.diff(padded)
+  return np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)
+
+
+def split_on_silence(
+  audio: np.ndarray,
+  sample_rate: int = 16000,
+  max_chunk_seconds: float = 30.0,
+  min_chunk_seconds: float = 10.0,
+) -> List[Tuple[int, int, bool]]:
+  """
+  Cắt audio thành các span (start, end, has_speech) theo sample, mỗi span ≤ `max_chunk_seconds`.
+
+  Điểm cắt: giữa đoạn im lặng dài nhất trong cửa sổ [min, max] tính từ đầu chunk;
+  không có im lặng → frame năng lượng thấp nhất (energy VAD, không cần model).
+  """
+  classifier = EnergyFrameClassifier(sample_rate=sample_rate)
+  frame = classifier.frame_samples
+  n_frames = len(audio) // frame
+  if n_frames == 0:
+    return [(0, len(audio), len(audio) > 0)]
+
+  frames = audio[:n_frames * frame].reshape(n_frames, frame)
+  speech = classifier.classify(frames, classifier.new_state())
+  energy = np.einsum("ij,ij->i", frames, frames)
+
+  max_frames = max(int(max_chunk_seconds * sample_rate) // frame, 1)
+  min_frames = min(max(int(min_chunk_seconds * sample_rate) // frame, 1), max_frames)
+
+  boundaries = [0]
+  start = 0
+  while n_frames - start > max_frames:
+    lo, hi = start + min_frames, start + max_frames
+    run_starts, run_ends = _silence_runs(speech[lo:hi])
+    if len(run_starts):
+      longest = int(np.argmax(run_ends - run_starts))
+      split = lo + (int(run_starts[longest]) + int(run_ends[longest])) // 2
+    else:
+      split = lo + int(np.argmin(energy[lo:hi]))
+    split = max(split, start + 1)
+    boundaries.append(split)
+    start = split
+  boundaries.append(n_frames)
+
+  spans = []
+  for first, last in zip(boundaries[:-1], boundaries[1:]):
+    end = len(audio) if last == n_frames else last * frame
+    spans.append((first * frame, end, bool(speech[first:last].any())))
+  return spans
+
+
+# ==================== WORKER PROCESS ====================
+
+_worker_models: Dict[str, object] = {}
+_worker_threads = 1
+
+
+def _init_worker(threads: int):
+  """Initializer của worker process: giới hạn intra-op threads trước khi load model."""
+  global _worker_threads
+  _worker_threads = threads
+  os.environ["OMP_NUM_THREADS"] = str(threads)
+
+
+def _load_worker_model(spec: dict):
+  """
+  spec: {"name", "kind": "ctranslate2" | "transformers", "model", "compute_type"}.
+  Model được load một lần mỗi worker, giữ lại cho các chunk sau.
+  """
+  model = _worker_models.get(spec["name"])
+  if model is not None:
+    return model
+
+  start = time.time()
+  if spec["kind"] == "ctranslate2":
+    from faster_whisper import WhisperModel
+
+    model = WhisperModel(
+      spec["model"],
+      device="cpu",
+      compute_type=spec.get("compute_type", "int8"),
+      cpu_threads=_worker_threads,
+      num_workers=1,
+    )
+  else:
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
+
+    torch.set_num_threads(_worker_threads)
+    processor = AutoProcessor.from_pretrained(spec["model"])
+    network = AutoModelForSpeechSeq2Seq.from_pretrained(
+      spec["model"], torch_dtype=torch.float32, low_cpu_mem_usage=True
+    )
+    network.eval()
+    model = (processor, network)
+
+  _worker_models[spec["name"]] = model
+  logger.info("Long-form worker %d loaded %s in %.1fs", os.getpid(), spec["name"], time.time() - start)
+  return model
+
+
+def warmup_worker(spec: dict) -> int:
+  _load_worker_model(spec)
+  return os.getpid()
+
+
+def transcribe_chunk(
+  spec: dict,
+  audio: np.ndarray,
+  language: Optional[str],
+  task: str,
+  word_timestamps: bool,
+  decode_options: dict,
+) -> dict:
+  """Decode một chunk (Float32 @16kHz) trong worker process; timestamp tính từ đầu chunk."""
+  model = _load_worker_model(spec)
+  duration = len(audio) / 16000
+
+  if spec["kind"] == "ctranslate2":
+    segments_generator, info = model.transcribe(
+      audio, language=language, task=task, word_timestamps=word_timestamps, **decode_options
+    )
+    segments = [faster_whisper_segment_to_dict(segment, word_timestamps) for segment in segments_generator]
+    return {
+      "segments": segments,
+      "language": info.language,
+      "language_probability": info.language_probability,
+      "duration": duration,
+    }
+
+  import torch
+
+  processor, network = model
+  inputs = processor(audio, sampling_rate=16000, return_tensors="pt")
+  with torch.no_grad():
+    predicted_ids = network.generate(inputs.input_features, max_length=448)
+  text = processor.batch_decode(predicted_ids, skip_special_tokens=True)[0].strip()
+  segment = {"start": 0.0, "end": duration, "text": text}
+  if word_timestamps:
+    segment["words"] = []
+  return {
+    "segments": [segment] if text else [],
+    "language": language or "vi",
+    "language_probability": 0.95,
+    "duration": duration,
+  }
+
+
+# ==================== STITCHING ====================
+
+def stitch_chunks(results: List[dict], offsets: List[float]) -> Dict:
+  """Ghép kết quả các chunk: cộng offset vào timestamp segment/word, chọn ngôn ngữ theo thời lượng."""
+  segments = []
+  language_seconds: Dict[str, float] = {}
+  language_probability: Dict[str, float] = {}
+
+  for result, offset in zip(results, offsets):
+    for segment in result["segments"]:
+      segment["start"] = round(segment["start"] + offset, 3)
+      segment["end"] = round(segment["end"] + offset, 3)
+      for word in segment.get("words", []):
+        word["start"] = round(word["start"] + offset, 3)
+        word["end"] = round(word["end"] + offset, 3)
+      segments.append(segment)
+    language = result["language"]
+    language_seconds[language] = language_seconds.get(language, 0.0) + result["duration"]
+    language_probability[language] = max(language_probability.get(language, 0.0), result["language_probability"])
+
+  language = max(language_seconds, key=language_seconds.get) if language_seconds else "unknown"
+  raw_text = " ".join(segment["text"] for segment in segments if segment["text"])
+  return {
+    "text": raw_text,
+    "text_raw": raw_text,
+    "language": language,
+    "language_probability": language_probability.get(language, 0.0),
+    "segments": segments,
+  }
+
+
+class LongFormTranscriber:
+  """
+  Process pool cho long-form transcription.
+
+  Pool được tạo lazily ở request đầu tiên (không tốn RAM nếu không dùng); `warmup()` load
+  model trước trong mọi worker. Tổng số chunk đang chờ bị giới hạn bởi `max_pending_chunks`
+  → vượt quá thì raise `InferenceQueueFull` (503 + Retry-After như inference executor).
+  """
+
+  def __init__(
+    self,
+    max_workers: int,
+    threads_per_worker: int = 1,
+    max_chunk_seconds: float = 30.0,
+    min_chunk_seconds: float = 10.0,
+    max_pending_chunks: int = 64,
+    retry_after: int = 1,
+  ):
+    self.max_workers = max(max_workers, 1)
+    self.threads_per_worker = max(threads_per_worker, 1)
+    self.max_chunk_seconds = max_chunk_seconds
+    self.min_chunk_seconds = min_chunk_seconds
+    self.max_pending_chunks = max_pending_chunks
+    self.retry_after = retry_after
+    self._pool: Optional[ProcessPoolExecutor] = None
+    self._pending = 0
+
+  @property
+  def pending(self) -> int:
+    return self._pending
+
+  def _get_pool(self) -> ProcessPoolExecutor:
+    if self._pool is None:
+      # spawn: worker không thừa hưởng model/thread pool của process chính
+      self._pool = ProcessPoolExecutor(
+        max_workers=self.max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(self.threads_per_worker,),
+      )
+      logger.info(
+        "Long-form pool started: %d workers x %d threads", self.max_workers, self.threads_per_worker
+      )
+    return self._pool
+
+  async def warmup(self, spec: dict):
+    loop = asyncio.get_running_loop()
+    pool = self._get_pool()
+    await asyncio.gather(*(
+      loop.run_in_executor(pool, warmup_worker, spec) for _ in range(self.max_workers)
+    ))
+
+  async def _run_chunk(self, pool, *args) -> dict:
+    start = time.perf_counter()
+    result = await asyncio.get_running_loop().run_in_executor(pool, transcribe_chunk, *args)
+    LONGFORM_CHUNK_DURATION.observe(time.perf_counter() - start)
+    return result
+
+  async def transcribe(
+    self,
+    audio: np.ndarray,
+    spec: dict,
+    language: Optional[str],
+    task: str,
+    word_timestamps: bool,
+    decode_options: dict,
+  ) -> Dict:
+    """
+    audio: Float32 @16kHz. Returns dict cùng format với transcribe_with_faster_whisper
+    (text, text_raw, language, language_probability, segments) + chunk count.
+    """
+    spans = await asyncio.to_thread(
+      split_on_silence, audio, 16000, self.max_chunk_seconds, self.min_chunk_seconds
+    )
+    jobs = [(start, end) for start, end, has_speech in spans if has_speech]
+    LONGFORM_CHUNKS_COUNTER.labels(status="skipped").inc(len(spans) - len(jobs))
+    if not jobs:
+      result = stitch_chunks([], [])
+      result["language"] = language or "unknown"
+      result["chunks"] = 0
+      return result
+
+    if self._pending + len(jobs) > self.max_pending_chunks:
+      raise InferenceQueueFull("longform", self.retry_after)
+    self._pending += len(jobs)
+    LONGFORM_CHUNKS_COUNTER.labels(status="transcribed").inc(len(jobs))
+
+    pool = self._get_pool()
+    try:
+      results = await asyncio.gather(*(
+        self._run_chunk(pool, spec, audio[start:end], language, task, word_timestamps, decode_options)
+        for start, end in jobs
+      ))
+    finally:
+      self._pending -= len(jobs)
+
+    result = stitch_chunks(results, [start / 16000 for start, _ in jobs])
+    result["chunks"] = len(jobs)
+    return result
+
+  def shutdown(self):
+    if self._pool is not None:
+      self._pool.shutdown(wait=False, cancel_futures=True)
+      self._pool = None
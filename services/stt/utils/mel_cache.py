@@ -0,0 +1,137 @@
+"""
+Log-mel front-end (Whisper) tính tăng dần cho streaming session.
+
+Mỗi bước streaming decode lại cả cửa sổ (phần đã nghe + audio mới); feature extractor gốc
+tính lại STFT/log-mel cho toàn bộ cửa sổ đã pad lên 30s. Frame có support nằm trọn trong audio
+đã thấy không đổi khi cửa sổ dài thêm hay bị cắt đầu → cache theo index tuyệt đối, mỗi bước
+chỉ tính frame mới và vài frame sát mép (reflect / zero padding như extractor gốc).
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+
+MEL_FRAMES_COUNTER = Counter(
+  "stt_mel_frames_total",
+  "Log-mel frames of streaming windows, reused from the session cache or computed",
+  ["source"],
+)
+
+
+class IncrementalLogMel:
+  """
+  Log-mel features [n_mels, n_frames] giống WhisperFeatureExtractor (Hann periodic, STFT center +
+  reflect, audio pad zero lên `n_samples`, bỏ frame cuối, log10 → clamp max-8 → (x+4)/4).
+
+  - `features(audio, start, gain)`: audio là cửa sổ bắt đầu tại sample tuyệt đối `start` của stream;
+    `gain` = hệ số normalize peak của cửa sổ (power scale theo gain², cache giữ power chưa scale).
+  - `align(start)`: lùi `start` về cùng pha hop với frame đã cache (cửa sổ lệch pha → tính lại hết).
+
+  Cache chỉ giữ frame từ đầu cửa sổ gần nhất trở đi (≈ độ dài buffer của session).
+  """
+
+  def __init__(
+    self,
+    mel_filters: np.ndarray,
+    n_fft: int = 400,
+    hop_length: int = 160,
+    n_samples: int = 480000,
+  ):
+    filters = np.asarray(mel_filters, dtype=np.float32)
+    if filters.shape[0] == n_fft // 2 + 1:
+      filters = filters.T  # HF lưu (n_freq, n_mels)
+    self.mel_filters = np.ascontiguousarray(filters)
+    self.n_fft = n_fft
+    self.hop_length = hop_length
+    self.n_samples = n_samples
+    self.n_frames = n_samples // hop_length
+    self._window = np.hanning(n_fft + 1)[:-1]  # periodic Hann (torch.hann_window / window_function)
+    self.reset()
+
+  @property
+  def n_mels(self) -> int:
+    return self.mel_filters.shape[0]
+
+  def reset(self):
+    self._phase: Optional[int] = None  # start % hop của các frame trong cache
+    self._base = 0  # frame index tuyệt đối của cột đầu tiên trong _power
+    self._power = np.zeros((self.n_mels, 0), dtype=np.float32)
+
+  def align(self, start: int) -> int:
+    if self._phase is None:
+      return start
+    return start - (start - self._phase) % self.hop_length
+
+  def _mel_power(self, samples: np.ndarray) -> np.ndarray:
+    """Mel power của các frame liên tiếp trong `samples` (frame đầu bắt đầu tại samples[0])."""
+    frames = sliding_window_view(samples, self.n_fft)[::self.hop_length]
+    spectrum = np.fft.rfft(frames * self._window, axis=-1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    return (self.mel_filters @ power.T.astype(np.float32)).astype(np.float32, copy=False)
+
+  def _padded(self, audio: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """Sample [lo, hi) của audio đã pad zero lên n_samples rồi reflect-pad hai đầu (center=True)."""
+    index = np.abs(np.arange(lo, hi))
+    last = self.n_samples - 1
+    index = np.where(index > last, 2 * last - index, index)
+    inside = index < len(audio)
+    return np.where(inside, audio[np.minimum(index, len(audio) - 1)], 0.0)
+
+  def features(self, audio: np.ndarray, start: int, gain: float = 1.0) -> np.ndarray:
+    audio = audio[:self.n_samples]
+    length = len(audio)
+    half, hop = self.n_fft // 2, self.hop_length
+    if length == 0:
+      return np.full((self.n_mels, self.n_frames), -1.5, dtype=np.float32)  # (-10 + 4) / 4
+
+    if start % hop != self._phase:
+      self.reset()
+      self._phase = start % hop
+    first = (start - self._phase) // hop  # frame tuyệt đối của frame 0 trong cửa sổ
+
+    # Frame j có support [j*hop - half, j*hop + half): interior = nằm trọn trong audio → cache được
+    j0 = -(-half // hop)
+    j1 = max((length - half) // hop + 1, j0)
+    j_end = min(-(-(length + half) // hop), self.n_frames)  # frame sau j_end chỉ có zero padding
+    j1 = min(j1, j_end)
+    power = np.zeros((self.n_mels, max(j_end, 0)), dtype=np.float32)
+
+    computed = 0
+    count = max(j1 - j0, 0)
+    if count:
+      if self._base != first + j0:
+        offset = first + j0 - self._base
+        if 0 < offset < self._power.shape[1]:
+          self._power = self._power[:, offset:]  # Đầu buffer đã bị cắt
+        else:
+          self._power = self._power[:, :0]
+        self._base = first + j0
+      cached = min(self._power.shape[1], count)
+      if cached < count:
+        lo = (j0 + cached) * hop - half
+        hi = (j1 - 1) * hop + half
+        self._power = np.concatenate((self._power[:, :cached], self._mel_power(audio[lo:hi])), axis=1)
+        computed += count - cached
+      power[:, j0:j1] = self._power[:, :count]
+      MEL_FRAMES_COUNTER.labels(source="cached").inc(cached)
+
+    # Frame sát mép: reflect padding ở đầu, zero padding ở cuối → tính lại mỗi lần như extractor gốc
+    for lo_frame, hi_frame in ((0, min(j0, j_end)), (max(j1, min(j0, j_end)), j_end)):
+      if hi_frame > lo_frame:
+        samples = self._padded(audio, lo_frame * hop - half, (hi_frame - 1) * hop + half)
+        power[:, lo_frame:hi_frame] = self._mel_power(samples)
+        computed += hi_frame - lo_frame
+    MEL_FRAMES_COUNTER.labels(source="computed").inc(computed)
+
+    log_spec = np.full((self.n_mels, self.n_frames), -10.0, dtype=np.float32)
+    np.log10(np.maximum(power * np.float32(gain * gain), 1e-10), out=log_spec[:, :power.shape[1]])
+    np.maximum(log_spec, log_spec.max() - 8.0, out=log_spec)
+    log_spec += 4.0
+    log_spec /= 4.0
+    return log_spec
@@ -0,0 +1,143 @@
+"""
+Micro-batching scheduler cho inference.
+Gom các request đồng thời trong một cửa sổ ngắn (vài ms) rồi xử lý chung một lần.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Sequence
+
+from prometheus_client import Histogram
+
+from utils.fair_scheduler import PRIORITIES, current_inference_flow, set_inference_flow
+from utils.inference_executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+BATCH_SIZE_HISTOGRAM = Histogram(
+  "stt_decode_batch_size",
+  "Number of utterances decoded together in one batch",
+  ["batcher"],
+  buckets=[1, 2, 4, 8, 16, 32],
+)
+
+
+class MicroBatcher:
+  """
+  Gom item từ nhiều coroutine thành batch rồi gọi `batch_fn(items)` một lần.
+
+  `batch_fn` nhận list item và phải trả về list kết quả cùng thứ tự.
+  Mỗi caller của `submit` nhận lại đúng kết quả của item mình gửi.
+  Nếu có `executor`, mỗi item phải qua admission control và `batch_fn` chạy trên
+  thread pool của executor (nhiều batch có thể chạy song song).
+  Item khác priority class (streaming / batch) không chung batch; batch xin slot của fair
+  scheduler với flow của item (cost = item dài nhất, các item decode song song).
+  """
+
+  def __init__(
+    self,
+    name: str,
+    batch_fn: Callable[[List[Any]], Sequence[Any]],
+    window_ms: float = 10.0,
+    max_batch_size: int = 8,
+    executor: Optional[InferenceExecutor] = None,
+  ):
+    self.name = name
+    self.batch_fn = batch_fn
+    self.executor = executor
+    self.window = max(window_ms, 0.0) / 1000.0
+    self.max_batch_size = max(max_batch_size, 1)
+    self._queue: "asyncio.Queue" = asyncio.Queue()
+    self._worker: Optional[asyncio.Task] = None
+    self._inflight: set = set()
+
+  async def submit(self, item: Any) -> Any:
+    """Đưa item vào batch kế tiếp và chờ kết quả của riêng nó."""
+    if self.executor is not None:
+      self.executor.admit()  # raise InferenceQueueFull nếu quá tải
+    try:
+      future = asyncio.get_running_loop().create_future()
+      self._queue.put_nowait((item, future, current_inference_flow()))
+      self._ensure_worker()
+      return await future
+    finally:
+      if self.executor is not None:
+        self.executor.release()
+
+  def _ensure_worker(self):
+    if self._worker is None or self._worker.done():
+      self._worker = asyncio.get_running_loop().create_task(self._run())
+
+  async def _collect(self) -> list:
+    """Chờ item đầu tiên, sau đó gom thêm tới khi hết window hoặc đủ max_batch_size."""
+    loop = asyncio.get_running_loop()
+    batch = [await self._queue.get()]
+    deadline = loop.time() + self.window
+    while len(batch) < self.max_batch_size:
+      timeout = deadline - loop.time()
+      if timeout <= 0:
+        break
+      try:
+        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+      except asyncio.TimeoutError:
+        break
+    # Caller đã bỏ cuộc (client disconnect) → không decode nữa
+    return [entry for entry in batch if not entry[1].done()]
+
+  async def _run(self):
+    while True:
+      batch = await self._collect()
+      if not batch:
+        continue
+      if self.executor is None:
+        BATCH_SIZE_HISTOGRAM.labels(batcher=self.name).observe(len(batch))
+        await self._dispatch(batch)
+        continue
+      groups = {}
+      for entry in batch:
+        groups.setdefault(entry[2].priority, []).append(entry)
+      for priority in sorted(groups, key=PRIORITIES.index):
+        group = groups[priority]
+        BATCH_SIZE_HISTOGRAM.labels(batcher=self.name).observe(len(group))
+        # Không chờ batch xong: tiếp tục gom batch mới trong lúc pool đang decode
+        task = asyncio.get_running_loop().create_task(self._dispatch(group))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+  async def _dispatch(self, batch: list):
+    items = [item for item, _, _ in batch]
+    if self.executor is not None:
+      # Task riêng của batch → flow của batch không ảnh hưởng caller
+      flows = {flow.flow for _, _, flow in batch}
+      set_inference_flow(
+        flows.pop() if len(flows) == 1 else f"{self.name}-batch",
+        batch[0][2].priority,
+        max(flow.cost for _, _, flow in batch),
+      )
+    try:
+      if self.executor is None:
+        results = self.batch_fn(items)
+      else:
+        results = await self.executor.run(self.batch_fn, items)
+    except Exception as exc:  # noqa: BLE001
+      logger.exception("Batch decode failed (batcher=%s, size=%d)", self.name, len(batch))
+      for _, future, _ in batch:
+        if not future.done():
+          future.set_exception(exc)
+      return
+    for (_, future, _), result in zip(batch, results):
+      if not future.done():
+        future.set_result(result)
+
+  async def close(self):
+    """Dừng worker task (gọi khi shutdown)."""
+    if self._worker is not None:
+      self._worker.cancel()
+      try:
+        await self._worker
+      except asyncio.CancelledError:
+        pass
+      self._worker = None
+    for task in list(self._inflight):
+      task.cancel()
@@ -0,0 +1,214 @@
+"""
+Model registry: load recognizer khi được dùng lần đầu, đo RAM mỗi model, evict LRU khi vượt budget.
+
+Node chỉ phục vụ tiếng Việt không cần giữ Parakeet 0.6B (en) trong RAM; node có budget nhỏ
+giữ model vừa dùng gần nhất và load lại model kia khi cần. RSS đo từ /proc/self/statm
+trước/sau khi load (load được tuần tự hoá để delta không lẫn giữa các model).
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+MODEL_RESIDENT_GAUGE = Gauge(
+  "stt_model_resident_bytes",
+  "Estimated resident memory of a loaded model (0 when not loaded)",
+  ["model"],
+)
+MODEL_LOADS_COUNTER = Counter(
+  "stt_model_loads_total",
+  "Model loads performed by the model registry",
+  ["model"],
+)
+MODEL_EVICTIONS_COUNTER = Counter(
+  "stt_model_evictions_total",
+  "Idle models evicted to stay within the memory budget",
+  ["model"],
+)
+MODEL_LOAD_HISTOGRAM = Histogram(
+  "stt_model_load_seconds",
+  "Time spent loading a model on first use",
+  ["model"],
+  buckets=[0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0],
+)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss_bytes() -> int:
+  """Resident set size của process (field thứ 2 của /proc/self/statm, đơn vị page); 0 nếu không đọc được."""
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * _PAGE_SIZE
+  except (OSError, ValueError, IndexError):
+    return 0
+
+
+def files_size_bytes(paths: Iterable[str]) -> int:
+  """Tổng kích thước file model trên disk (ước lượng RAM trước khi load lần đầu)."""
+  return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+class _Entry:
+  __slots__ = ("name", "loader", "estimate", "model", "resident", "in_use", "last_used", "loads", "lock")
+
+  def __init__(self, name: str, loader: Callable[[], Any], estimate: int):
+    self.name = name
+    self.loader = loader
+    self.estimate = estimate  # bytes, trước khi đo được
+    self.model: Any = None
+    self.resident = 0
+    self.in_use = 0
+    self.last_used = 0.0
+    self.loads = 0
+    self.lock = asyncio.Lock()
+
+  @property
+  def footprint(self) -> int:
+    """RAM dự kiến của model: số đo lần load trước, chưa có thì ước lượng từ disk."""
+    return self.resident or self.estimate
+
+
+class ModelRegistry:
+  """
+  - `register(name, loader, estimate_bytes)`: khai báo model; `loader()` chạy trên thread riêng.
+  - `use(name)`: async context manager trả model (load nếu chưa có); model đang dùng không bị evict.
+  - `preload(names)`: load sẵn lúc startup.
+
+  `memory_budget_bytes` = 0 → không giới hạn. Trước khi load: evict model idle ít dùng nhất
+  cho tới khi (tổng RAM model + model sắp load) ≤ budget; sau khi load đo lại và evict tiếp
+  nếu số đo thật lớn hơn ước lượng. Không đủ model idle để evict thì vẫn load (kèm warning).
+  """
+
+  def __init__(self, name: str, memory_budget_bytes: int = 0):
+    self.name = name
+    self.memory_budget_bytes = max(memory_budget_bytes, 0)
+    self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+    self._load_lock = asyncio.Lock()
+
+  def register(self, name: str, loader: Callable[[], Any], estimate_bytes: int = 0):
+    self._entries[name] = _Entry(name, loader, estimate_bytes)
+    MODEL_RESIDENT_GAUGE.labels(model=name).set(0)
+
+  def __contains__(self, name: str) -> bool:
+    return name in self._entries
+
+  def is_loaded(self, name: str) -> bool:
+    entry = self._entries.get(name)
+    return entry is not None and entry.model is not None
+
+  def get_loaded(self, name: str) -> Any:
+    """Model đã load (gọi trong `use(name)`, vd. từ batch fn chạy trên inference thread)."""
+    model = self._entries[name].model
+    if model is None:
+      raise RuntimeError(f"Model '{name}' is not loaded")
+    return model
+
+  @property
+  def resident_bytes(self) -> int:
+    return sum(entry.resident for entry in self._entries.values() if entry.model is not None)
+
+  @asynccontextmanager
+  async def use(self, name: str) -> AsyncIterator[Any]:
+    entry = self._entries[name]
+    entry.in_use += 1  # Giữ chỗ trước khi chờ load → không bị evict giữa chừng
+    try:
+      model = entry.model if entry.model is not None else await self._load(entry)
+      entry.last_used = time.monotonic()
+      yield model
+    finally:
+      entry.in_use -= 1
+      entry.last_used = time.monotonic()
+      if self.memory_budget_bytes and self.resident_bytes > self.memory_budget_bytes:
+        # Lúc load không có model idle để evict → thu hồi ngay khi model rảnh
+        self._evict_for(0, keep=None, warn=False)
+
+  async def preload(self, names: Iterable[str]):
+    for name in names:
+      if name not in self._entries:
+        logger.warning("⚠️ Model registry '%s': unknown model %r in preload list", self.name, name)
+        continue
+      async with self.use(name):
+        pass
+
+  async def _load(self, entry: _Entry) -> Any:
+    async with entry.lock:
+      if entry.model is not None:
+        return entry.model
+      async with self._load_lock:
+        self._evict_for(entry.footprint, keep=entry)
+        before = process_rss_bytes()
+        started = time.perf_counter()
+        model = await asyncio.to_thread(entry.loader)
+        elapsed = time.perf_counter() - started
+        measured = max(process_rss_bytes() - before, 0)
+      # Allocator có thể tái dùng page của model vừa evict → delta nhỏ hơn thực tế; lấy tối thiểu = disk size
+      entry.resident = max(measured, entry.estimate)
+      entry.model = model
+      entry.loads += 1
+      MODEL_LOADS_COUNTER.labels(model=entry.name).inc()
+      MODEL_LOAD_HISTOGRAM.labels(model=entry.name).observe(elapsed)
+      MODEL_RESIDENT_GAUGE.labels(model=entry.name).set(entry.resident)
+      logger.info(
+        "✅ Model registry '%s': loaded %s in %.1fs (~%d MB resident, %d MB total)",
+        self.name, entry.name, elapsed, entry.resident >> 20, self.resident_bytes >> 20,
+      )
+      self._evict_for(0, keep=entry)
+      return model
+
+  def _evict_for(self, incoming: int, keep: Optional[_Entry], warn: bool = True):
+    """Evict model idle (LRU) cho tới khi tổng RAM model + `incoming` ≤ budget."""
+    if not self.memory_budget_bytes:
+      return
+    idle = sorted(
+      (e for e in self._entries.values() if e.model is not None and e.in_use == 0 and e is not keep),
+      key=lambda e: e.last_used,
+    )
+    for entry in idle:
+      if self.resident_bytes + incoming <= self.memory_budget_bytes:
+        return
+      self._evict(entry)
+    if warn and self.resident_bytes + incoming > self.memory_budget_bytes:
+      logger.warning(
+        "⚠️ Model registry '%s': %d MB needed > budget %d MB, no idle model left to evict",
+        self.name, (self.resident_bytes + incoming) >> 20, self.memory_budget_bytes >> 20,
+      )
+
+  def _evict(self, entry: _Entry):
+    logger.info(
+      "♻️ Model registry '%s': evicting idle model %s (~%d MB)", self.name, entry.name, entry.resident >> 20
+    )
+    entry.model = None
+    gc.collect()  # Recognizer giữ ONNX session (bộ nhớ native) tới khi object Python bị thu hồi
+    MODEL_EVICTIONS_COUNTER.labels(model=entry.name).inc()
+    MODEL_RESIDENT_GAUGE.labels(model=entry.name).set(0)
+
+  def snapshot(self) -> dict:
+    """Trạng thái từng model (cho /models)."""
+    now = time.monotonic()
+    return {
+      "memory_budget_mb": self.memory_budget_bytes >> 20 if self.memory_budget_bytes else None,
+      "models_resident_mb": self.resident_bytes >> 20,
+      "process_rss_mb": process_rss_bytes() >> 20,
+      "models": {
+        name: {
+          "loaded": entry.model is not None,
+          "resident_mb": entry.resident >> 20 if entry.model is not None else 0,
+          "estimated_mb": entry.footprint >> 20,
+          "in_use": entry.in_use,
+          "loads": entry.loads,
+          "idle_seconds": round(now - entry.last_used, 1) if entry.last_used else None,
+        }
+        for name, entry in self._entries.items()
+      },
+    }
@@ -0,0 +1,241 @@
+"""
+Punctuation restoration cho transcript tiếng Việt.
+
+- Rule-based: một regex alternation compile sẵn, mọi quyết định (dấu phẩy sau từ nối,
+  câu hỏi, viết hoa sau dấu câu) trong một lần scan.
+- ONNX model (tuỳ chọn): token classification punctuation + capitalization, batch các
+  transcript từ nhiều request đồng thời qua MicroBatcher.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from utils.inference_executor import InferenceExecutor
+from utils.micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+CONJUNCTIONS = ("và", "nhưng", "nên", "thì", "mà", "nếu", "bởi vì")
+QUESTION_WORDS = ("sao", "gì", "như thế nào", "tại sao", "khi nào", "ở đâu")
+
+_TOKEN_PATTERN = re.compile(
+  # Từ nối chưa có dấu phẩy/chấm theo sau → thêm ","
+  r"(?P<conj>\b(?:" + "|".join(CONJUNCTIONS) + r")\b)(?!\s*[,.])"
+  # Dấu hiệu câu hỏi: từ để hỏi, "ai" + khoảng trắng, "không" ở cuối
+  r"|(?P<question>\b(?:" + "|".join(QUESTION_WORDS) + r")\b|\bai\b(?=\s)|\bkhông\s*$)"
+  # Dấu kết thúc câu + khoảng trắng → viết hoa từ tiếp theo
+  r"|(?P<boundary>[.!?])\s+(?=\w)",
+  re.IGNORECASE,
+)
+
+
+def restore_vietnamese_punctuation(text: str) -> str:
+  """
+  Thêm dấu câu cơ bản cho text tiếng Việt (rule-based, một lần scan).
+
+  RULES:
+  1. Thêm dấu phẩy (,) sau các từ nối: "và", "nhưng", "nên", "thì", "mà", "nếu", "bởi vì"
+  2. Thêm dấu chấm (.) hoặc dấu hỏi (?) ở cuối câu
+  3. Viết hoa chữ cái đầu câu và sau dấu . ! ?
+  4. Câu hỏi: "gì", "sao", "như thế nào", "tại sao", "khi nào", "ở đâu", "ai ...", "... không"
+  """
+  if not text or len(text.strip()) == 0:
+    return text
+
+  text = text.strip()
+  pieces = []
+  position = 0
+  is_question = False
+  capitalize_next = False
+
+  for match in _TOKEN_PATTERN.finditer(text):
+    gap = text[position:match.start()]
+    if capitalize_next and gap:
+      gap = gap[0].upper() + gap[1:]
+      capitalize_next = False
+    pieces.append(gap)
+
+    kind = match.lastgroup
+    token = match.group()
+    if capitalize_next and token[0].isalnum():
+      token = token[0].upper() + token[1:]
+      capitalize_next = False
+    if kind == "conj":
+      pieces.append(token + ",")
+    elif kind == "question":
+      is_question = True
+      pieces.append(token)
+    else:
+      pieces.append(match.group("boundary") + " ")
+      capitalize_next = True
+    position = match.end()
+
+  tail = text[position:]
+  if capitalize_next and tail:
+    tail = tail[0].upper() + tail[1:]
+  pieces.append(tail)
+
+  text = "".join(pieces)
+  if text[-1] not in ".!?":
+    text += "?" if is_question else "."
+  return text[0].upper() + text[1:]
+
+
+class RulePunctuationBackend:
+  """Backend rule-based (không cần model, chạy trực tiếp trên event loop)."""
+
+  name = "rules"
+  batched = False
+
+  def punctuate_batch(self, texts: List[str]) -> List[str]:
+    return [restore_vietnamese_punctuation(text) for text in texts]
+
+
+class OnnxPunctuationBackend:
+  """
+  Token classification model (punctuation + capitalization) export sang ONNX.
+
+  `model_dir` chứa:
+  - model.onnx: input `input_ids`, `attention_mask` (và `token_type_ids` nếu có);
+    output[0] = punctuation logits [batch, seq, P], output[1] (tuỳ chọn) = capitalization logits [batch, seq, C]
+  - tokenizer.json: HuggingFace fast tokenizer
+  - labels.json: {"punctuation": ["O", ",", ".", "?"], "capitalization": ["O", "U"]}
+
+  Dấu câu lấy theo sub-token cuối của mỗi từ, viết hoa theo sub-token đầu.
+  """
+
+  name = "onnx"
+  batched = True
+
+  def __init__(self, model_dir: str, num_threads: int = 1, max_length: int = 256):
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+
+    with open(os.path.join(model_dir, "labels.json"), encoding="utf-8") as f:
+      labels = json.load(f)
+    self.punctuation_labels = labels["punctuation"]
+    self.capitalization_labels = labels.get("capitalization")
+
+    self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+    self.tokenizer.enable_truncation(max_length)
+    self.tokenizer.enable_padding()
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    self.session = ort.InferenceSession(
+      os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+    )
+    self.input_names = {i.name for i in self.session.get_inputs()}
+    logger.info("Punctuation ONNX model loaded from %s (threads=%d)", model_dir, num_threads)
+
+  def punctuate_batch(self, texts: List[str]) -> List[str]:
+    words_list = [text.split() for text in texts]
+    encodings = self.tokenizer.encode_batch([words or [""] for words in words_list], is_pretokenized=True)
+
+    feeds = {
+      "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+      "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+    }
+    if "token_type_ids" in self.input_names:
+      feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+    feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+    outputs = self.session.run(None, feeds)
+    punctuation = outputs[0].argmax(-1)
+    capitalization = outputs[1].argmax(-1) if len(outputs) > 1 and self.capitalization_labels else None
+
+    results = []
+    for b, (words, encoding) in enumerate(zip(words_list, encodings)):
+      first_token, last_token = {}, {}
+      for token_index, word_index in enumerate(encoding.word_ids):
+        if word_index is None:
+          continue
+        first_token.setdefault(word_index, token_index)
+        last_token[word_index] = token_index
+
+      pieces = []
+      for word_index, word in enumerate(words):
+        if word_index not in last_token:
+          # Bị truncate (quá max_length) → giữ nguyên
+          pieces.append(word)
+          continue
+        if capitalization is not None:
+          if self.capitalization_labels[capitalization[b, first_token[word_index]]] == "U":
+            word = word[0].upper() + word[1:]
+        label = self.punctuation_labels[punctuation[b, last_token[word_index]]]
+        if label != "O" and not word.endswith(label):
+          word += label
+        pieces.append(word)
+      results.append(" ".join(pieces))
+    return results
+
+
+class Punctuator:
+  """
+  Frontend async cho punctuation backend.
+  Backend batched (ONNX) → gom transcript từ các request đồng thời thành một lần `session.run`
+  trên executor riêng (không tranh queue với ASR inference).
+  """
+
+  def __init__(
+    self,
+    backend,
+    window_ms: float = 5.0,
+    max_batch_size: int = 16,
+    executor: Optional[InferenceExecutor] = None,
+  ):
+    self.backend = backend
+    self.executor = executor
+    self._batcher = None
+    if backend.batched:
+      self._batcher = MicroBatcher(
+        f"punctuation-{backend.name}",
+        backend.punctuate_batch,
+        window_ms=window_ms,
+        max_batch_size=max_batch_size,
+        executor=executor,
+      )
+
+  @property
+  def name(self) -> str:
+    return self.backend.name
+
+  async def restore(self, text: str) -> str:
+    if not text or not text.strip():
+      return text
+    if self._batcher is None:
+      return self.backend.punctuate_batch([text])[0]
+    return await self._batcher.submit(text)
+
+  async def close(self):
+    if self._batcher is not None:
+      await self._batcher.close()
+    if self.executor is not None:
+      self.executor.shutdown()
+
+
+def create_punctuator(
+  backend: str = "rules",
+  model_dir: Optional[str] = None,
+  num_threads: int = 1,
+  window_ms: float = 5.0,
+  max_batch_size: int = 16,
+  max_queue_size: int = 256,
+) -> Punctuator:
+  """Tạo Punctuator theo config; ONNX không load được → fallback rule-based."""
+  if backend == "onnx":
+    try:
+      onnx_backend = OnnxPunctuationBackend(model_dir, num_threads=num_threads)
+    except Exception as exc:  # noqa: BLE001
+      logger.warning("⚠️ Punctuation ONNX model unavailable (%s), falling back to rules", exc)
+    else:
+      executor = InferenceExecutor("punctuation", max_workers=1, max_queue_size=max_queue_size)
+      return Punctuator(onnx_backend, window_ms, max_batch_size, executor)
+  return Punctuator(RulePunctuationBackend())
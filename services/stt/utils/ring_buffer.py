@@ -0,0 +1,92 @@
+"""
+Ring buffer Float32 cho streaming audio.
+Append in-place vào vùng nhớ cấp phát trước; đếm sample và giữ overlap đều O(1).
+"""
+
+import numpy as np
+
+
+class AudioRingBuffer:
+  """
+  Ring buffer mono Float32 với running sample count.
+
+  - `append`: ghi chunk vào vùng nhớ có sẵn (tự tăng capacity x2 khi thiếu).
+  - `len(buffer)`: O(1), không cần concatenate.
+  - `keep_last(n)`: giữ n sample cuối bằng cách dời read pointer (không copy).
+  - `view()` / `snapshot()`: lấy dữ liệu liên tục để đưa vào model.
+  - `offset`: index tuyệt đối (tính từ đầu stream) của sample đầu tiên trong buffer.
+  """
+
+  def __init__(self, capacity: int):
+    self._data = np.zeros(max(int(capacity), 1), dtype=np.float32)
+    self._start = 0
+    self._size = 0
+    self._offset = 0
+
+  def __len__(self) -> int:
+    return self._size
+
+  @property
+  def offset(self) -> int:
+    return self._offset
+
+  @property
+  def capacity(self) -> int:
+    return len(self._data)
+
+  @property
+  def nbytes(self) -> int:
+    """Bộ nhớ đã cấp phát (bytes), dùng cho memory accounting."""
+    return self._data.nbytes
+
+  def append(self, samples: np.ndarray):
+    """Ghi samples vào cuối buffer (tối đa 2 slice copy, không cấp phát mới)."""
+    n = len(samples)
+    if n == 0:
+      return
+    if self._size + n > self.capacity:
+      self._grow(self._size + n)
+    cap = self.capacity
+    end = (self._start + self._size) % cap
+    first = min(n, cap - end)
+    self._data[end:end + first] = samples[:first]
+    if first < n:
+      self._data[:n - first] = samples[first:]
+    self._size += n
+
+  def _grow(self, needed: int):
+    data = np.zeros(max(needed, self.capacity * 2), dtype=np.float32)
+    data[:self._size] = self.view()
+    self._data = data
+    self._start = 0
+
+  def view(self) -> np.ndarray:
+    """
+    Dữ liệu hiện tại dạng liên tục: view (zero-copy) nếu không bị wrap, ngược lại copy một lần.
+    View bị ghi đè bởi `append` tiếp theo → chỉ dùng khi không có ghi đồng thời.
+    """
+    end = self._start + self._size
+    if end <= self.capacity:
+      return self._data[self._start:end]
+    return np.concatenate((self._data[self._start:], self._data[:end - self.capacity]))
+
+  def snapshot(self) -> np.ndarray:
+    """Bản copy độc lập (an toàn khi đưa sang inference thread trong lúc chunk mới vẫn đến)."""
+    end = self._start + self._size
+    if end <= self.capacity:
+      return self._data[self._start:end].copy()
+    return self.view()
+
+  def keep_last(self, n: int):
+    """Giữ lại n sample cuối (overlap) bằng cách dời read pointer."""
+    if n <= 0:
+      self.clear()
+    elif n < self._size:
+      self._start = (self._start + self._size - n) % self.capacity
+      self._offset += self._size - n
+      self._size = n
+
+  def clear(self):
+    self._offset += self._size
+    self._start = 0
+    self._size = 0
@@ -0,0 +1,143 @@
+"""
+Sentence segmentation tăng dần theo từng từ (word timestamps + dấu câu).
+
+Câu được đóng ngay khi gặp dấu kết câu hoặc khoảng lặng ≥ `pause_threshold` (giữa hai từ, hoặc
+đến mốc thời gian `advance()` báo không còn từ mới) → downstream (translation) bắt đầu dịch câu 1
+trong lúc câu 3 còn đang được nói. Dùng chung cho /transcribe (theo segment) và streaming
+session (theo từ đã commit, liên tục qua các chunk).
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+SENTENCE_END_PUNCTUATION = frozenset(".!?。！？")
+
+
+class SentenceSegmenter:
+  """
+  - `feed_word(word, start, end)`: thêm một từ, trả về câu vừa đóng (nếu có).
+  - `feed(segment)`: thêm cả segment (có `words` thì theo từng từ, không thì segment là một câu).
+  - `advance(time)`: audio đã tới `time` mà không có từ mới → đóng câu nếu lặng đủ lâu.
+  - `flush()`: hết audio → đóng câu còn dở.
+
+  Câu đóng được trả về, gọi `on_sentence(sentence)` và đẩy vào mọi `subscribe()` iterator.
+  Sentence: {"text", "start", "end", "words"}.
+  """
+
+  def __init__(
+    self,
+    pause_threshold: float = 0.5,
+    on_sentence: Optional[Callable[[dict], None]] = None,
+  ):
+    self.pause_threshold = pause_threshold
+    self.on_sentence = on_sentence
+    self._subscribers: List[asyncio.Queue] = []
+    self.reset()
+
+  def reset(self):
+    """Bỏ câu đang dở (bắt đầu audio mới)."""
+    self._parts: List[str] = []
+    self._words: List[dict] = []
+    self._start: Optional[float] = None
+    self._end: Optional[float] = None
+
+  @property
+  def pending(self) -> bool:
+    """Có câu đang dở (chưa đóng)."""
+    return bool(self._parts)
+
+  def _emit(self, sentence: dict) -> dict:
+    if self.on_sentence is not None:
+      self.on_sentence(sentence)
+    for queue in self._subscribers:
+      queue.put_nowait(sentence)
+    return sentence
+
+  def _close(self) -> List[dict]:
+    text = "".join(self._parts).strip()
+    sentence = {"text": text, "start": self._start, "end": self._end, "words": self._words}
+    self.reset()
+    return [self._emit(sentence)] if text else []
+
+  def feed_word(self, word: str, start: float, end: float, **extra) -> List[dict]:
+    """
+    word: text của từ như model trả về (Whisper giữ khoảng trắng đầu từ: " xin");
+    extra (vd. probability) được giữ trong `words` của câu.
+    """
+    sentences = []
+    if self._end is not None and start - self._end >= self.pause_threshold:
+      sentences += self._close()
+    if self._start is None:
+      self._start = start
+    self._parts.append(word)
+    self._words.append({"word": word, "start": start, "end": end, **extra})
+    self._end = end
+    if any(p in word for p in SENTENCE_END_PUNCTUATION):
+      sentences += self._close()
+    return sentences
+
+  def feed(self, segment: dict) -> List[dict]:
+    """Nhận thêm một segment (theo thứ tự thời gian), trả về các câu đã hoàn chỉnh."""
+    if not segment.get("words"):
+      # Không có word timestamps → segment là một câu
+      sentences = self._close()
+      if segment["text"].strip():
+        sentences.append(self._emit({
+          "text": segment["text"].strip(),
+          "start": segment["start"],
+          "end": segment["end"],
+          "words": [],
+        }))
+      return sentences
+
+    sentences = []
+    for word_info in segment["words"]:
+      extra = {key: value for key, value in word_info.items() if key not in ("word", "start", "end")}
+      sentences += self.feed_word(word_info["word"], word_info["start"], word_info["end"], **extra)
+    return sentences
+
+  def advance(self, time: float) -> List[dict]:
+    """Không có từ mới tới thời điểm `time` (giây, cùng mốc với timestamp của từ)."""
+    if self._end is not None and time - self._end >= self.pause_threshold:
+      return self._close()
+    return []
+
+  def flush(self) -> List[dict]:
+    """Trả về câu còn dở (hết audio)."""
+    return self._close()
+
+  def segment_by_timestamps(self, segments: List[dict]) -> List[dict]:
+    """Segment cả transcript một lần (không streaming)."""
+    self.reset()
+    sentences = []
+    for segment in segments:
+      sentences += self.feed(segment)
+    return sentences + self.flush()
+
+  def subscribe(self) -> AsyncIterator[dict]:
+    """Async iterator các câu đóng từ lúc subscribe tới khi `close()`."""
+    queue: asyncio.Queue = asyncio.Queue()
+    self._subscribers.append(queue)
+
+    async def iterate():
+      try:
+        while True:
+          sentence = await queue.get()
+          if sentence is None:
+            return
+          yield sentence
+      finally:
+        if queue in self._subscribers:
+          self._subscribers.remove(queue)
+
+    return iterate()
+
+  def close(self):
+    """Kết thúc mọi `subscribe()` iterator (sau khi đã flush)."""
+    for queue in self._subscribers:
+      queue.put_nowait(None)
+    self._subscribers = []
@@ -0,0 +1,111 @@
+"""
+Session reaper cho streaming sessions.
+Dọn các session không còn hoạt động (participant rớt mạng, không gọi stream-end)
+và giới hạn tổng bộ nhớ audio đang buffer.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+
+SESSIONS_GAUGE = Gauge("stt_streaming_sessions", "Active streaming sessions")
+BUFFERED_BYTES_GAUGE = Gauge(
+  "stt_streaming_buffered_bytes", "Audio bytes buffered across all streaming sessions"
+)
+EVICTED_COUNTER = Counter(
+  "stt_streaming_sessions_evicted_total", "Streaming sessions evicted by the reaper", ["reason"]
+)
+
+
+class SessionReaper:
+  """
+  Background task quét `sessions` theo chu kỳ.
+
+  1. Evict session có last_activity cũ hơn `idle_timeout` (reason="idle").
+  2. Nếu tổng buffered bytes > `max_buffered_bytes`, evict session ít hoạt động
+     gần đây nhất trước cho tới khi dưới cap (reason="memory").
+
+  `last_activity(session)` / `buffered_bytes(session)` đọc thông tin từ session object,
+  nên reaper dùng được cho cả dict session (Whisper) lẫn StreamingSession (Sherpa).
+  """
+
+  def __init__(
+    self,
+    sessions: Dict[str, Any],
+    last_activity: Callable[[Any], float],
+    buffered_bytes: Callable[[Any], int],
+    idle_timeout: float = 120.0,
+    max_buffered_bytes: int = 256 * 1024 * 1024,
+    interval: float = 10.0,
+    on_evict: Optional[Callable[[str, Any], None]] = None,
+  ):
+    self.sessions = sessions
+    self.last_activity = last_activity
+    self.buffered_bytes = buffered_bytes
+    self.idle_timeout = idle_timeout
+    self.max_buffered_bytes = max_buffered_bytes
+    self.interval = interval
+    self.on_evict = on_evict
+    self._task: Optional[asyncio.Task] = None
+
+  def _evict(self, participant_id: str, reason: str):
+    session = self.sessions.pop(participant_id, None)
+    if session is None:
+      return
+    EVICTED_COUNTER.labels(reason=reason).inc()
+    logger.info("🧹 Evicted streaming session %s (reason=%s)", participant_id, reason)
+    if self.on_evict is not None:
+      self.on_evict(participant_id, session)
+
+  def sweep(self, now: Optional[float] = None) -> List[str]:
+    """Chạy một lượt dọn, trả về danh sách participant_id đã bị evict."""
+    now = time.time() if now is None else now
+    evicted = []
+
+    for participant_id, session in list(self.sessions.items()):
+      if now - self.last_activity(session) > self.idle_timeout:
+        self._evict(participant_id, "idle")
+        evicted.append(participant_id)
+
+    sizes = {pid: self.buffered_bytes(session) for pid, session in self.sessions.items()}
+    total = sum(sizes.values())
+    if total > self.max_buffered_bytes:
+      # LRU: session có last_activity cũ nhất bị evict trước
+      by_activity = sorted(self.sessions.items(), key=lambda item: self.last_activity(item[1]))
+      for participant_id, _ in by_activity:
+        if total <= self.max_buffered_bytes:
+          break
+        total -= sizes.pop(participant_id, 0)
+        self._evict(participant_id, "memory")
+        evicted.append(participant_id)
+
+    SESSIONS_GAUGE.set(len(self.sessions))
+    BUFFERED_BYTES_GAUGE.set(total)
+    return evicted
+
+  async def _run(self):
+    while True:
+      await asyncio.sleep(self.interval)
+      try:
+        self.sweep()
+      except Exception:  # noqa: BLE001
+        logger.exception("Session reaper sweep failed")
+
+  def start(self):
+    if self._task is None or self._task.done():
+      self._task = asyncio.get_running_loop().create_task(self._run())
+
+  async def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      try:
+        await self._task
+      except asyncio.CancelledError:
+        pass
+      self._task = None
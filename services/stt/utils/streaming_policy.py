@@ -0,0 +1,199 @@
+"""
+Streaming policy cho Whisper: cửa sổ audio tăng dần + LocalAgreement-2 (prefix stabilization).
+
+Mỗi lần decode lại cả cửa sổ; từ nào hai hypothesis liên tiếp cùng đồng ý (longest common
+prefix) thì commit → final ổn định, phần còn lại là tail chưa ổn định (partial). Text đã commit
+làm prompt cho lần decode sau, audio được cắt ở cuối segment đã commit hết → không decode lại
+audio cũ.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+STREAMING_COMMITTED_WORDS = Counter(
+  "stt_streaming_committed_words_total",
+  "Words committed by the LocalAgreement streaming policy",
+  ["reason"],
+)
+STREAMING_WINDOW_SECONDS = Histogram(
+  "stt_streaming_window_seconds",
+  "Audio window length re-decoded per streaming step",
+  buckets=[0.5, 1.0, 2.0, 4.0, 6.0, 8.0, 10.0, 15.0, 20.0],
+)
+
+# (start, end, word) — giây, thời gian toàn cục của session
+Word = Tuple[float, float, str]
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def _normalize(word: str) -> str:
+  return _NON_WORD.sub("", word.lower())
+
+
+def words_to_text(words: List[Word]) -> str:
+  return " ".join(word for _, _, word in words)
+
+
+def words_from_segments(segments: List[dict]) -> Tuple[List[Word], List[float]]:
+  """
+  Word (start, end, text) + thời điểm kết thúc segment từ kết quả transcribe (timestamp tương
+  đối với cửa sổ). Segment không có word timestamps (PhoWhisper PyTorch) → chia đều theo từ.
+  """
+  words: List[Word] = []
+  segment_ends: List[float] = []
+  for segment in segments:
+    if segment.get("words"):
+      words.extend(
+        (word["start"], word["end"], word["word"].strip())
+        for word in segment["words"] if word["word"].strip()
+      )
+    else:
+      tokens = segment["text"].split()
+      if tokens:
+        step = (segment["end"] - segment["start"]) / len(tokens)
+        words.extend(
+          (segment["start"] + i * step, segment["start"] + (i + 1) * step, token)
+          for i, token in enumerate(tokens)
+        )
+    segment_ends.append(segment["end"])
+  return words, segment_ends
+
+
+class HypothesisBuffer:
+  """
+  LocalAgreement-2: commit longest common prefix của hypothesis trước và hypothesis mới.
+  Từ đã commit xuất hiện lại ở đầu hypothesis (audio chồng lấn) được loại bằng so khớp n-gram.
+  """
+
+  def __init__(self, max_ngram: int = 5):
+    self.max_ngram = max_ngram
+    self.committed_end = 0.0
+    self.committed_tail: List[Word] = []  # vài từ committed cuối, dùng để loại trùng
+    self.previous: List[Word] = []
+    self.current: List[Word] = []
+
+  def insert(self, words: List[Word], offset: float):
+    words = [(start + offset, end + offset, word) for start, end, word in words]
+    words = [w for w in words if w[0] > self.committed_end - 0.1]
+    if words and self.committed_tail and abs(words[0][0] - self.committed_end) < 1.0:
+      for n in range(min(self.max_ngram, len(self.committed_tail), len(words)), 0, -1):
+        tail = [_normalize(w[2]) for w in self.committed_tail[-n:]]
+        head = [_normalize(w[2]) for w in words[:n]]
+        if tail == head:
+          words = words[n:]
+          break
+    self.current = words
+
+  def _commit(self, words: List[Word]):
+    if words:
+      self.committed_end = words[-1][1]
+      self.committed_tail = (self.committed_tail + words)[-self.max_ngram:]
+
+  def flush(self) -> List[Word]:
+    """Commit phần hai hypothesis liên tiếp đồng ý; phần còn lại thành hypothesis trước."""
+    agreed = 0
+    for previous, current in zip(self.previous, self.current):
+      if _normalize(previous[2]) != _normalize(current[2]):
+        break
+      agreed += 1
+    committed = self.current[:agreed]
+    self.previous = self.current[agreed:]
+    self.current = []
+    self._commit(committed)
+    return committed
+
+  def complete(self) -> List[Word]:
+    """Commit toàn bộ tail (hết utterance / hết stream)."""
+    committed, self.previous = self.previous, []
+    self._commit(committed)
+    return committed
+
+  @property
+  def tail(self) -> List[Word]:
+    return self.previous
+
+
+class LocalAgreementPolicy:
+  """
+  State streaming của một session.
+
+  - `prompt()`: text đã commit nằm trước cửa sổ audio hiện tại (tối đa `prompt_chars` ký tự).
+  - `update(words, segment_ends, window_offset)`: đưa hypothesis mới vào; trả về
+    (từ mới commit, tail chưa ổn định, số giây audio cắt được ở đầu buffer).
+  - `advance(seconds)`: caller bỏ audio đầu buffer (VAD silence) → dời offset.
+
+  Buffer cắt ở cuối segment cuối cùng đã commit hết; cửa sổ vượt `max_window_seconds` thì cắt
+  ở từ commit cuối (hoặc commit luôn tail nếu không có tiến triển).
+  """
+
+  def __init__(self, max_window_seconds: float = 15.0, prompt_chars: int = 200):
+    self.max_window_seconds = max_window_seconds
+    self.prompt_chars = prompt_chars
+    self.hypothesis = HypothesisBuffer()
+    self.buffer_offset = 0.0  # thời gian toàn cục của sample đầu tiên trong buffer
+    self.committed: List[Word] = []
+
+  def prompt(self) -> Optional[str]:
+    words = []
+    length = 0
+    for start, end, word in reversed(self.committed):
+      if end > self.buffer_offset:
+        continue
+      if length + len(word) + 1 > self.prompt_chars:
+        break
+      words.append(word)
+      length += len(word) + 1
+    return " ".join(reversed(words)) or None
+
+  def _record(self, words: List[Word], reason: str) -> List[Word]:
+    if words:
+      self.committed = (self.committed + words)[-200:]
+      STREAMING_COMMITTED_WORDS.labels(reason=reason).inc(len(words))
+    return words
+
+  def update(
+    self,
+    words: List[Word],
+    segment_ends: List[float],
+    window_offset: float,
+    window_seconds: float,
+  ) -> Tuple[List[Word], List[Word], float]:
+    """
+    words / segment_ends: timestamp tương đối với audio đã decode, audio đó bắt đầu tại
+    `window_offset` giây tính từ đầu buffer; `window_seconds`: độ dài buffer hiện tại.
+    """
+    STREAMING_WINDOW_SECONDS.observe(window_seconds)
+    origin = self.buffer_offset + window_offset
+    self.hypothesis.insert(words, origin)
+    committed = self._record(self.hypothesis.flush(), "agreement")
+
+    committed_end = self.hypothesis.committed_end
+    trim_to = self.buffer_offset
+    for end in segment_ends:
+      if origin + end <= committed_end:
+        trim_to = max(trim_to, origin + end)
+
+    if window_seconds > self.max_window_seconds:
+      if committed_end > self.buffer_offset:
+        trim_to = max(trim_to, committed_end)
+      else:
+        # Cửa sổ dài mà không commit được gì → chốt tail, bỏ audio đã decode
+        committed += self._record(self.hypothesis.complete(), "max_window")
+        trim_to = max(trim_to, self.hypothesis.committed_end)
+        if trim_to <= self.buffer_offset:
+          # Không có từ nào (noise/hallucination bị lọc) → chỉ giữ 1s cuối
+          trim_to = self.buffer_offset + window_seconds - 1.0
+
+    trim_seconds = min(max(trim_to - self.buffer_offset, 0.0), window_seconds)
+    self.buffer_offset += trim_seconds
+    return committed, list(self.hypothesis.tail), trim_seconds
+
+  def finalize(self) -> List[Word]:
+    """Utterance kết thúc (VAD silence / stream-end): tail thành final."""
+    return self._record(self.hypothesis.complete(), "endpoint")
+
+  def advance(self, seconds: float):
+    self.buffer_offset += seconds
@@ -0,0 +1,311 @@
+"""
+Voice activity detection (VAD) phía server, chạy trước inference queue.
+
+- Energy + ZCR (mặc định, không cần model): năng lượng frame so với noise floor thích nghi
+  (minimum statistics) + zero-crossing rate để loại nhiễu trắng/tiếng xì.
+- Silero VAD (tuỳ chọn): model ONNX qua onnxruntime, frame 512 sample @16kHz.
+
+Mỗi session có một `VoiceActivityDetector` (state + hangover giữ liên tục giữa các chunk);
+frame classifier (và ONNX session) dùng chung cho cả process. Silero chạy một `session.run`
+mỗi frame 32ms → từ event loop gọi bản `*_async` (classify trên thread riêng); flag của các
+frame đã phân loại trong `accept()` được giữ lại để cắt silence cửa sổ streaming không phải
+chạy lại model.
+"""
+
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+VAD_FRAMES_COUNTER = Counter(
+  "stt_vad_frames_total",
+  "Audio frames classified by server-side VAD (speech ratio = speech / total)",
+  ["decision"],
+)
+VAD_AUDIO_SECONDS = Counter(
+  "stt_vad_audio_seconds_total",
+  "Seconds of audio by VAD outcome (inference = sent to model, skipped = silent window dropped, "
+  "trimmed = leading/trailing silence cut)",
+  ["decision"],
+)
+VAD_SESSION_SPEECH_RATIO = Histogram(
+  "stt_vad_session_speech_ratio",
+  "Fraction of speech frames per streaming session (observed at session end)",
+  buckets=[0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9, 1.0],
+)
+
+
+def _frame_view(audio: np.ndarray, frame_samples: int) -> np.ndarray:
+  """[n_frames, frame_samples] view (không copy) của các frame đầy đủ."""
+  n_frames = len(audio) // frame_samples
+  return audio[:n_frames * frame_samples].reshape(n_frames, frame_samples)
+
+
+class EnergyFrameClassifier:
+  """
+  Frame là speech khi năng lượng > max(`energy_floor_db`, noise floor + `margin_db`)
+  và ZCR < `zcr_max` (nhiễu trắng ~0.5); frame đủ to (+`loud_margin_db`) luôn là speech.
+
+  Noise floor: tụt ngay xuống frame nhỏ nhất, tăng chậm `floor_rise_db` mỗi frame.
+  """
+
+  name = "energy"
+  blocking = False  # Vector hoá, đủ rẻ để chạy trên event loop
+
+  def __init__(
+    self,
+    sample_rate: int = 16000,
+    frame_ms: int = 30,
+    energy_floor_db: float = -45.0,
+    margin_db: float = 9.0,
+    loud_margin_db: float = 10.0,
+    zcr_max: float = 0.4,
+    floor_rise_db: float = 0.02,
+  ):
+    self.frame_samples = sample_rate * frame_ms // 1000
+    self.energy_floor_db = energy_floor_db
+    self.margin_db = margin_db
+    self.loud_margin_db = loud_margin_db
+    self.zcr_max = zcr_max
+    self.floor_rise_db = floor_rise_db
+
+  def new_state(self) -> dict:
+    return {"noise_floor_db": self.energy_floor_db - self.margin_db}
+
+  def fork_state(self, state: dict) -> dict:
+    """State cho một lần phân tích độc lập (trim utterance) — giữ noise floor đã học."""
+    return dict(state)
+
+  def classify(self, frames: np.ndarray, state: dict) -> np.ndarray:
+    energy = np.einsum("ij,ij->i", frames, frames) / frames.shape[1]
+    energy_db = 10.0 * np.log10(energy + 1e-10)
+    zcr = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / frames.shape[1]
+
+    floor = min(
+      state["noise_floor_db"] + self.floor_rise_db * len(frames),
+      float(energy_db.min()),
+    )
+    state["noise_floor_db"] = floor
+    threshold = max(self.energy_floor_db, floor + self.margin_db)
+    return (energy_db > threshold) & (
+      (zcr < self.zcr_max) | (energy_db > threshold + self.loud_margin_db)
+    )
+
+
+class SileroFrameClassifier:
+  """
+  Silero VAD ONNX (v4: input/h/c/sr, v5: input/state/sr + 64 sample context).
+  Chạy tuần tự từng frame 32ms; state RNN nằm trong state của session.
+  """
+
+  name = "silero"
+  blocking = True  # Một ONNX call mỗi frame → không chạy trên event loop
+
+  def __init__(self, model_path: str, threshold: float = 0.5, sample_rate: int = 16000):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    self.v5 = "state" in {i.name for i in self.session.get_inputs()}
+    self.threshold = threshold
+    self.frame_samples = 512 if sample_rate == 16000 else 256
+    self.context_samples = 64 if sample_rate == 16000 else 32
+    self.sample_rate = np.array(sample_rate, dtype=np.int64)
+    logger.info("Silero VAD loaded from %s (%s)", model_path, "v5" if self.v5 else "v4")
+
+  def new_state(self) -> dict:
+    if self.v5:
+      return {
+        "state": np.zeros((2, 1, 128), dtype=np.float32),
+        "context": np.zeros((1, self.context_samples), dtype=np.float32),
+      }
+    return {"h": np.zeros((2, 1, 64), dtype=np.float32), "c": np.zeros((2, 1, 64), dtype=np.float32)}
+
+  def fork_state(self, state: dict) -> dict:
+    return self.new_state()
+
+  def classify(self, frames: np.ndarray, state: dict) -> np.ndarray:
+    speech = np.zeros(len(frames), dtype=bool)
+    for i, frame in enumerate(frames):
+      x = frame[None, :]
+      if self.v5:
+        x = np.concatenate((state["context"], x), axis=1)
+        prob, state["state"] = self.session.run(
+          None, {"input": x, "state": state["state"], "sr": self.sample_rate}
+        )
+        state["context"] = x[:, -self.context_samples:]
+      else:
+        prob, state["h"], state["c"] = self.session.run(
+          None, {"input": x, "h": state["h"], "c": state["c"], "sr": self.sample_rate}
+        )
+      speech[i] = float(prob.reshape(-1)[0]) >= self.threshold
+    return speech
+
+
+class VoiceActivityDetector:
+  """
+  VAD per-session.
+
+  - `accept(chunk)`: tỉ lệ frame speech của chunk (có hangover `hangover_ms` sau speech để
+    không cắt đuôi từ); frame lẻ cuối chunk được giữ lại ghép với chunk sau.
+  - `speech_bounds(audio, start)` / `trim(audio)`: cắt silence đầu/cuối utterance, chừa `padding_ms`;
+    `start` = sample tuyệt đối (tính từ chunk đầu tiên của `accept`) của audio[0] → dùng lại flag
+    đã có từ `accept()` (giữ `history_seconds` gần nhất) thay vì phân loại lại.
+  - `accept_async` / `trim_bounds_async` / `trim_async`: như trên, gọi từ event loop; classifier
+    `blocking` (Silero) chạy trên thread riêng, các lần gọi của một session được tuần tự hoá.
+  """
+
+  def __init__(
+    self,
+    classifier,
+    sample_rate: int = 16000,
+    hangover_ms: int = 300,
+    padding_ms: int = 200,
+    min_speech_ms: int = 90,
+    history_seconds: float = 60.0,
+  ):
+    self.classifier = classifier
+    self.sample_rate = sample_rate
+    self.frame_samples = classifier.frame_samples
+    frame_ms = self.frame_samples * 1000 / sample_rate
+    self.hangover_frames = int(round(hangover_ms / frame_ms))
+    self.padding_samples = sample_rate * padding_ms // 1000
+    self.min_speech_frames = max(int(round(min_speech_ms / frame_ms)), 1)
+    self.history_frames = int(history_seconds * 1000 / frame_ms)
+    self.state = classifier.new_state()
+    self._flags = np.zeros(0, dtype=bool)  # Flag thô của các frame gần nhất đã qua accept()
+    self._flags_start = 0  # Frame tuyệt đối của _flags[0]
+    self._lock = asyncio.Lock()
+    self._remainder = np.zeros(0, dtype=np.float32)
+    self._hangover = 0
+    self.speech_frames = 0
+    self.total_frames = 0
+
+  @property
+  def speech_ratio(self) -> float:
+    return self.speech_frames / self.total_frames if self.total_frames else 0.0
+
+  def accept(self, audio: np.ndarray) -> float:
+    """Phân loại chunk (Float32 @16kHz); trả về tỉ lệ speech (0 = im lặng hoàn toàn)."""
+    if len(self._remainder):
+      audio = np.concatenate((self._remainder, audio))
+    frames = _frame_view(audio, self.frame_samples)
+    self._remainder = audio[len(frames) * self.frame_samples:].copy()
+    if len(frames) == 0:
+      return 1.0 if self._hangover > 0 else 0.0
+
+    flags = self.classifier.classify(frames, self.state)
+    self._remember(flags)
+    speech = 0
+    for flag in flags:
+      if flag:
+        self._hangover = self.hangover_frames
+        speech += 1
+      elif self._hangover > 0:
+        self._hangover -= 1
+        speech += 1
+
+    self.speech_frames += speech
+    self.total_frames += len(flags)
+    VAD_FRAMES_COUNTER.labels(decision="speech").inc(speech)
+    VAD_FRAMES_COUNTER.labels(decision="silence").inc(len(flags) - speech)
+    return speech / len(flags)
+
+  def _remember(self, flags: np.ndarray):
+    self._flags = np.concatenate((self._flags, flags))
+    excess = len(self._flags) - self.history_frames
+    if excess > 0:
+      self._flags = self._flags[excess:]
+      self._flags_start += excess
+
+  def _cached_flags(self, start: Optional[int], length: int) -> Optional[Tuple[np.ndarray, int]]:
+    """(flags, sample trong audio của frame đầu) cho audio [start, start + length) nếu history còn đủ."""
+    if start is None:
+      return None
+    first = -(-start // self.frame_samples)  # Frame đầu nằm trọn trong audio
+    last = min((start + length) // self.frame_samples, self.total_frames)
+    if first < self._flags_start or last <= first:
+      return None
+    flags = self._flags[first - self._flags_start:last - self._flags_start]
+    return flags, first * self.frame_samples - start
+
+  def needs_classify(self, audio: np.ndarray, start: Optional[int] = None) -> bool:
+    return self._cached_flags(start, len(audio)) is None
+
+  def speech_bounds(self, audio: np.ndarray, start: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """(start, end) sample của vùng speech (đã padding); None nếu không đủ `min_speech_ms` speech."""
+    cached = self._cached_flags(start, len(audio))
+    if cached is not None:
+      flags, first_sample = cached
+    else:
+      frames = _frame_view(audio, self.frame_samples)
+      if len(frames) == 0:
+        return None
+      flags = self.classifier.classify(frames, self.classifier.fork_state(self.state))
+      first_sample = 0
+    indices = np.flatnonzero(flags)
+    if len(indices) < self.min_speech_frames:
+      return None
+    start = max(first_sample + int(indices[0]) * self.frame_samples - self.padding_samples, 0)
+    end = min(first_sample + (int(indices[-1]) + 1) * self.frame_samples + self.padding_samples, len(audio))
+    return start, end
+
+  def trim_bounds(self, audio: np.ndarray, start: Optional[int] = None) -> Tuple[int, int]:
+    """`speech_bounds` + ghi metrics; (0, 0) nếu không có speech."""
+    bounds = self.speech_bounds(audio, start)
+    if bounds is None:
+      VAD_AUDIO_SECONDS.labels(decision="skipped").inc(len(audio) / self.sample_rate)
+      return 0, 0
+    start, end = bounds
+    VAD_AUDIO_SECONDS.labels(decision="trimmed").inc((len(audio) - (end - start)) / self.sample_rate)
+    return start, end
+
+  def trim(self, audio: np.ndarray) -> np.ndarray:
+    """View của audio đã cắt silence đầu/cuối (mảng rỗng nếu không có speech)."""
+    start, end = self.trim_bounds(audio)
+    return audio[start:end]
+
+  async def accept_async(self, audio: np.ndarray) -> float:
+    async with self._lock:
+      if self.classifier.blocking:
+        return await asyncio.to_thread(self.accept, audio)
+      return self.accept(audio)
+
+  async def trim_bounds_async(self, audio: np.ndarray, start: Optional[int] = None) -> Tuple[int, int]:
+    async with self._lock:
+      if self.classifier.blocking and self.needs_classify(audio, start):
+        return await asyncio.to_thread(self.trim_bounds, audio, start)
+      return self.trim_bounds(audio, start)
+
+  async def trim_async(self, audio: np.ndarray) -> np.ndarray:
+    start, end = await self.trim_bounds_async(audio)
+    return audio[start:end]
+
+  def close(self):
+    """Ghi speech ratio của session vào histogram (gọi một lần khi session kết thúc)."""
+    if self.total_frames:
+      VAD_SESSION_SPEECH_RATIO.observe(self.speech_ratio)
+
+
+def create_vad_classifier(
+  backend: str = "energy",
+  model_path: Optional[str] = None,
+  threshold: float = 0.5,
+  energy_floor_db: float = -45.0,
+):
+  """Frame classifier dùng chung theo config; `none` → tắt VAD; Silero lỗi load → fallback energy."""
+  if backend == "none":
+    return None
+  if backend == "silero":
+    try:
+      return SileroFrameClassifier(model_path, threshold=threshold)
+    except Exception as exc:  # noqa: BLE001
+      logger.warning("⚠️ Silero VAD unavailable (%s), falling back to energy VAD", exc)
+  return EnergyFrameClassifier(energy_floor_db=energy_floor_db)
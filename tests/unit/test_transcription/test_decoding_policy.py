@@ -0,0 +1,68 @@
+"""
+DecodingPolicy: ước lượng RTF bị đẩy lên trong đợt quá tải phải tự phục hồi khi hết tải
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "services", "stt"))
+
+from utils.decoding_policy import DecodingPolicy  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def decode(policy, clock, inference_seconds, queue_seconds=0.0, budget_ms=1000.0, audio_seconds=1.0):
+    settings = policy.choose(budget_ms, audio_seconds)
+    policy.observe(
+        settings, budget_ms, audio_seconds, queue_seconds + inference_seconds,
+        inference_seconds=inference_seconds
+    )
+    clock.now += 1.0
+    return settings.profile
+
+
+def test_queue_wait_does_not_inflate_rtf():
+    clock = FakeClock()
+    policy = DecodingPolicy(clock=clock)
+    assert decode(policy, clock, inference_seconds=0.1, queue_seconds=3.0) == "balanced"
+    # Queue wait là tín hiệu riêng: đang tải → giảm chất lượng, RTF của balanced không đổi
+    assert policy.snapshot()["default/balanced"] < 0.15
+    assert policy.choose(1000.0, 1.0).profile != "balanced"
+
+    # Hết tải: queue wait EWMA giảm dần trên mọi profile → quay lại balanced
+    profiles = [decode(policy, clock, inference_seconds=0.05) for _ in range(30)]
+    assert profiles[-1] == "balanced"
+
+
+def test_stale_estimate_recovers_after_load_burst():
+    clock = FakeClock()
+    policy = DecodingPolicy(clock=clock, stale_after=30.0)
+    assert policy.choose(1000.0, 1.0).profile == "balanced"
+
+    # Một decode chậm (CPU tranh chấp trong đợt tải) đẩy RTF của balanced lên
+    decode(policy, clock, inference_seconds=3.0)
+    assert policy.choose(1000.0, 1.0).profile == "fast"
+
+    # Hết tải: sau stale_after, balanced được probe một lần, số đo mới thay ước lượng cũ
+    profiles = [decode(policy, clock, inference_seconds=0.05) for _ in range(200)]
+    assert "balanced" in profiles
+    assert profiles[-1] == "balanced"
+    assert policy.snapshot()["default/balanced"] < 0.15
+
+
+def test_no_probe_while_queue_wait_exceeds_budget():
+    clock = FakeClock()
+    policy = DecodingPolicy(clock=clock, stale_after=30.0)
+    decode(policy, clock, inference_seconds=3.0)
+    clock.now += 60.0
+    for _ in range(10):
+        policy.observe(policy.choose(1000.0, 1.0), 1000.0, 1.0, 5.0, inference_seconds=0.05)
+    assert policy.queue_wait_ms("default") > 1000.0
+    assert policy.choose(1000.0, 1.0).profile == "greedy"